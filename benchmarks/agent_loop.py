@@ -0,0 +1,331 @@
+"""
+Agent-loop benchmark.
+
+Drives AugmentedCodeAgent sessions built through the loader, with the real
+tools, against a local fake OpenAI-compatible server, and reports as JSON:
+per-step framework overhead (step wall time minus model time), model and
+tool latencies, optional memory search latency, memory use, and
+throughput at each requested number of concurrent sessions. Log lines
+printed while the sessions run go to stderr so stdout holds only the report.
+
+Usage:
+    python -m benchmarks.agent_loop --sessions 1 4 16 --latency 0.05 --output results.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+from benchmarks.fake_openai_server import FakeOpenAIServer
+from src import loader
+from src.agents import DEFAULT_ASYNC_WORKERS, AugmentedCodeAgent, get_agent_executor
+from src.llm import LLMProvider, ModelWrapper
+
+
+class TimingModel(ModelWrapper):
+    """Records the wall time of every model call of one session."""
+
+    def __init__(self, model):
+        super().__init__(model)
+        self.call_seconds = []
+
+    def generate(self, messages, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._call_model(messages, **kwargs)
+        finally:
+            self.call_seconds.append(time.perf_counter() - started)
+
+    def generate_stream(self, messages, **kwargs):
+        started = time.perf_counter()
+        try:
+            yield from self.model.generate_stream(messages, **kwargs)
+        finally:
+            self.call_seconds.append(time.perf_counter() - started)
+
+
+class ToolTimer:
+    """Wraps the forward method of tool instances to record their latencies."""
+
+    def __init__(self):
+        self.seconds = {}
+        self._lock = threading.Lock()
+
+    def instrument(self, tools):
+        for tool in tools:
+            if getattr(tool, "_benchmark_timed", False):
+                continue
+            tool.forward = self._timed(tool.name, tool.forward)
+            tool._benchmark_timed = True
+
+    def _timed(self, name, forward):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return forward(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    self.seconds.setdefault(name, []).append(elapsed)
+
+        return timed
+
+    def reset(self):
+        with self._lock:
+            self.seconds = {}
+
+
+def summarize(values):
+    """Summarize durations in seconds as milliseconds."""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+        "p95_ms": round(ordered[min(int(0.95 * len(ordered)), len(ordered) - 1)] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def step_seconds(step):
+    timing = getattr(step, "timing", None)
+    if timing is not None:
+        return timing.duration
+    # Older smolagents releases keep the timing on the step itself
+    return getattr(step, "duration", None)
+
+
+def build_config(server_url, data_dir, overrides):
+    config = {
+        "agent": {"planning_interval": None, "max_steps": 20, "additional_authorized_imports": ["*"]},
+        "llm": {},
+        "tools": {},
+        "docker": {"data_dir": data_dir},
+    }
+    for section, values in (overrides or {}).items():
+        if isinstance(values, dict):
+            config.setdefault(section, {}).update(values)
+        else:
+            config[section] = values
+    # The model endpoint always points at the fake server
+    config["llm"].update(
+        {"provider": "litellm", "api_base": server_url, "api_key": "benchmark", "model": "fake-model"}
+    )
+    config["llm"].pop("endpoints", None)
+    return config
+
+
+def build_session(index, agent_config, tools, memory_search_fn, stream):
+    """Create the agent of one session."""
+    model = TimingModel(loader.llm)
+    agent = AugmentedCodeAgent(
+        tools=tools,
+        model=model,
+        executor_type="local",
+        planning_interval=agent_config.get("planning_interval"),
+        max_steps=agent_config.get("max_steps", 20),
+        additional_authorized_imports=agent_config.get("additional_authorized_imports", ["*"]),
+        verbosity_level=0,
+        stream_outputs=stream,
+        memory_search_fn=memory_search_fn,
+        memory_deadline=agent_config.get("memory_deadline"),
+    )
+    return agent, model
+
+
+def measure_session(agent, model, result, wall):
+    """Collect the measurements of a finished session."""
+    steps = [step for step in agent.memory.steps if hasattr(step, "step_number")]
+    overheads = []
+    for step, model_seconds in zip(steps, model.call_seconds):
+        duration = step_seconds(step)
+        if duration is not None:
+            overheads.append(max(duration - model_seconds, 0.0))
+    return {
+        "result": result,
+        "wall": wall,
+        "steps": len(steps),
+        "model_seconds": model.call_seconds,
+        "overhead_seconds": overheads,
+        # The run's own memory search, which its memories were used from
+        "memory_seconds": [timing["memory_seconds"] for timing in agent.prompt_timings],
+        "memory_missed": sum(1 for timing in agent.prompt_timings if timing["deadline_missed"]),
+        "memory_saved_seconds": [timing["saved_seconds"] for timing in agent.prompt_timings],
+    }
+
+
+def run_session(index, task, agent_config, tools, memory_search_fn, stream):
+    """Run one agent session in the current thread and return its measurements."""
+    agent, model = build_session(index, agent_config, tools, memory_search_fn, stream)
+    started = time.perf_counter()
+    result = agent.run(task, user_id=f"benchmark_user_{index}")
+    return measure_session(agent, model, result, time.perf_counter() - started)
+
+
+async def run_sessions_async(sessions, task, agent_config, tools, memory_search_fn, stream):
+    """Run all sessions of a level on one event loop through arun."""
+    async_model = LLMProvider.get_async_llm(loader.config["llm"])
+    executor = get_agent_executor(agent_config.get("async_workers", DEFAULT_ASYNC_WORKERS))
+
+    async def run_one(index):
+        agent, model = await asyncio.to_thread(build_session, index, agent_config, tools, memory_search_fn, stream)
+        started = time.perf_counter()
+        result = await agent.arun(
+            task, async_model=async_model, executor=executor, user_id=f"benchmark_user_{index}"
+        )
+        return measure_session(agent, model, result, time.perf_counter() - started)
+
+    try:
+        return await asyncio.gather(*(run_one(i) for i in range(sessions)))
+    finally:
+        await async_model.aclose()
+
+
+def run_level(sessions, task, agent_config, tools, tool_timer, memory_search_fn, stream, use_async):
+    tool_timer.reset()
+    tracemalloc.start()
+    started = time.perf_counter()
+    if use_async:
+        results = asyncio.run(run_sessions_async(sessions, task, agent_config, tools, memory_search_fn, stream))
+    else:
+        with ThreadPoolExecutor(max_workers=sessions) as executor:
+            futures = [
+                executor.submit(run_session, i, task, agent_config, tools, memory_search_fn, stream)
+                for i in range(sessions)
+            ]
+            results = [future.result() for future in futures]
+    wall = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    steps = sum(r["steps"] for r in results)
+    memory_seconds = [s for r in results for s in r["memory_seconds"] if s is not None]
+    return {
+        "sessions": sessions,
+        "wall_seconds": round(wall, 4),
+        "completed": sum(1 for r in results if r["result"] is not None),
+        "steps": steps,
+        "throughput": {
+            "sessions_per_second": round(sessions / wall, 3),
+            "steps_per_second": round(steps / wall, 3),
+        },
+        "session_wall": summarize([r["wall"] for r in results]),
+        "step_overhead": summarize([s for r in results for s in r["overhead_seconds"]]),
+        "model_call": summarize([s for r in results for s in r["model_seconds"]]),
+        "memory_search": summarize(memory_seconds) if memory_search_fn else None,
+        "memory_deadline_missed": sum(r["memory_missed"] for r in results) if memory_search_fn else None,
+        "memory_prefetch_saved": (
+            summarize([s for r in results for s in r["memory_saved_seconds"]]) if memory_search_fn else None
+        ),
+        "tools": {name: summarize(values) for name, values in sorted(tool_timer.seconds.items())},
+        "memory": {
+            "traced_peak_mb": round(peak / 1024 / 1024, 3),
+            "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 3),
+        },
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the agent loop against a fake model server")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4], help="Concurrency levels to run")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake model latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Maximum extra random model latency")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds between streamed chunks")
+    parser.add_argument("--script", help="JSON file with the scripted model responses")
+    parser.add_argument("--config", help="YAML file whose sections override the benchmark config")
+    parser.add_argument("--task", default="Explore the repository and report back.")
+    parser.add_argument("--stream", action="store_true", help="Stream model outputs")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Run sessions through arun")
+    parser.add_argument("--memory", action="store_true", help="Include a memory search per session")
+    parser.add_argument("--output", help="Write the JSON report to this file (default: stdout)")
+    args = parser.parse_args()
+
+    script = None
+    if args.script:
+        with open(args.script, "r", encoding="utf-8") as f:
+            script = json.load(f)
+    overrides = None
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            overrides = yaml.safe_load(f)
+
+    # Tools and components log with print(); keep stdout for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        server = FakeOpenAIServer(script, args.latency, args.jitter, args.token_delay).start()
+        data_dir = tempfile.mkdtemp(prefix="agent-benchmark-")
+        loader.configure(build_config(server.url, data_dir, overrides))
+        agent_config = loader.config["agent"]
+
+        tools = loader.tools
+        tool_timer = ToolTimer()
+        tool_timer.instrument(tools)
+        memory_search_fn = None
+        if args.memory:
+            from src.memory import MemoryProvider
+
+            memory = loader.memory
+            memory_search_fn = lambda query, user_id: MemoryProvider.search(memory, query, user_id=user_id)
+
+        levels = []
+        for sessions in args.sessions:
+            print(f"[Benchmark] Running {sessions} concurrent session(s)", file=sys.stderr)
+            levels.append(
+                run_level(
+                    sessions, args.task, agent_config, tools, tool_timer, memory_search_fn, args.stream, args.use_async
+                )
+            )
+        server.stop()
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "token_delay": args.token_delay,
+            "stream": args.stream,
+            "async": args.use_async,
+            "memory": args.memory,
+            "config": args.config,
+        },
+        "model_requests": server.requests,
+        "levels": levels,
+        "http_pool": LLMProvider.get_http_stats(),
+    }
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
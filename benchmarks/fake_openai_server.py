@@ -0,0 +1,221 @@
+"""
+Local fake OpenAI-compatible chat completions server for benchmarks.
+
+Serves scripted responses with configurable latency so agent runs can be
+timed without a real model. The response for a request is chosen by the
+number of completed agent steps in its messages, so concurrent sessions
+each walk through the script independently. Planning requests (stop
+sequence "<end_plan>") get a fixed plan.
+
+Usage:
+    python -m benchmarks.fake_openai_server --port 8000 --latency 0.2
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+# Default script: explore the repo with the file tools, run a command, answer
+DEFAULT_SCRIPT = [
+    "Thought: I will look at the files in the repository.\n"
+    "```py\nprint(list_files(directory='.'))\n```",
+    "Thought: I will read the README.\n"
+    "```py\nprint(read_file(file_path='README.md', start_line=1, line_count=40))\n```",
+    "Thought: I will search for the loader.\n"
+    "```py\nprint(search_files(directory='src', regex_pattern='.*\\.py$', content_pattern='class ServiceLoader'))\n```",
+    "Thought: I will run a command.\n"
+    "```py\nprint(execute_command(command='echo benchmark'))\n```",
+    "Thought: I have everything I need.\n"
+    "```py\nfinal_answer('done')\n```",
+]
+
+PLAN = "1. Explore the repository.\n2. Answer.\n<end_plan>"
+
+# Marker of a completed step in the messages smolagents sends back
+STEP_MARKER = "Calling tools:"
+
+
+def _message_text(message: dict) -> str:
+    content = message.get("content")
+    if isinstance(content, list):
+        return "\n".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeOpenAIServer:
+    """
+    Threaded HTTP server answering POST /v1/chat/completions from a script.
+    """
+
+    def __init__(
+        self,
+        script: Optional[List[str]] = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        token_delay: float = 0.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        """
+        Initialize the server.
+
+        Args:
+            script: Responses for step 1, 2, ...; the last one is repeated
+            latency: Seconds before the first byte of every response
+            jitter: Maximum extra random latency in seconds
+            token_delay: Seconds between streamed chunks
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+        """
+        self.script = script or DEFAULT_SCRIPT
+        self.latency = latency
+        self.jitter = jitter
+        self.token_delay = token_delay
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def respond(self, request: dict) -> str:
+        """
+        Choose the scripted response for a request.
+
+        Args:
+            request: Decoded chat completions request body
+
+        Returns:
+            Response text
+        """
+        with self._lock:
+            self.requests += 1
+        if "<end_plan>" in (request.get("stop") or []):
+            return PLAN
+        steps = sum(
+            1
+            for message in request.get("messages", [])
+            if message.get("role") == "assistant" and STEP_MARKER in _message_text(message)
+        )
+        return self.script[min(steps, len(self.script) - 1)]
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("content-length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                text = server.respond(request)
+                time.sleep(server.latency + random.uniform(0, server.jitter))
+                prompt_tokens = sum(_estimate_tokens(_message_text(m)) for m in request.get("messages", []))
+                usage = {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": _estimate_tokens(text),
+                    "total_tokens": prompt_tokens + _estimate_tokens(text),
+                }
+                if request.get("stream"):
+                    self._stream(request, text, usage)
+                else:
+                    self._send_json(
+                        {
+                            "id": "chatcmpl-fake",
+                            "object": "chat.completion",
+                            "created": int(time.time()),
+                            "model": request.get("model", "fake"),
+                            "choices": [
+                                {
+                                    "index": 0,
+                                    "message": {"role": "assistant", "content": text},
+                                    "finish_reason": "stop",
+                                }
+                            ],
+                            "usage": usage,
+                        }
+                    )
+
+            def _send_json(self, body: dict) -> None:
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, request: dict, text: str, usage: dict) -> None:
+                self.send_response(200)
+                self.send_header("content-type", "text/event-stream")
+                self.send_header("connection", "close")
+                self.end_headers()
+                chunk = {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": request.get("model", "fake"),
+                }
+                words = text.split(" ")
+                for i, word in enumerate(words):
+                    piece = word if i == len(words) - 1 else word + " "
+                    event = {**chunk, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                    self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    if server.token_delay:
+                        time.sleep(server.token_delay)
+                event = {**chunk, "choices": [], "usage": usage}
+                self.wfile.write(f"data: {json.dumps(event)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible server with scripted responses")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before each response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Maximum extra random latency")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds between streamed chunks")
+    parser.add_argument("--script", help="JSON file with a list of responses, one per step")
+    args = parser.parse_args()
+
+    script = None
+    if args.script:
+        with open(args.script, "r", encoding="utf-8") as f:
+            script = json.load(f)
+    server = FakeOpenAIServer(script, args.latency, args.jitter, args.token_delay, args.host, args.port)
+    print(f"Serving fake chat completions at {server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
-from smolagents import CodeAgent
 from src import loader
+from src.agents import AugmentedCodeAgent, log_time_to_first_token
+from src.context import ContextManager
+from src.memory import MemoryProvider
 from smolagents.monitoring import LogLevel
 
 
@@ -20,7 +22,14 @@ def main():
     if use_prompts_yaml:
         prompt_templates = loader.prompts
 
-    agent = CodeAgent(
+    # Memories are searched for each task and the task with its answer stored afterwards
+    memory_search_fn = memory_add_fn = None
+    if config.get("memory"):
+        memory = loader.memory
+        memory_search_fn = lambda query, user_id: MemoryProvider.search(memory, query, user_id=user_id)
+        memory_add_fn = lambda messages, user_id: MemoryProvider.add(memory, messages, user_id=user_id)
+
+    agent = AugmentedCodeAgent(
         tools=tools,
         model=model,
         # prompt_templates=prompt_templates,
@@ -29,6 +38,13 @@ def main():
         max_steps=max_steps,
         verbosity_level=LogLevel.INFO,
         additional_authorized_imports=additional_authorized_imports,
+        # Model output is rendered token by token as it streams in
+        stream_outputs=True,
+        step_callbacks=[log_time_to_first_token],
+        memory_search_fn=memory_search_fn,
+        memory_add_fn=memory_add_fn,
+        memory_deadline=agent_config.get("memory_deadline"),
+        context_manager=ContextManager.from_config(agent_config.get("context")),
     )
 
     print("Type your message (or 'exit' to quit):")
@@ -1,7 +1,9 @@
 import sys
-from smolagents import CodeAgent
 from smolagents.gradio_ui import GradioUI
 from src import loader
+from src.agents import AugmentedCodeAgent, log_time_to_first_token
+from src.context import ContextManager
+from src.memory import MemoryProvider
 
 
 def main():
@@ -14,7 +16,14 @@ def main():
         prompt_templates = loader.prompts
     docker_config = config["docker"]
 
-    agent = CodeAgent(
+    # Memories are searched for each task and the task with its answer stored afterwards
+    memory_search_fn = memory_add_fn = None
+    if config.get("memory"):
+        memory = loader.memory
+        memory_search_fn = lambda query, user_id: MemoryProvider.search(memory, query, user_id=user_id)
+        memory_add_fn = lambda messages, user_id: MemoryProvider.add(memory, messages, user_id=user_id)
+
+    agent = AugmentedCodeAgent(
         tools=tools,
         model=model,
         # prompt_templates=None,  # Removed get_prompt_templates() call
@@ -22,6 +31,12 @@ def main():
         planning_interval=3,
         max_steps=20,
         additional_authorized_imports=["*"],
+        stream_outputs=True,
+        step_callbacks=[log_time_to_first_token],
+        memory_search_fn=memory_search_fn,
+        memory_add_fn=memory_add_fn,
+        memory_deadline=config.get("agent", {}).get("memory_deadline"),
+        context_manager=ContextManager.from_config(config.get("agent", {}).get("context")),
     )
 
     gradio_ui = GradioUI(agent)
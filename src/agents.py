@@ -1,23 +1,222 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
 from smolagents import CodeAgent
+from smolagents.memory import TaskStep
+
+from src.llm import ModelWrapper, route_to_loop
+
+# Default number of worker threads shared by arun() sessions (agent.async_workers), which caps concurrent sessions
+DEFAULT_ASYNC_WORKERS = 32
+# Worker threads running the memory searches of run() and build_prompt()
+PREFETCH_WORKERS = 8
+# Prefetched searches kept per agent until build_prompt() claims them; the oldest is dropped beyond this
+MAX_PENDING_PREFETCHES = 16
+
+_executor = None
+_prefetch_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_agent_executor(max_workers=DEFAULT_ASYNC_WORKERS):
+    """
+    Get the thread pool that arun() executes agent steps and tool calls in.
+
+    Args:
+        max_workers: Pool size used when the pool is first created; each
+            running arun() session holds one thread, so this is the maximum
+            number of sessions running at once
+
+    Returns:
+        Shared ThreadPoolExecutor instance
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent")
+        return _executor
+
+
+def _get_prefetch_executor():
+    # Separate from the arun() pool so a prefetch never waits behind the agent loops that need it
+    global _prefetch_executor
+    with _executor_lock:
+        if _prefetch_executor is None:
+            _prefetch_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="memory-prefetch")
+        return _prefetch_executor
+
+
+def _timed_search(search_fn, user_message, user_id):
+    started = time.perf_counter()
+    memories = search_fn(user_message, user_id)
+    return memories, time.perf_counter() - started
+
+
+def log_time_to_first_token(memory_step, agent):
+    """
+    Step callback recording the time to first token of a step's model call.
+
+    The value is stored on the step as time_to_first_token and printed. It
+    is only available for streamed calls on a model from LLMProvider.get_llm.
+
+    Args:
+        memory_step: The step that just finished
+        agent: The agent running the step
+    """
+    ttft = getattr(agent.model, "last_time_to_first_token", None)
+    memory_step.time_to_first_token = ttft
+    if ttft is not None:
+        print(f"[Agent] Step {memory_step.step_number}: time to first token {ttft:.2f}s")
+
+
+def _session_tools(tools):
+    # Tools with per-session state (e.g. ExecuteCommandTool's shell) get a private copy per agent
+    return [tool.for_session() if hasattr(tool, "for_session") else tool for tool in tools]
 
 
 class AugmentedCodeAgent(CodeAgent):
-    def __init__(self, *args, memory_search_fn=None, memory_add_fn=None, **kwargs):
+    """
+    CodeAgent with memory retrieval, context compaction and an async entry point.
+
+    An agent instance holds the state of one session (its memory steps,
+    shell session and prefetched searches), so it runs one task at a time;
+    use one agent per concurrent session.
+
+    With a memory_search_fn, run() searches the user's memories in the
+    background while the system prompt is rendered and the run is set up,
+    and adds them to the task before the first model call. With a
+    memory_add_fn, the task and its final answer are stored afterwards.
+    """
+
+    def __init__(
+        self,
+        *args,
+        memory_search_fn=None,
+        memory_add_fn=None,
+        context_manager=None,
+        memory_deadline=None,
+        **kwargs,
+    ):
+        if "tools" in kwargs:
+            kwargs["tools"] = _session_tools(kwargs["tools"])
+        elif args:
+            args = (_session_tools(args[0]),) + args[1:]
         super().__init__(*args, **kwargs)
+        if not isinstance(self.model, ModelWrapper):
+            # arun() routes calls to its loop in the innermost wrapper
+            self.model = ModelWrapper(self.model)
+        self._arun_lock = threading.Lock()
         self.memory_search_fn = memory_search_fn
         self.memory_add_fn = memory_add_fn
+        self.context_manager = context_manager
+        # Seconds a run waits for memories before starting without them (None waits)
+        self.memory_deadline = memory_deadline
+        # Per-turn timings of the memory search, see _record_prompt_timing
+        self.prompt_timings = []
+        self._prefetches = OrderedDict()
+        self._prefetch_lock = threading.Lock()
+        # (search future, user_id, start time) of the run being set up, see run()
+        self._memory_turn = None
 
-    def build_prompt(self, user_message, user_id="default_user"):
-        # Retrieve relevant memories
-        memories = []
-        if self.memory_search_fn:
-            memories = self.memory_search_fn(user_message, user_id)
-        memories_str = "\n".join(f"- {entry['memory']}" for entry in memories)
-        # Compose prompt with memories
-        system_prompt = (
-            "You are a helpful AI. Use the following user memories to inform your answer.\n"
-            f"User Memories:\n{memories_str}\n"
+    def write_memory_to_messages(self, summary_mode=False):
+        if self.context_manager is None:
+            return super().write_memory_to_messages(summary_mode=summary_mode)
+        # Same messages as the base class, grouped by step so old steps can be compacted
+        prefix = self.memory.system_prompt.to_messages(summary_mode=summary_mode)
+        steps = [
+            (memory_step, memory_step.to_messages(summary_mode=summary_mode))
+            for memory_step in self.memory.steps
+        ]
+        return self.context_manager.compact(prefix, steps, step_number=self.step_number)
+
+    def prefetch_memories(self, user_message, user_id="default_user"):
+        """
+        Start the memory search for a user message in the background.
+
+        Call it as soon as the message arrives; run() or build_prompt() for
+        the same message and user then uses the prefetched search instead of
+        starting its own. Unclaimed searches are dropped (and cancelled if not started)
+        once more than MAX_PENDING_PREFETCHES are pending.
+
+        Args:
+            user_message: The user's message
+            user_id: User identifier
+
+        Returns:
+            Future of (memories, search seconds), or None without a memory_search_fn
+        """
+        if not self.memory_search_fn:
+            return None
+        with self._prefetch_lock:
+            future = self._prefetches.get((user_message, user_id))
+            if future is None:
+                future = _get_prefetch_executor().submit(
+                    _timed_search, self.memory_search_fn, user_message, user_id
+                )
+                self._prefetches[(user_message, user_id)] = future
+                while len(self._prefetches) > MAX_PENDING_PREFETCHES:
+                    _, dropped = self._prefetches.popitem(last=False)
+                    dropped.cancel()
+            return future
+
+    def _await_memories(self, future, started):
+        # Returns (memories, search seconds or None if the deadline was missed)
+        if future is None:
+            return [], 0.0
+        timeout = None
+        if self.memory_deadline is not None:
+            timeout = max(self.memory_deadline - (time.perf_counter() - started), 0.0)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            print(
+                f"[Agent] Memory search missed the {self.memory_deadline:.2f}s deadline; "
+                "sending the prompt without memories"
+            )
+            return [], None
+
+    def _claim_prefetch(self, user_message, user_id):
+        # The prefetched search of this message, or a new one
+        with self._prefetch_lock:
+            future = self._prefetches.pop((user_message, user_id), None)
+        if future is None:
+            future = self.prefetch_memories(user_message, user_id)
+            with self._prefetch_lock:
+                self._prefetches.pop((user_message, user_id), None)
+        return future
+
+    def _record_prompt_timing(self, search_seconds, assembly_seconds, wall_seconds):
+        """
+        Record how long preparing a turn took and how much the concurrent search saved.
+
+        Saved time is what running the search and the assembly back to back
+        would have added: search + assembly - wall. When the deadline was
+        missed, the search's full duration is unknown and the time not spent
+        waiting for it is not counted.
+        """
+        missed = search_seconds is None
+        saved = 0.0 if missed else max(search_seconds + assembly_seconds - wall_seconds, 0.0)
+        self.prompt_timings.append(
+            {
+                "memory_seconds": search_seconds,
+                "assembly_seconds": assembly_seconds,
+                "wall_seconds": wall_seconds,
+                "saved_seconds": saved,
+                "deadline_missed": missed,
+            }
         )
+        if not missed and search_seconds:
+            print(f"[Agent] Memory search {search_seconds:.3f}s overlapped with prompt assembly, saved {saved:.3f}s")
+
+    def build_prompt(self, user_message, user_id="default_user"):
+        started = time.perf_counter()
+        # Retrieve relevant memories concurrently with the rest of the prompt
+        future = self._claim_prefetch(user_message, user_id)
         # Compose the rest of the prompt as usual
         # This assumes the base class uses a similar prompt structure
         base_prompt = (
@@ -25,6 +224,16 @@ class AugmentedCodeAgent(CodeAgent):
             if hasattr(super(), "build_prompt")
             else []
         )
+        assembly_seconds = time.perf_counter() - started
+
+        memories, search_seconds = self._await_memories(future, started)
+        memories_str = "\n".join(f"- {entry['memory']}" for entry in memories)
+        # Compose prompt with memories
+        system_prompt = (
+            "You are a helpful AI. Use the following user memories to inform your answer.\n"
+            f"User Memories:\n{memories_str}\n"
+        )
+        self._record_prompt_timing(search_seconds, assembly_seconds, time.perf_counter() - started)
         # Prepend the system prompt with memories
         if (
             base_prompt
@@ -39,6 +248,62 @@ class AugmentedCodeAgent(CodeAgent):
                 {"role": "user", "content": user_message},
             ]
 
+    def run(self, task, *args, user_id="default_user", **kwargs):
+        """
+        Run a task, with the user's memories when a memory_search_fn is set.
+
+        The search starts before the base class renders the system prompt
+        and sets up the run, and is awaited (up to memory_deadline) just
+        before the first step; the memories found are appended to the task.
+
+        Args:
+            task: Task to perform
+            *args: Arguments passed on to CodeAgent.run()
+            user_id: User whose memories are searched and stored
+            **kwargs: Arguments passed on to CodeAgent.run()
+
+        Returns:
+            Result of CodeAgent.run()
+        """
+        future = self._claim_prefetch(task, user_id)
+        self._memory_turn = (future, user_id, time.perf_counter())
+        try:
+            return super().run(task, *args, **kwargs)
+        finally:
+            self._memory_turn = None
+
+    def _run_stream(self, task, max_steps, images=None):
+        # Called by CodeAgent.run(); a streamed run's generator outlives run(), so the turn is taken now
+        memory_turn, self._memory_turn = self._memory_turn, None
+        if memory_turn is None:
+            return super()._run_stream(task=task, max_steps=max_steps, images=images)
+        return self._run_stream_with_memories(memory_turn, task, max_steps, images)
+
+    def _run_stream_with_memories(self, memory_turn, task, max_steps, images):
+        future, user_id, started = memory_turn
+        user_task = task
+        if future is not None:
+            assembly_seconds = time.perf_counter() - started
+            memories, search_seconds = self._await_memories(future, started)
+            self._record_prompt_timing(search_seconds, assembly_seconds, time.perf_counter() - started)
+            if memories:
+                memories_str = "\n".join(f"- {entry['memory']}" for entry in memories)
+                task = f"{task}\n\nUse the following user memories to inform your answer:\n{memories_str}"
+                self._replace_task(user_task, task)
+        last = None
+        for last in super()._run_stream(task=task, max_steps=max_steps, images=images):
+            yield last
+        # The final answer step (or, on older smolagents, the answer itself) comes last
+        self.after_turn(user_task, str(getattr(last, "output", last)), user_id)
+
+    def _replace_task(self, task, new_task):
+        # The task step run() just recorded is the last one with this task
+        self.task = new_task
+        for step in reversed(self.memory.steps):
+            if isinstance(step, TaskStep) and step.task == task:
+                step.task = new_task
+                break
+
     def after_turn(self, user_message, assistant_response, user_id="default_user"):
         if self.memory_add_fn:
             messages = [
@@ -46,3 +311,54 @@ class AugmentedCodeAgent(CodeAgent):
                 {"role": "assistant", "content": assistant_response},
             ]
             self.memory_add_fn(messages, user_id)
+
+    async def arun(self, task, async_model=None, executor=None, **kwargs):
+        """
+        Run a task without blocking the event loop.
+
+        The agent loop itself (prompt building, code execution and tool calls)
+        stays synchronous and runs in a bounded worker pool. If async_model is
+        given, the model calls made by that loop are sent through it on the
+        calling event loop, so the network waits of many concurrent sessions
+        share one loop and one connection pool. The route applies only to
+        the worker thread running this task.
+
+        The task holds its worker thread for the whole run, including while
+        its model calls are awaited on the loop, so the number of sessions
+        running at once is capped by the executor's size (agent.async_workers
+        for the shared pool); further sessions wait for a free thread.
+
+        Args:
+            task: Task to perform
+            async_model: Optional AsyncModel for the same endpoint as self.model
+                (see LLMProvider.get_async_llm)
+            executor: Optional executor to run the agent loop in (default:
+                the shared pool from get_agent_executor)
+            **kwargs: Arguments passed on to run()
+
+        Returns:
+            Result of run()
+
+        Raises:
+            RuntimeError: If another arun() of this agent is still in progress
+        """
+        if not self._arun_lock.acquire(blocking=False):
+            raise RuntimeError("This agent is already running a task; use one agent per concurrent session")
+        try:
+            loop = asyncio.get_running_loop()
+            executor = executor or get_agent_executor()
+            # Context variables such as the scheduling priority follow the task into the worker
+            context = contextvars.copy_context()
+
+            def run():
+                if async_model is None:
+                    return self.run(task, **kwargs)
+                route_to_loop(loop, async_model)
+                try:
+                    return self.run(task, **kwargs)
+                finally:
+                    route_to_loop(None, None)
+
+            return await loop.run_in_executor(executor, lambda: context.run(run))
+        finally:
+            self._arun_lock.release()
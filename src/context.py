@@ -0,0 +1,183 @@
+"""
+Context-window management for agents.
+
+Keeps the messages re-sent to the model at every step within a token
+budget by compacting the oldest steps while leaving the most recent ones
+verbatim.
+"""
+
+import dataclasses
+from typing import Any, List, Optional, Tuple
+
+DEFAULT_MAX_TOKENS = 64000
+DEFAULT_KEEP_RECENT_STEPS = 3
+DEFAULT_OBSERVATION_CHARS = 2000
+# Rough characters per token used to estimate prompt size without a tokenizer
+DEFAULT_CHARS_PER_TOKEN = 4
+# Characters of an elided step's model output kept in its summary
+SUMMARY_CHARS = 300
+
+# Roles whose messages carry tool output
+_OBSERVATION_ROLES = ("tool-response",)
+
+
+def _role(message: Any) -> str:
+    role = message["role"] if isinstance(message, dict) else message.role
+    return getattr(role, "value", role)
+
+
+def _text(message: Any) -> str:
+    content = message["content"] if isinstance(message, dict) else message.content
+    if isinstance(content, list):
+        return "\n".join(part.get("text", "") for part in content if part.get("type") == "text")
+    return content or ""
+
+
+def _with_text(message: Any, text: str) -> Any:
+    # Messages belong to the agent's memory steps, so copies are returned
+    content = [{"type": "text", "text": text}]
+    if isinstance(message, dict):
+        return {**message, "content": content}
+    return dataclasses.replace(message, content=content)
+
+
+class ContextManager:
+    """
+    Enforces a token budget on the messages built from an agent's memory.
+
+    When the estimated size exceeds max_tokens, the steps older than the
+    keep_recent_steps most recent ones are compacted oldest first: first
+    their tool observations are truncated to their head and tail, then, if
+    that is not enough, whole steps are replaced by a one-line summary. The
+    system prompt and the task are never compacted.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = DEFAULT_MAX_TOKENS,
+        keep_recent_steps: int = DEFAULT_KEEP_RECENT_STEPS,
+        observation_chars: int = DEFAULT_OBSERVATION_CHARS,
+        chars_per_token: float = DEFAULT_CHARS_PER_TOKEN,
+    ):
+        """
+        Initialize the manager.
+
+        Args:
+            max_tokens: Token budget of the messages sent to the model
+            keep_recent_steps: Number of most recent steps always kept verbatim
+            observation_chars: Characters an old observation is truncated to
+            chars_per_token: Characters per token used for estimating sizes
+        """
+        self.max_tokens = max_tokens
+        self.keep_recent_steps = keep_recent_steps
+        self.observation_chars = observation_chars
+        self.chars_per_token = chars_per_token
+        self.tokens_saved = 0
+        # (step number, tokens before, tokens after) of every compaction
+        self.history: List[Tuple[int, int, int]] = []
+
+    @classmethod
+    def from_config(cls, config: Optional[dict]) -> Optional["ContextManager"]:
+        """
+        Create a manager from the agent.context configuration section.
+
+        Args:
+            config: Dictionary with optional max_tokens, keep_recent_steps,
+                observation_chars and chars_per_token
+
+        Returns:
+            ContextManager instance, or None if the section is missing or disabled
+        """
+        if not config or not config.get("enabled", True):
+            return None
+        return cls(
+            max_tokens=config.get("max_tokens", DEFAULT_MAX_TOKENS),
+            keep_recent_steps=config.get("keep_recent_steps", DEFAULT_KEEP_RECENT_STEPS),
+            observation_chars=config.get("observation_chars", DEFAULT_OBSERVATION_CHARS),
+            chars_per_token=config.get("chars_per_token", DEFAULT_CHARS_PER_TOKEN),
+        )
+
+    def estimate_tokens(self, messages: List[Any]) -> int:
+        """
+        Estimate the token count of messages.
+
+        Args:
+            messages: ChatMessages or message dicts
+
+        Returns:
+            Estimated number of tokens
+        """
+        chars = sum(len(_text(message)) for message in messages)
+        return int(chars / self.chars_per_token) + 4 * len(messages)
+
+    def _truncate(self, text: str) -> str:
+        if len(text) <= self.observation_chars:
+            return text
+        half = self.observation_chars // 2
+        omitted = len(text) - 2 * half
+        return f"{text[:half]}\n... [{omitted} characters truncated to save context] ...\n{text[-half:]}"
+
+    def _summarize(self, step: Any, messages: List[Any]) -> List[Any]:
+        outputs = [_text(m) for m in messages if _role(m) == "assistant"]
+        summary = " ".join(" ".join(outputs).split())[:SUMMARY_CHARS]
+        label = f"Step {step.step_number}" if hasattr(step, "step_number") else "Plan"
+        text = f"[{label} elided to save context. Model output began: {summary}]"
+        return [_with_text(messages[0], text)] if messages else []
+
+    def compact(
+        self,
+        prefix: List[Any],
+        steps: List[Tuple[Any, List[Any]]],
+        step_number: Optional[int] = None,
+    ) -> List[Any]:
+        """
+        Build the message list, compacting old steps if over budget.
+
+        Args:
+            prefix: Messages that are never compacted (system prompt)
+            steps: (memory step, messages of that step) pairs, oldest first
+            step_number: Current step number, used in the log line
+
+        Returns:
+            Messages to send to the model
+        """
+        groups = [list(messages) for _, messages in steps]
+        sizes = [self.estimate_tokens(group) for group in groups]
+        before = self.estimate_tokens(prefix) + sum(sizes)
+        total = before
+        if total <= self.max_tokens:
+            return prefix + [m for group in groups for m in group]
+
+        # Task steps and the most recent steps are kept verbatim
+        compactable = [
+            index
+            for index, (step, _) in enumerate(steps[: max(len(steps) - self.keep_recent_steps, 0)])
+            if hasattr(step, "step_number") or hasattr(step, "plan")
+        ]
+        for index in compactable:
+            if total <= self.max_tokens:
+                break
+            group = [
+                _with_text(m, self._truncate(_text(m)))
+                if _role(m) in _OBSERVATION_ROLES and len(_text(m)) > self.observation_chars
+                else m
+                for m in groups[index]
+            ]
+            size = self.estimate_tokens(group)
+            total += size - sizes[index]
+            groups[index], sizes[index] = group, size
+        for index in compactable:
+            if total <= self.max_tokens:
+                break
+            group = self._summarize(steps[index][0], groups[index])
+            size = self.estimate_tokens(group)
+            total += size - sizes[index]
+            groups[index], sizes[index] = group, size
+
+        self.tokens_saved += before - total
+        self.history.append((step_number, before, total))
+        print(
+            f"[ContextManager] Step {step_number}: ~{before} -> ~{total} tokens "
+            f"({before - total} saved, budget {self.max_tokens})"
+        )
+        return prefix + [m for group in groups for m in group]
@@ -0,0 +1,354 @@
+"""
+Cache of text embeddings shared by memory search and add.
+
+Embeddings are keyed by a hash of the embedder and the text, kept in an
+in-process LRU bounded in bytes, and optionally in a size-bounded SQLite
+tier under the data dir that survives restarts.
+"""
+
+import collections
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Default memory ceiling of the in-process tier
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Default size bound of the on-disk tier
+DEFAULT_DISK_MAX_BYTES = 1024 * 1024 * 1024
+# Sub-directory of the data dir holding the on-disk tier
+CACHE_DIR_NAME = "embedding_cache"
+# Eviction frees space down to this fraction of the bound so it runs rarely
+EVICTION_LOW_WATER = 0.9
+
+
+def embedding_key(namespace: str, text: str) -> str:
+    """
+    Compute the cache key of an embedding.
+
+    Args:
+        namespace: Identifies the embedder (and anything else the vector depends on)
+        text: Embedded text
+
+    Returns:
+        Hex digest of the namespace and text
+    """
+    return hashlib.sha256(f"{namespace}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache of float32 embedding vectors.
+
+    The in-process tier is an LRU holding at most max_bytes of vectors. If
+    a disk path is given, vectors are also written to a SQLite database
+    bounded by disk_max_bytes (least recently used entries are evicted),
+    and in-process misses are looked up there.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        disk_path: Optional[str] = None,
+        disk_max_bytes: int = DEFAULT_DISK_MAX_BYTES,
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            max_bytes: Memory ceiling of the in-process tier
+            disk_path: Path of the SQLite database of the on-disk tier (None disables it)
+            disk_max_bytes: Maximum total size of vectors on disk
+        """
+        self.max_bytes = max_bytes
+        self.disk_path = disk_path
+        self.disk_max_bytes = disk_max_bytes
+        self._entries: "collections.OrderedDict[str, np.ndarray]" = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._conn = None
+        self._disk_bytes = 0
+        if disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            self._conn = sqlite3.connect(disk_path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_accessed ON embeddings (accessed)")
+            self._disk_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+
+    @classmethod
+    def from_config(cls, config: dict, data_dir: Optional[str] = None) -> "EmbeddingCache":
+        """
+        Create a cache from the memory.embedding_cache configuration section.
+
+        Args:
+            config: Dictionary with optional max_bytes, disk, disk_max_bytes and path
+            data_dir: Directory the database is placed under if no path is given
+
+        Returns:
+            EmbeddingCache instance
+        """
+        disk_path = None
+        if config.get("disk", False):
+            disk_path = config.get("path") or os.path.join(
+                data_dir or "./data", CACHE_DIR_NAME, "embeddings.sqlite3"
+            )
+        return cls(
+            max_bytes=config.get("max_bytes", DEFAULT_MAX_BYTES),
+            disk_path=disk_path,
+            disk_max_bytes=config.get("disk_max_bytes", DEFAULT_DISK_MAX_BYTES),
+        )
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        # Called with the lock held
+        if vector.nbytes > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous.nbytes
+        self._entries[key] = vector
+        self._bytes += vector.nbytes
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Look up embeddings.
+
+        Args:
+            keys: Keys from embedding_key
+
+        Returns:
+            Dictionary of the keys found to their vectors
+        """
+        found = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is None:
+                    missing.append(key)
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = vector
+                self.hits += 1
+            if missing and self._conn is not None:
+                now = time.time()
+                for start in range(0, len(missing), 500):
+                    chunk = missing[start:start + 500]
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        self._remember(key, vector)
+                        found[key] = vector
+                        self.disk_hits += 1
+                    self._conn.executemany(
+                        "UPDATE embeddings SET accessed = ? WHERE key = ?", [(now, key) for key, _ in rows]
+                    )
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        """
+        Store embeddings in both tiers.
+
+        Args:
+            items: Dictionary of keys to vectors
+        """
+        with self._lock:
+            rows = []
+            for key, vector in items.items():
+                vector = np.array(vector, dtype=np.float32).reshape(-1)
+                vector.setflags(write=False)
+                self._remember(key, vector)
+                rows.append((key, vector.tobytes(), vector.nbytes))
+            if self._conn is None or not rows:
+                return
+            now = time.time()
+            keys = [row[0] for row in rows]
+            previous = 0
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                previous += self._conn.execute(
+                    f"SELECT COALESCE(SUM(size), 0) FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchone()[0]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, size, accessed) VALUES (?, ?, ?, ?)",
+                [(key, blob, size, now) for key, blob, size in rows],
+            )
+            self._disk_bytes += sum(row[2] for row in rows) - previous
+            if self._disk_bytes > self.disk_max_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        target = self._disk_bytes - int(self.disk_max_bytes * EVICTION_LOW_WATER)
+        victims, freed = [], 0
+        for key, size in self._conn.execute("SELECT key, size FROM embeddings ORDER BY accessed"):
+            victims.append((key,))
+            freed += size
+            if freed >= target:
+                break
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", victims)
+        self._disk_bytes -= freed
+        self.evictions += len(victims)
+
+    def clear(self) -> None:
+        """Remove all entries from both tiers."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM embeddings")
+                self._disk_bytes = 0
+
+    def stats(self) -> dict:
+        """
+        Get cache statistics.
+
+        Returns:
+            Dictionary with hits, disk_hits, misses, hit_rate, evictions,
+            entries, bytes, max_bytes and, with a disk tier, disk_entries and disk_bytes
+        """
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            stats = {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+            if self._conn is not None:
+                stats["disk_entries"] = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                stats["disk_bytes"] = self._disk_bytes
+            return stats
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class CachedEmbedder:
+    """
+    Embedder wrapper for LocalMemory serving repeated texts from an EmbeddingCache.
+
+    Texts missing from the cache are embedded with a single call of the
+    wrapped embedder (duplicates within a batch are embedded once). Keys
+    cover the embedder's name, dimensions, model and endpoint, so embedders
+    sharing a name never serve each other's vectors.
+    """
+
+    stats_name = "embedding_cache"
+
+    def __init__(self, embedder: Any, cache: EmbeddingCache):
+        """
+        Initialize the wrapper.
+
+        Args:
+            embedder: Embedder with embed(texts) -> normalized float32 array and a name
+            cache: Cache the vectors are stored in
+        """
+        self.embedder = embedder
+        self.cache = cache
+        self.namespace = ":".join(
+            str(getattr(embedder, attribute, None)) for attribute in ("name", "dimensions", "model", "api_base")
+        )
+
+    def __getattr__(self, name: str) -> Any:
+        # Only reached for attributes not found on the wrapper itself (name, dimensions, ...)
+        if name in ("embedder", "namespace"):
+            raise AttributeError(name)
+        return getattr(self.embedder, name)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return self.embedder.embed(texts)
+        keys = [embedding_key(self.namespace, text) for text in texts]
+        found = self.cache.get_many(keys)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        if missing:
+            vectors = self.embedder.embed(list(missing.values()))
+            computed = dict(zip(missing, vectors))
+            self.cache.put_many(computed)
+            found.update(computed)
+        return np.stack([found[key] for key in keys]).astype(np.float32, copy=False)
+
+    def stats(self) -> dict:
+        return self.cache.stats()
+
+
+class CachedMem0Embedder:
+    """
+    Wrapper of a mem0 embedding model serving repeated texts from an EmbeddingCache.
+
+    Vectors are cached as float32; the precision lost is far below what
+    similarity search can tell apart. Texts are stripped before they are
+    embedded, and the memory action (add, update or search) is only part
+    of the key for embedders configured to embed differently per action.
+    """
+
+    stats_name = "embedding_cache"
+
+    def __init__(self, embedding_model: Any, cache: EmbeddingCache):
+        """
+        Initialize the wrapper.
+
+        Args:
+            embedding_model: mem0 embedder with embed(text, memory_action=None) -> list of floats
+            cache: Cache the vectors are stored in
+        """
+        self.embedding_model = embedding_model
+        self.cache = cache
+        config = getattr(embedding_model, "config", None)
+        self.namespace = (
+            f"mem0:{type(embedding_model).__name__}:{getattr(config, 'model', None)}"
+            f":{getattr(config, 'embedding_dims', None)}"
+        )
+        # Only some providers (e.g. Vertex AI task types) embed differently for search and add
+        self.action_aware = any(
+            getattr(config, f"memory_{action}_embedding_type", None) for action in ("add", "update", "search")
+        )
+
+    def __getattr__(self, name: str) -> Any:
+        if name in ("embedding_model", "namespace", "action_aware"):
+            raise AttributeError(name)
+        return getattr(self.embedding_model, name)
+
+    def embed(self, text, memory_action=None):
+        text = text.strip()
+        namespace = f"{self.namespace}:{memory_action}" if self.action_aware else self.namespace
+        key = embedding_key(namespace, text)
+        found = self.cache.get_many([key])
+        if key in found:
+            return found[key].tolist()
+        vector = self.embedding_model.embed(text, memory_action)
+        self.cache.put_many({key: vector})
+        return vector
+
+    def stats(self) -> dict:
+        return self.cache.stats()
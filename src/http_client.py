@@ -0,0 +1,225 @@
+"""
+Pooled HTTP client shared by the LLM models.
+
+Wraps an httpx transport with keep-alive connection pooling, a bound on
+concurrent requests per host, and counters for in-use, idle and waiting
+connections.
+"""
+
+import threading
+import time
+import weakref
+from typing import Dict, Optional
+
+import httpx
+
+DEFAULT_MAX_CONNECTIONS_PER_HOST = 16
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 32
+DEFAULT_KEEPALIVE_EXPIRY = 60.0
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 600.0
+
+
+class _HostSlot:
+    """Concurrency bound and counters for one host."""
+
+    def __init__(self, limit: int):
+        self.semaphore = threading.BoundedSemaphore(limit)
+        self.in_use = 0
+        self.requests = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """
+    Response stream that frees its host slot when the response is closed.
+
+    A response abandoned without being closed frees its slot when it is
+    garbage collected, so it cannot hold the slot forever.
+    """
+
+    def __init__(self, stream: httpx.SyncByteStream, release):
+        self._stream = stream
+        # Runs release at most once, from close() or when the stream is collected
+        self._release = weakref.finalize(self, release)
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+class PooledTransport(httpx.BaseTransport):
+    """
+    httpx transport with keep-alive pooling and a per-host concurrency bound.
+
+    A request holds its host slot until its response is closed, so streamed
+    completions count as in use for as long as they are being read. Requests
+    beyond the bound wait for a free slot, up to the request's pool timeout
+    (httpx.PoolTimeout is raised after it); the number and duration of
+    those waits are recorded.
+    """
+
+    def __init__(
+        self,
+        max_connections_per_host: int = DEFAULT_MAX_CONNECTIONS_PER_HOST,
+        max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+    ):
+        """
+        Initialize the transport.
+
+        Args:
+            max_connections_per_host: Maximum concurrent requests to one host
+            max_keepalive_connections: Maximum idle connections kept open
+            keepalive_expiry: Seconds an idle connection is kept open
+        """
+        self.max_connections_per_host = max_connections_per_host
+        self._transport = httpx.HTTPTransport(
+            limits=httpx.Limits(
+                max_connections=None,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            )
+        )
+        self._hosts: Dict[str, _HostSlot] = {}
+        self._lock = threading.Lock()
+
+    def _slot(self, host: str) -> _HostSlot:
+        with self._lock:
+            slot = self._hosts.get(host)
+            if slot is None:
+                slot = self._hosts[host] = _HostSlot(self.max_connections_per_host)
+            return slot
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        host = f"{request.url.scheme}://{request.url.netloc.decode('ascii')}"
+        slot = self._slot(host)
+        if not slot.semaphore.acquire(blocking=False):
+            pool_timeout = request.extensions.get("timeout", {}).get("pool")
+            started = time.monotonic()
+            if not slot.semaphore.acquire(timeout=pool_timeout):
+                with self._lock:
+                    slot.timeouts += 1
+                raise httpx.PoolTimeout(
+                    f"No free connection slot for {host} within {pool_timeout} seconds", request=request
+                )
+            with self._lock:
+                slot.waits += 1
+                slot.wait_seconds += time.monotonic() - started
+        with self._lock:
+            slot.in_use += 1
+            slot.requests += 1
+
+        def release():
+            with self._lock:
+                slot.in_use -= 1
+            slot.semaphore.release()
+
+        try:
+            response = self._transport.handle_request(request)
+        except BaseException:
+            release()
+            raise
+        response.stream = _ReleasingStream(response.stream, release)
+        return response
+
+    def close(self) -> None:
+        self._transport.close()
+
+    def stats(self) -> dict:
+        """
+        Get pool statistics.
+
+        Returns:
+            Dictionary with open/idle connection counts and per-host
+            in_use, requests, waits, wait_seconds and timeouts
+        """
+        connections = getattr(getattr(self._transport, "_pool", None), "connections", [])
+        idle = sum(1 for connection in connections if connection.is_idle())
+        with self._lock:
+            hosts = {
+                host: {
+                    "in_use": slot.in_use,
+                    "requests": slot.requests,
+                    "waits": slot.waits,
+                    "wait_seconds": round(slot.wait_seconds, 6),
+                    "timeouts": slot.timeouts,
+                }
+                for host, slot in self._hosts.items()
+            }
+        return {
+            "open_connections": len(connections),
+            "idle_connections": idle,
+            "in_use": sum(host["in_use"] for host in hosts.values()),
+            "waits": sum(host["waits"] for host in hosts.values()),
+            "hosts": hosts,
+        }
+
+
+def build_http_client(config: Optional[dict] = None) -> httpx.Client:
+    """
+    Build a pooled httpx client from the llm.http configuration section.
+
+    Args:
+        config: Dictionary with optional max_connections_per_host,
+            max_keepalive_connections, keepalive_expiry, connect_timeout,
+            read_timeout and pool_timeout (seconds to wait for a free
+            connection slot, default read_timeout)
+
+    Returns:
+        httpx.Client whose transport is a PooledTransport
+    """
+    config = config or {}
+    read_timeout = config.get("read_timeout", DEFAULT_READ_TIMEOUT)
+    transport = PooledTransport(
+        max_connections_per_host=config.get("max_connections_per_host", DEFAULT_MAX_CONNECTIONS_PER_HOST),
+        max_keepalive_connections=config.get("max_keepalive_connections", DEFAULT_MAX_KEEPALIVE_CONNECTIONS),
+        keepalive_expiry=config.get("keepalive_expiry", DEFAULT_KEEPALIVE_EXPIRY),
+    )
+    return httpx.Client(
+        transport=transport,
+        timeout=httpx.Timeout(
+            read_timeout,
+            connect=config.get("connect_timeout", DEFAULT_CONNECT_TIMEOUT),
+            pool=config.get("pool_timeout", read_timeout),
+        ),
+        follow_redirects=True,
+    )
+
+
+def build_async_http_client(config: Optional[dict] = None) -> httpx.AsyncClient:
+    """
+    Build a pooled httpx async client from the llm.http configuration section.
+
+    The async client is bound to the event loop it is first used on. Its
+    connection pool is bounded by max_connections_per_host in total rather
+    than per host, which is equivalent for the usual single-endpoint setup.
+
+    Args:
+        config: Same settings as build_http_client
+
+    Returns:
+        httpx.AsyncClient instance
+    """
+    config = config or {}
+    read_timeout = config.get("read_timeout", DEFAULT_READ_TIMEOUT)
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=config.get("max_connections_per_host", DEFAULT_MAX_CONNECTIONS_PER_HOST),
+            max_keepalive_connections=config.get("max_keepalive_connections", DEFAULT_MAX_KEEPALIVE_CONNECTIONS),
+            keepalive_expiry=config.get("keepalive_expiry", DEFAULT_KEEPALIVE_EXPIRY),
+        ),
+        timeout=httpx.Timeout(
+            read_timeout,
+            connect=config.get("connect_timeout", DEFAULT_CONNECT_TIMEOUT),
+            pool=config.get("pool_timeout", read_timeout),
+        ),
+        follow_redirects=True,
+    )
@@ -3,22 +3,420 @@ LLM implementation for smolagents.
 Provides the core functionality for interacting with language models.
 """
 
+import asyncio
+import inspect
+import json
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+# Per-thread (event loop, AsyncModel) that model calls are routed to, see route_to_loop
+_loop_route = threading.local()
+
+
+def route_to_loop(loop: Optional[asyncio.AbstractEventLoop], async_model: Optional["AsyncModel"]) -> None:
+    """
+    Route the current thread's model calls to an event loop.
+
+    While set, the innermost ModelWrapper sends its calls through
+    async_model.agenerate on loop instead of calling the sync model, so
+    the network waits of many threads are served by one event loop.
+
+    Args:
+        loop: Running event loop to submit calls to (None to clear the route)
+        async_model: AsyncModel for the same endpoint as the sync model
+    """
+    _loop_route.loop = loop
+    _loop_route.model = async_model
+
+
+def current_loop_route() -> Tuple[Optional[asyncio.AbstractEventLoop], Optional["AsyncModel"]]:
+    """
+    Get the current thread's route set by route_to_loop.
+
+    Returns:
+        Tuple of (loop, async_model), both None if calls are not routed
+    """
+    return getattr(_loop_route, "loop", None), getattr(_loop_route, "model", None)
+
+
+class ModelWrapper:
+    """
+    Base class for models that add behaviour around another smolagents model.
+
+    Attributes that are not overridden are delegated to the wrapped model, so
+    a wrapper can be passed to agents in place of the model itself. Both the
+    generate() API of current smolagents releases and the callable API of
+    older ones are supported.
+    """
+
+    def __init__(self, model: Any):
+        """
+        Initialize the wrapper.
+
+        Args:
+            model: The smolagents model (or another wrapper) to wrap
+        """
+        self.model = model
+        self.last_input_token_count: Optional[int] = None
+        self.last_output_token_count: Optional[int] = None
+
+    def __getattr__(self, name: str) -> Any:
+        # Only reached for attributes not found on the wrapper itself
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def __call__(self, messages, **kwargs):
+        return self.generate(messages, **kwargs)
+
+    def generate(self, messages, **kwargs):
+        return self._call_model(messages, **kwargs)
+
+    def generate_stream(self, messages, **kwargs):
+        return self.model.generate_stream(messages, **kwargs)
+
+    def _call_model(self, messages, **kwargs):
+        """
+        Call the wrapped model and record its token counts.
+
+        Args:
+            messages: Messages to send
+            **kwargs: Call arguments; None values are dropped so that older
+                model signatures without e.g. response_format still work
+
+        Returns:
+            The ChatMessage returned by the wrapped model
+        """
+        kwargs = {key: value for key, value in kwargs.items() if value is not None}
+        loop, async_model = current_loop_route()
+        if loop is not None and not isinstance(self.model, ModelWrapper):
+            # Unscheduled variant: any scheduling already happened in the wrapper chain
+            future = asyncio.run_coroutine_threadsafe(
+                async_model.for_model(self.model)._agenerate(messages, **kwargs), loop
+            )
+            message = future.result()
+        else:
+            generate = getattr(self.model, "generate", None) or self.model
+            message = generate(messages, **kwargs)
+        self._record_token_counts(message)
+        return message
+
+    def _record_token_counts(self, message) -> None:
+        usage = getattr(message, "token_usage", None)
+        if usage is not None:
+            self.last_input_token_count = usage.input_tokens
+            self.last_output_token_count = usage.output_tokens
+        else:
+            self.last_input_token_count = getattr(self.model, "last_input_token_count", None)
+            self.last_output_token_count = getattr(self.model, "last_output_token_count", None)
+
+
+class StreamingModel(ModelWrapper):
+    """
+    Outermost model wrapper returned by LLMProvider.get_llm.
+
+    Passes streamed completions through unchanged and records the time to
+    first token of each streamed call. The value is kept per thread, since
+    one model is shared by concurrently running agents.
+    """
+
+    def __init__(self, model: Any):
+        super().__init__(model)
+        self._timing = threading.local()
+
+    @property
+    def last_time_to_first_token(self) -> Optional[float]:
+        """Seconds from the start of the current thread's last call to its first token (None if not streamed)."""
+        return getattr(self._timing, "value", None)
+
+    def generate(self, messages, **kwargs):
+        self._timing.value = None
+        return self._call_model(messages, **kwargs)
+
+    def generate_stream(self, messages, **kwargs):
+        self._timing.value = None
+        started = time.monotonic()
+        for delta in self.model.generate_stream(messages, **kwargs):
+            if self._timing.value is None and (delta.content or delta.tool_calls):
+                self._timing.value = time.monotonic() - started
+            if delta.token_usage is not None:
+                self.last_input_token_count = delta.token_usage.input_tokens
+                self.last_output_token_count = delta.token_usage.output_tokens
+            yield delta
+
+
+class AsyncModel:
+    """
+    Asynchronous counterpart of an OpenAIServerModel.
+
+    Requests are built by the sync model's own completion-kwargs logic and
+    sent with an AsyncOpenAI client, so many calls can be awaited
+    concurrently on one event loop.
+    """
+
+    def __init__(self, model: Any, http_config: Optional[dict] = None, scheduler: Any = None):
+        """
+        Initialize the model.
+
+        Args:
+            model: OpenAIServerModel whose endpoint and parameters are used
+            http_config: Pool settings for the async HTTP client (the llm.http config section)
+            scheduler: Optional RateLimitScheduler calls are admitted through
+        """
+        self.model = model
+        self.model_id = model.model_id
+        self.http_config = http_config
+        self.scheduler = scheduler
+        self.last_input_token_count: Optional[int] = None
+        self.last_output_token_count: Optional[int] = None
+        self._client = None
+        # AsyncModels for other endpoints, see for_model
+        self._siblings: Dict[int, "AsyncModel"] = {}
+        self._siblings_lock = threading.Lock()
+
+    def for_model(self, model: Any) -> "AsyncModel":
+        """
+        Get the AsyncModel for the endpoint of a sync model.
+
+        Calls routed to the loop by a RouterModel go to the endpoint the
+        router picked; models for endpoints other than this one's are created
+        on first use with the same HTTP settings and scheduler.
+
+        Args:
+            model: OpenAIServerModel a routed call was made on
+
+        Returns:
+            This AsyncModel if model is for the same endpoint, otherwise its sibling for model
+        """
+        if model is self.model or (
+            getattr(model, "model_id", None) == self.model_id
+            and getattr(model, "client_kwargs", None) == getattr(self.model, "client_kwargs", None)
+        ):
+            return self
+        with self._siblings_lock:
+            sibling = self._siblings.get(id(model))
+            if sibling is None or sibling.model is not model:
+                sibling = self._siblings[id(model)] = AsyncModel(model, self.http_config, self.scheduler)
+            return sibling
+
+    @property
+    def client(self):
+        # Created lazily because the async HTTP client binds to the running loop
+        if self._client is None:
+            import openai
+            from src.http_client import build_async_http_client
+
+            client_kwargs = dict(getattr(self.model, "client_kwargs", None) or {})
+            if not client_kwargs:
+                client_kwargs = {
+                    "api_key": self.model.client.api_key,
+                    "base_url": str(self.model.client.base_url),
+                }
+            client_kwargs["http_client"] = build_async_http_client(self.http_config)
+            self._client = openai.AsyncOpenAI(**client_kwargs)
+        return self._client
+
+    async def agenerate(
+        self,
+        messages,
+        stop_sequences=None,
+        response_format=None,
+        tools_to_call_from=None,
+        **kwargs,
+    ):
+        """
+        Generate a response.
+
+        Args:
+            messages: Messages to send
+            stop_sequences: Optional stop sequences
+            response_format: Optional response format
+            tools_to_call_from: Optional tools the model may call
+            **kwargs: Other completion arguments
+
+        Returns:
+            ChatMessage with the response
+        """
+        kwargs.update(
+            stop_sequences=stop_sequences,
+            response_format=response_format,
+            tools_to_call_from=tools_to_call_from,
+        )
+        if self.scheduler is None:
+            return await self._agenerate(messages, **kwargs)
+
+        from src.llm_scheduler import _is_rate_limited, _total_tokens, estimate_tokens
+
+        estimated = estimate_tokens(messages)
+        attempt = 0
+        while True:
+            await self.scheduler.aacquire(estimated)
+            try:
+                message, usage = await self._acomplete(messages, **kwargs)
+            except Exception as e:
+                self.scheduler.settle(estimated, 0)
+                if not _is_rate_limited(e) or attempt >= self.scheduler.max_retries:
+                    raise
+                await asyncio.sleep(self.scheduler.backoff(attempt, e))
+                attempt += 1
+                continue
+            # This call's own usage; the last_* attributes may already belong to a concurrent call
+            self.scheduler.settle(estimated, _total_tokens(*usage, estimated))
+            return message
+
+    async def _agenerate(self, messages, **kwargs):
+        message, _ = await self._acomplete(messages, **kwargs)
+        return message
+
+    async def _acomplete(
+        self,
+        messages,
+        stop_sequences=None,
+        response_format=None,
+        tools_to_call_from=None,
+        **kwargs,
+    ):
+        """Send one request and return (ChatMessage, (input tokens, output tokens)); counts are None if not reported."""
+        from smolagents.models import ChatMessage
+
+        if response_format is not None:
+            kwargs["response_format"] = response_format
+        completion_kwargs = self.model._prepare_completion_kwargs(
+            messages=messages,
+            stop_sequences=stop_sequences,
+            tools_to_call_from=tools_to_call_from,
+            model=self.model_id,
+            custom_role_conversions=self.model.custom_role_conversions,
+            convert_images_to_image_urls=True,
+            **kwargs,
+        )
+        response = await self.client.chat.completions.create(**completion_kwargs)
+        usage = getattr(response, "usage", None)
+        input_tokens = getattr(usage, "prompt_tokens", None)
+        output_tokens = getattr(usage, "completion_tokens", None)
+        self.last_input_token_count = input_tokens
+        self.last_output_token_count = output_tokens
+
+        data = json.loads(
+            response.choices[0].message.model_dump_json(include={"role", "content", "tool_calls"})
+        )
+        if stop_sequences and data.get("content") and not getattr(self.model, "supports_stop_parameter", True):
+            for stop in stop_sequences:
+                data["content"] = data["content"].split(stop)[0]
+        try:
+            from smolagents.monitoring import TokenUsage
+        except ImportError:
+            # Older smolagents releases track token counts on the model only
+            return ChatMessage.from_dict(data, raw=response), (input_tokens, output_tokens)
+        token_usage = None
+        if input_tokens is not None or output_tokens is not None:
+            token_usage = TokenUsage(input_tokens=input_tokens or 0, output_tokens=output_tokens or 0)
+        return ChatMessage.from_dict(data, raw=response, token_usage=token_usage), (input_tokens, output_tokens)
+
+    async def aclose(self) -> None:
+        with self._siblings_lock:
+            siblings, self._siblings = list(self._siblings.values()), {}
+        for sibling in siblings:
+            await sibling.aclose()
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
 class LLMProvider:
     """
     Provider class for language model functionality.
     Handles access to LLM instances.
     """
-    
+
+    # Process-wide pooled HTTP client shared by every model returned by get_llm
+    _http_client = None
+    _http_lock = threading.Lock()
+    # Process-wide rate limit scheduler shared by every model returned by get_llm
+    _scheduler = None
+
     @staticmethod
-    def get_llm(config):
+    def get_http_client(config=None):
         """
-        Get an LLM instance based on the provided configuration.
+        Get the process-wide pooled HTTP client, creating it on first use.
+
+        The client is created from the configuration of the first call;
+        later calls share it regardless of their configuration.
+
+        Args:
+            config: Dictionary of pool settings (the llm.http config section)
+
+        Returns:
+            Shared httpx.Client instance
+        """
+        with LLMProvider._http_lock:
+            if LLMProvider._http_client is None:
+                from src.http_client import build_http_client
+
+                LLMProvider._http_client = build_http_client(config)
+            return LLMProvider._http_client
+
+    @staticmethod
+    def get_scheduler(config=None):
+        """
+        Get the process-wide rate limit scheduler, creating it on first use.
+
+        Args:
+            config: Dictionary of rate limits (the llm.rate_limit config section)
+
+        Returns:
+            Shared RateLimitScheduler instance
+        """
+        with LLMProvider._http_lock:
+            if LLMProvider._scheduler is None:
+                from src.llm_scheduler import RateLimitScheduler
+
+                LLMProvider._scheduler = RateLimitScheduler.from_config(config or {})
+            return LLMProvider._scheduler
+
+    @staticmethod
+    def get_http_stats():
+        """
+        Get statistics of the shared HTTP connection pool.
+
+        Returns:
+            Dictionary of pool statistics, or an empty dictionary if no client was created yet
+        """
+        client = LLMProvider._http_client
+        if client is None:
+            return {}
+        return client._transport.stats()
+
+    @staticmethod
+    def _client_kwargs(config):
+        client_kwargs = {"http_client": LLMProvider.get_http_client(config.get("http"))}
+        if config.get("rate_limit"):
+            # 429s are retried by the shared scheduler instead of by each client
+            client_kwargs["max_retries"] = 0
+        return client_kwargs
+
+    @staticmethod
+    def _retry_kwargs(config, model_class):
+        # smolagents >= 1.20 retries rate-limited calls itself; with a scheduler that
+        # would stack minute-long waits on top of the scheduler's backoff
+        if not config.get("rate_limit"):
+            return {}
+        for cls in model_class.__mro__:
+            if "__init__" in cls.__dict__ and "retry" in inspect.signature(cls.__init__).parameters:
+                return {"retry": False}
+        return {}
+
+    @staticmethod
+    def _build_model(config):
+        """
+        Build the OpenAIServerModel described by an llm config section.
 
         Args:
             config: Dictionary containing LLM configuration parameters
 
         Returns:
-            Configured OpenAIServerModel instance for litellm or openrouter provider.
+            OpenAIServerModel instance for litellm or openrouter provider
         """
         from smolagents.models import OpenAIServerModel
         
@@ -43,8 +441,111 @@ class LLMProvider:
                 api_key=api_key,
                 temperature=temperature,
                 max_tokens=max_tokens,
+                client_kwargs=LLMProvider._client_kwargs(config),
+                **LLMProvider._retry_kwargs(config, OpenAIServerModel),
             )
         else:
             raise ValueError(
                 f"Unsupported provider '{provider}'. Only 'litellm' and 'openrouter' are supported."
             )
+
+    @staticmethod
+    def _build_router(config):
+        """
+        Build a RouterModel over the endpoints listed in an llm config section.
+
+        Each endpoint inherits the top-level settings (temperature, max_tokens,
+        http, ...) it does not override.
+
+        Args:
+            config: Dictionary containing LLM configuration with an endpoints list
+
+        Returns:
+            RouterModel instance
+        """
+        from src.llm_router import DEFAULT_COOLDOWN_SECONDS, DEFAULT_FAILURE_THRESHOLD, DEFAULT_HEDGE_WORKERS
+        from src.llm_router import DEFAULT_WINDOW
+        from src.llm_router import Endpoint, RouterModel
+
+        base = {key: value for key, value in config.items() if key not in ("endpoints", "routing", "cache")}
+        routing = config.get("routing") or {}
+        endpoints = []
+        for index, endpoint_config in enumerate(config["endpoints"]):
+            endpoint_config = {**base, **endpoint_config}
+            endpoints.append(
+                Endpoint(
+                    endpoint_config.get("name") or f"{index}:{endpoint_config.get('model')}",
+                    LLMProvider._build_model(endpoint_config),
+                    window=routing.get("window", DEFAULT_WINDOW),
+                    failure_threshold=routing.get("failure_threshold", DEFAULT_FAILURE_THRESHOLD),
+                    cooldown_seconds=routing.get("cooldown_seconds", DEFAULT_COOLDOWN_SECONDS),
+                )
+            )
+        return RouterModel(
+            endpoints,
+            hedge_after=routing.get("hedge_after"),
+            max_workers=routing.get("max_workers", DEFAULT_HEDGE_WORKERS),
+        )
+
+    @staticmethod
+    def get_llm(config, data_dir=None):
+        """
+        Get an LLM instance based on the provided configuration.
+
+        Args:
+            config: Dictionary containing LLM configuration parameters
+            data_dir: Directory for on-disk state such as the response cache
+
+        Returns:
+            Configured OpenAIServerModel instance for litellm or openrouter provider,
+            or a RouterModel if a list of endpoints is configured, wrapped in a
+            ScheduledModel if rate limits are configured and in a CachedModel if a
+            response cache is enabled. The result is wrapped in a StreamingModel
+            that records time to first token.
+        """
+        if config.get("endpoints"):
+            llm = LLMProvider._build_router(config)
+        else:
+            llm = LLMProvider._build_model(config)
+
+        rate_limit_config = config.get("rate_limit") or {}
+        if rate_limit_config:
+            from src.llm_scheduler import DEFAULT_EXPECTED_OUTPUT_TOKENS, ScheduledModel
+
+            llm = ScheduledModel(
+                llm,
+                LLMProvider.get_scheduler(rate_limit_config),
+                expected_output_tokens=rate_limit_config.get(
+                    "expected_output_tokens", DEFAULT_EXPECTED_OUTPUT_TOKENS
+                ),
+            )
+
+        cache_config = config.get("cache") or {}
+        if cache_config.get("enabled", False):
+            from src.llm_cache import CachedModel, ResponseCache
+
+            llm = CachedModel(llm, ResponseCache.from_config(cache_config, data_dir))
+        return StreamingModel(llm)
+
+    @staticmethod
+    def get_async_llm(config):
+        """
+        Get an asynchronous LLM instance based on the provided configuration.
+
+        Args:
+            config: Dictionary containing LLM configuration parameters
+
+        Returns:
+            AsyncModel for the configured endpoint (the first one if a list of
+            endpoints is configured; calls a RouterModel routes elsewhere use
+            AsyncModel.for_model), admitted through the shared scheduler if
+            rate limits are configured
+        """
+        scheduler = None
+        if config.get("rate_limit"):
+            scheduler = LLMProvider.get_scheduler(config["rate_limit"])
+        model_config = config
+        if config.get("endpoints"):
+            base = {key: value for key, value in config.items() if key not in ("endpoints", "routing", "cache")}
+            model_config = {**base, **config["endpoints"][0]}
+        return AsyncModel(LLMProvider._build_model(model_config), config.get("http"), scheduler)
@@ -0,0 +1,380 @@
+"""
+Disk-backed response cache for LLM calls.
+
+Responses are keyed on the normalized request (messages, model, sampling
+parameters, stop sequences and tools) and stored in a size-bounded SQLite
+database with LRU eviction and an optional TTL.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+from src.llm import ModelWrapper
+
+# Default size bound of the cache database contents
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Sub-directory of the data dir holding the cache database
+CACHE_DIR_NAME = "llm_cache"
+# Eviction frees space down to this fraction of max_bytes so it runs rarely
+EVICTION_LOW_WATER = 0.9
+# Bumped whenever the key or value layout changes
+CACHE_FORMAT_VERSION = 1
+
+MODES = ("read_write", "record", "replay")
+
+
+def _json_default(value: Any) -> Any:
+    # Images and other binary payloads are keyed by a digest of their bytes
+    if hasattr(value, "tobytes"):
+        return hashlib.sha256(value.tobytes()).hexdigest()
+    if isinstance(value, bytes):
+        return hashlib.sha256(value).hexdigest()
+    if hasattr(value, "value"):
+        return value.value
+    return str(value)
+
+
+def _normalize_message(message: Any) -> dict:
+    if isinstance(message, dict):
+        data = dict(message)
+    else:
+        data = message.dict()
+    role = data.get("role")
+    normalized = {"role": getattr(role, "value", role)}
+
+    content = data.get("content")
+    if isinstance(content, list):
+        parts, texts = [], []
+        for part in content:
+            if isinstance(part, dict) and part.get("type") == "text":
+                texts.append(part.get("text", "").strip())
+                continue
+            if texts:
+                parts.append({"type": "text", "text": "\n".join(texts)})
+                texts = []
+            parts.append(part)
+        if texts:
+            parts.append({"type": "text", "text": "\n".join(texts)})
+        # Text-only content is keyed the same as the equivalent plain string
+        if len(parts) == 1 and parts[0].get("type") == "text":
+            content = parts[0]["text"]
+        else:
+            content = parts
+    elif isinstance(content, str):
+        content = content.strip()
+    if content:
+        normalized["content"] = content
+    if data.get("tool_calls"):
+        normalized["tool_calls"] = data["tool_calls"]
+    return normalized
+
+
+def request_key(model: Any, messages: list, **kwargs) -> str:
+    """
+    Compute the cache key of a model call.
+
+    Args:
+        model: The model the call is made on
+        messages: Messages of the call
+        **kwargs: Other call arguments (stop_sequences, tools_to_call_from, ...)
+
+    Returns:
+        Hex digest identifying the request
+    """
+    params = dict(getattr(model, "kwargs", None) or {})
+    tools = kwargs.pop("tools_to_call_from", None) or []
+    params.update({key: value for key, value in kwargs.items() if value is not None})
+    material = {
+        "version": CACHE_FORMAT_VERSION,
+        "model": getattr(model, "model_id", None),
+        "messages": [_normalize_message(m) for m in messages],
+        "tools": [[tool.name, tool.inputs, tool.output_type] for tool in tools],
+        "params": params,
+    }
+    encoded = json.dumps(material, sort_keys=True, default=_json_default)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite store of serialized responses with LRU eviction and TTL.
+
+    Modes:
+        read_write: Serve hits from the cache, call the model and store on misses
+        record: Always call the model and store (overwriting) its response
+        replay: Serve from the cache only; a miss is an error
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttl_seconds: Optional[float] = None,
+        mode: str = "read_write",
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            path: Path of the SQLite database file
+            max_bytes: Maximum total size of stored responses
+            ttl_seconds: Age after which entries expire (never if None)
+            mode: One of "read_write", "record" or "replay"
+        """
+        if mode not in MODES:
+            raise ValueError(f"Invalid cache mode '{mode}'. Must be one of {', '.join(MODES)}.")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    @classmethod
+    def from_config(cls, config: dict, data_dir: Optional[str] = None) -> "ResponseCache":
+        """
+        Create a cache from the llm.cache configuration section.
+
+        Args:
+            config: Dictionary with optional path, max_bytes, ttl_seconds and mode
+            data_dir: Directory the database is placed under if no path is given
+
+        Returns:
+            ResponseCache instance
+        """
+        path = config.get("path") or os.path.join(
+            data_dir or "./data", CACHE_DIR_NAME, "responses.sqlite3"
+        )
+        return cls(
+            path,
+            max_bytes=config.get("max_bytes", DEFAULT_MAX_BYTES),
+            ttl_seconds=config.get("ttl_seconds"),
+            mode=config.get("mode", "read_write"),
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a response.
+
+        Args:
+            key: Request key
+
+        Returns:
+            The stored response, or None on a miss or an expired entry
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, size, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl_seconds is not None and row[2] + self.ttl_seconds < now:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_bytes -= row[1]
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        """
+        Store a response, evicting least recently used entries if over the size bound.
+
+        Args:
+            key: Request key
+            value: Serialized response
+        """
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            previous = self._conn.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        if self.ttl_seconds is not None:
+            cursor = self._conn.execute(
+                "DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,)
+            )
+            self.evictions += max(cursor.rowcount, 0)
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        target = self._total_bytes - int(self.max_bytes * EVICTION_LOW_WATER)
+        if target <= 0:
+            return
+        victims, freed = [], 0
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+            victims.append((key,))
+            freed += size
+            if freed >= target:
+                break
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+        self._total_bytes -= freed
+        self.evictions += len(victims)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._total_bytes = 0
+
+    def stats(self) -> dict:
+        """
+        Get cache statistics.
+
+        Returns:
+            Dictionary with mode, hits, misses, hit_rate, evictions, entries and bytes
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "mode": self.mode,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+                "bytes": self._total_bytes,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class CachedModel(ModelWrapper):
+    """
+    Model wrapper that serves repeated requests from a ResponseCache.
+
+    In replay mode the wrapped model is never called, so recorded agent
+    traces can be re-run without API cost or latency.
+    """
+
+    def __init__(self, model: Any, cache: ResponseCache):
+        """
+        Initialize the wrapper.
+
+        Args:
+            model: The smolagents model to wrap
+            cache: Cache the responses are stored in
+        """
+        super().__init__(model)
+        self.cache = cache
+
+    def generate(self, messages, **kwargs):
+        key = request_key(self.model, messages, **kwargs)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        message = self._call_model(messages, **kwargs)
+        self._store(key, message)
+        return message
+
+    def generate_stream(self, messages, **kwargs):
+        from smolagents.models import (
+            ChatMessageStreamDelta,
+            ChatMessageToolCallStreamDelta,
+            agglomerate_stream_deltas,
+        )
+
+        key = request_key(self.model, messages, **kwargs)
+        cached = self._lookup(key)
+        if cached is not None:
+            # Replay the whole response as a single delta
+            yield ChatMessageStreamDelta(
+                content=cached.content,
+                tool_calls=[
+                    ChatMessageToolCallStreamDelta(
+                        index=index, id=call.id, type=call.type, function=call.function
+                    )
+                    for index, call in enumerate(cached.tool_calls or [])
+                ]
+                or None,
+                token_usage=cached.token_usage,
+            )
+            return
+        deltas = []
+        for delta in self.model.generate_stream(messages, **kwargs):
+            deltas.append(delta)
+            yield delta
+        message = agglomerate_stream_deltas(deltas)
+        self._record_token_counts(message)
+        self._store(key, message)
+
+    def _lookup(self, key: str):
+        if self.cache.mode == "record":
+            return None
+        value = self.cache.get(key)
+        if value is None:
+            if self.cache.mode == "replay":
+                raise RuntimeError(f"LLM response cache miss in replay mode (key {key[:16]})")
+            return None
+        data = json.loads(value)
+        message = self._message_from_dict(data["message"], data.get("input_tokens"), data.get("output_tokens"))
+        self.last_input_token_count = data.get("input_tokens")
+        self.last_output_token_count = data.get("output_tokens")
+        return message
+
+    def _store(self, key: str, message: Any) -> None:
+        data = json.loads(message.model_dump_json())
+        data.pop("raw", None)
+        data.pop("token_usage", None)
+        self.cache.put(
+            key,
+            json.dumps(
+                {
+                    "message": data,
+                    "input_tokens": self.last_input_token_count,
+                    "output_tokens": self.last_output_token_count,
+                }
+            ),
+        )
+
+    @staticmethod
+    def _message_from_dict(data: dict, input_tokens: Optional[int], output_tokens: Optional[int]):
+        from smolagents.models import ChatMessage
+
+        try:
+            from smolagents.monitoring import TokenUsage
+        except ImportError:
+            # Older smolagents releases track token counts on the model only
+            return ChatMessage.from_dict(data)
+        token_usage = None
+        if input_tokens is not None and output_tokens is not None:
+            token_usage = TokenUsage(input_tokens=input_tokens, output_tokens=output_tokens)
+        return ChatMessage.from_dict(data, token_usage=token_usage)
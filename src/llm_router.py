@@ -0,0 +1,352 @@
+"""
+Latency-aware routing of LLM calls across several endpoints.
+
+The router tracks rolling latency percentiles and error rates per endpoint,
+sends each request to the fastest healthy endpoint, fails over to the next
+one on errors, can hedge slow requests with a second endpoint, and ejects
+failing endpoints with a circuit breaker.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional
+
+from src.llm import ModelWrapper, current_loop_route, route_to_loop
+
+DEFAULT_WINDOW = 50
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_COOLDOWN_SECONDS = 30.0
+# Threads running the hedged duplicates of slow calls
+DEFAULT_HEDGE_WORKERS = 16
+# Error rates are capped below 1 so a failing endpoint's score stays finite
+MAX_SCORED_ERROR_RATE = 0.9
+
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class Endpoint:
+    """
+    One routed model with its rolling latency, error and circuit state.
+
+    The circuit opens after failure_threshold consecutive failures. While
+    open the endpoint receives no requests; after cooldown_seconds a single
+    trial request is let through (half-open) and closes the circuit on success.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        model: Any,
+        window: int = DEFAULT_WINDOW,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        cooldown_seconds: float = DEFAULT_COOLDOWN_SECONDS,
+    ):
+        """
+        Initialize the endpoint.
+
+        Args:
+            name: Name used in logs and stats
+            model: smolagents model for the endpoint
+            window: Number of recent requests latency and error rate are computed over
+            failure_threshold: Consecutive failures that open the circuit
+            cooldown_seconds: Seconds the circuit stays open before a trial request
+        """
+        self.name = name
+        self.model = model
+        # Calls go through a ModelWrapper so that arun() can route them to its event loop
+        self.caller = ModelWrapper(model)
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.in_flight = 0
+        self.open_until = 0.0
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def p50(self) -> Optional[float]:
+        return _percentile(list(self.latencies), 0.5)
+
+    @property
+    def p95(self) -> Optional[float]:
+        return _percentile(list(self.latencies), 0.95)
+
+    @property
+    def error_rate(self) -> float:
+        outcomes = list(self.outcomes)
+        return outcomes.count(False) / len(outcomes) if outcomes else 0.0
+
+    @property
+    def state(self) -> str:
+        if self.open_until == 0.0:
+            return "closed"
+        return "open" if time.monotonic() < self.open_until else "half_open"
+
+    def available(self) -> bool:
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self.trial_in_flight)
+
+    def score(self) -> float:
+        # Endpoints without samples score 0 so they are tried early
+        p50 = self.p50 or 0.0
+        return p50 / (1.0 - min(self.error_rate, MAX_SCORED_ERROR_RATE))
+
+    def try_begin(self) -> bool:
+        """
+        Start a request if the circuit lets it through.
+
+        Returns:
+            True if the request may be sent (and is counted as in flight),
+            False if the circuit is open or its half-open trial is already running
+        """
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half_open" and self.trial_in_flight):
+                return False
+            self.in_flight += 1
+            self.requests += 1
+            if state == "half_open":
+                self.trial_in_flight = True
+            return True
+
+    def record_success(self, latency: float) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.latencies.append(latency)
+            self.outcomes.append(True)
+            self.consecutive_failures = 0
+            self.open_until = 0.0
+            self.trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.outcomes.append(False)
+            self.failures += 1
+            self.consecutive_failures += 1
+            half_open = self.trial_in_flight
+            self.trial_in_flight = False
+            if half_open or self.consecutive_failures >= self.failure_threshold:
+                self.open_until = time.monotonic() + self.cooldown_seconds
+                print(
+                    f"[RouterModel] Ejecting endpoint '{self.name}' for {self.cooldown_seconds}s "
+                    f"after {self.consecutive_failures} consecutive failures"
+                )
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "requests": self.requests,
+            "failures": self.failures,
+            "error_rate": round(self.error_rate, 4),
+            "p50": self.p50,
+            "p95": self.p95,
+            "in_flight": self.in_flight,
+        }
+
+
+class NoEndpointAvailable(RuntimeError):
+    """Raised when the circuits of all endpoints are open."""
+
+
+class RouterModel(ModelWrapper):
+    """
+    Model that routes each call to the fastest healthy endpoint.
+
+    Endpoints are ranked by rolling p50 latency, penalised by error rate.
+    A failed call is retried on the next endpoint. With hedge_after set, a
+    call still running after that many seconds (or after the endpoint's p95
+    latency if hedge_after is "p95") is duplicated on the next endpoint.
+    The call itself runs on the caller's thread and its response is used
+    if it succeeds; the duplicate runs on a pool of max_workers threads,
+    is cancelled if it has not started by then, and otherwise stands in
+    for a failed call without a fresh failover. Streaming calls fail over
+    only if the error happens before the first delta and are never hedged.
+    Endpoints whose circuit is open are never called; if no endpoint is
+    available, NoEndpointAvailable is raised.
+    """
+
+    def __init__(
+        self,
+        endpoints: List[Endpoint],
+        hedge_after: Optional[Any] = None,
+        max_workers: int = DEFAULT_HEDGE_WORKERS,
+    ):
+        """
+        Initialize the router.
+
+        Args:
+            endpoints: Endpoints to route between (at least one)
+            hedge_after: Seconds before hedging, "p95", or None to disable hedging
+            max_workers: Threads running hedged duplicates (calls themselves run on the caller's thread)
+        """
+        if not endpoints:
+            raise ValueError("RouterModel requires at least one endpoint")
+        # Attributes such as model_id are delegated to the first endpoint
+        super().__init__(endpoints[0].model)
+        self.endpoints = endpoints
+        self.hedge_after = hedge_after
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="router")
+
+    def ranked(self) -> List[Endpoint]:
+        """
+        Get the endpoints in routing order.
+
+        Returns:
+            Available endpoints by score; ejected ones are left out
+
+        Raises:
+            NoEndpointAvailable: If no endpoint is available
+        """
+        available = [e for e in self.endpoints if e.available()]
+        if not available:
+            retry_in = min(e.open_until for e in self.endpoints) - time.monotonic()
+            raise NoEndpointAvailable(
+                f"All {len(self.endpoints)} LLM endpoints are ejected; the next trial is in {max(retry_in, 0.0):.1f}s"
+            )
+        available.sort(key=lambda e: (e.score(), e.in_flight))
+        return available
+
+    def _hedge_delay(self, endpoint: Endpoint) -> Optional[float]:
+        if self.hedge_after == "p95":
+            return endpoint.p95
+        return self.hedge_after
+
+    @staticmethod
+    def _call(endpoint: Endpoint, messages, kwargs, route=None):
+        # route is the caller's loop route, re-applied when running in a hedging thread
+        if not endpoint.try_begin():
+            raise NoEndpointAvailable(f"Endpoint '{endpoint.name}' was ejected")
+        if route is not None:
+            route_to_loop(*route)
+        started = time.monotonic()
+        try:
+            message = endpoint.caller._call_model(messages, **kwargs)
+        except Exception:
+            endpoint.record_failure()
+            raise
+        finally:
+            if route is not None:
+                route_to_loop(None, None)
+        endpoint.record_success(time.monotonic() - started)
+        return message
+
+    def generate(self, messages, **kwargs):
+        kwargs = {key: value for key, value in kwargs.items() if value is not None}
+        candidates = self.ranked()
+        last_error = None
+        while candidates:
+            endpoint = candidates.pop(0)
+            delay = self._hedge_delay(endpoint) if candidates else None
+            try:
+                if delay is None:
+                    message = self._call(endpoint, messages, kwargs)
+                else:
+                    message = self._call_hedged(endpoint, candidates, delay, messages, kwargs)
+            except Exception as e:
+                last_error = e
+                print(f"[RouterModel] Endpoint '{endpoint.name}' failed: {str(e)}")
+                continue
+            self._record_token_counts(message)
+            return message
+        raise last_error
+
+    def _call_hedged(self, primary: Endpoint, candidates: List[Endpoint], delay: float, messages, kwargs):
+        route = current_loop_route()
+        if route[0] is None:
+            route = None
+        backup = candidates[0]
+        hedge = {}
+        hedge_lock = threading.Lock()
+
+        def start_hedge():
+            with hedge_lock:
+                if hedge.get("settled"):
+                    return
+                hedge["future"] = self._executor.submit(self._call, backup, messages, kwargs, route)
+                self.hedges += 1
+
+        # The delay runs from the start of the call, not from a queue slot
+        timer = threading.Timer(delay, start_hedge)
+        timer.daemon = True
+        timer.start()
+        try:
+            # The caller's thread already carries its loop route
+            message = self._call(primary, messages, kwargs)
+        except Exception:
+            timer.cancel()
+            with hedge_lock:
+                hedge["settled"] = True
+                future = hedge.get("future")
+            if future is None:
+                raise
+            # The duplicate already has a head start on the next endpoint
+            candidates.remove(backup)
+            message = future.result()
+            self.hedge_wins += 1
+            return message
+        timer.cancel()
+        with hedge_lock:
+            hedge["settled"] = True
+            future = hedge.get("future")
+        if future is not None:
+            # A duplicate already running finishes in the background and still updates its endpoint's stats
+            future.cancel()
+        return message
+
+    def generate_stream(self, messages, **kwargs):
+        kwargs = {key: value for key, value in kwargs.items() if value is not None}
+        last_error = None
+        for endpoint in self.ranked():
+            if not endpoint.try_begin():
+                last_error = NoEndpointAvailable(f"Endpoint '{endpoint.name}' was ejected")
+                continue
+            started = time.monotonic()
+            stream = endpoint.model.generate_stream(messages, **kwargs)
+            try:
+                first = next(stream, None)
+            except Exception as e:
+                endpoint.record_failure()
+                last_error = e
+                print(f"[RouterModel] Endpoint '{endpoint.name}' failed: {str(e)}")
+                continue
+            try:
+                if first is not None:
+                    yield first
+                    yield from stream
+            except GeneratorExit:
+                endpoint.record_success(time.monotonic() - started)
+                raise
+            except Exception:
+                endpoint.record_failure()
+                raise
+            endpoint.record_success(time.monotonic() - started)
+            return
+        raise last_error
+
+    def stats(self) -> dict:
+        """
+        Get routing statistics.
+
+        Returns:
+            Dictionary with hedge counts and per-endpoint state, requests,
+            failures, error_rate, p50, p95 and in_flight
+        """
+        return {
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "endpoints": {endpoint.name: endpoint.stats() for endpoint in self.endpoints},
+        }
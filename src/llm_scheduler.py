@@ -0,0 +1,397 @@
+"""
+Client-side rate limiting and scheduling of LLM calls.
+
+A process-wide scheduler admits calls under requests-per-minute and
+tokens-per-minute token buckets, in priority order, and backs off with
+jitter (honouring Retry-After) when the server still answers 429. It works
+for threads and asyncio tasks in the same process.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import random
+import threading
+import time
+from typing import Any, Optional
+
+from src.llm import ModelWrapper
+
+# Lower values are admitted first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 5
+PRIORITY_BATCH = 10
+
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BASE_BACKOFF = 1.0
+DEFAULT_MAX_BACKOFF = 60.0
+DEFAULT_EXPECTED_OUTPUT_TOKENS = 1000
+DEFAULT_CHARS_PER_TOKEN = 4
+# How often async waiters that are not at the head of the queue re-check it
+ASYNC_POLL_SECONDS = 0.05
+
+_priority: contextvars.ContextVar = contextvars.ContextVar("llm_priority", default=None)
+
+
+@contextlib.contextmanager
+def scheduling_priority(priority: int):
+    """
+    Set the scheduling priority of LLM calls made in this context.
+
+    The priority follows the current thread or asyncio task, e.g.
+    interactive sessions can use PRIORITY_INTERACTIVE and batch jobs
+    PRIORITY_BATCH.
+
+    Args:
+        priority: Priority of the calls (lower is admitted first)
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def _total_tokens(input_tokens: Optional[int], output_tokens: Optional[int], estimated: float) -> float:
+    # Usage a call reported, or its estimate if the endpoint reported none
+    if input_tokens is None and output_tokens is None:
+        return estimated
+    return (input_tokens or 0) + (output_tokens or 0)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        # HTTP-date values are not worth parsing; fall back to backoff
+        pass
+    return None
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at a per-minute rate."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        """
+        Initialize the bucket, initially full.
+
+        Args:
+            per_minute: Refill rate per minute
+            capacity: Maximum burst size (defaults to one minute's worth)
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount tokens are available (amounts above capacity need a full bucket)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        # May go negative when usage is corrected after a call
+        self.tokens -= amount
+
+
+class RateLimitScheduler:
+    """
+    Admits LLM calls in priority order under request and token rate limits.
+
+    Waiting calls are kept in a priority queue; only the head of the queue
+    is admitted, as soon as both buckets allow it. Token costs are estimated
+    up front and corrected with the actual usage once the call returns. A
+    429 from the server pauses admissions for everyone until the
+    Retry-After (or a jittered exponential backoff) has passed.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        base_backoff: float = DEFAULT_BASE_BACKOFF,
+        max_backoff: float = DEFAULT_MAX_BACKOFF,
+        default_priority: int = PRIORITY_NORMAL,
+    ):
+        """
+        Initialize the scheduler.
+
+        Args:
+            requests_per_minute: Request rate limit (unlimited if None)
+            tokens_per_minute: Token rate limit (unlimited if None)
+            max_retries: Retries of a call rejected with 429
+            base_backoff: First backoff delay in seconds, doubled per retry
+            max_backoff: Upper bound of a backoff delay in seconds
+            default_priority: Priority of calls made outside scheduling_priority
+        """
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.default_priority = default_priority
+        self._queue = []
+        self._counter = itertools.count()
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+        self.admitted = 0
+        self.rate_limited = 0
+        self.wait_seconds = 0.0
+
+    @classmethod
+    def from_config(cls, config: dict) -> "RateLimitScheduler":
+        """
+        Create a scheduler from the llm.rate_limit configuration section.
+
+        Args:
+            config: Dictionary with optional requests_per_minute,
+                tokens_per_minute, max_retries, base_backoff, max_backoff
+                and default_priority
+
+        Returns:
+            RateLimitScheduler instance
+        """
+        return cls(
+            requests_per_minute=config.get("requests_per_minute"),
+            tokens_per_minute=config.get("tokens_per_minute"),
+            max_retries=config.get("max_retries", DEFAULT_MAX_RETRIES),
+            base_backoff=config.get("base_backoff", DEFAULT_BASE_BACKOFF),
+            max_backoff=config.get("max_backoff", DEFAULT_MAX_BACKOFF),
+            default_priority=config.get("default_priority", PRIORITY_NORMAL),
+        )
+
+    def _enqueue(self, cost: float) -> list:
+        priority = _priority.get()
+        entry = [self.default_priority if priority is None else priority, next(self._counter), cost]
+        with self._condition:
+            heapq.heappush(self._queue, entry)
+        return entry
+
+    def _try_admit(self, entry: list) -> Optional[float]:
+        # Returns None once admitted, else the time to wait before retrying
+        with self._condition:
+            if self._queue[0] is not entry:
+                return -1.0
+            now = time.monotonic()
+            wait = max(self._paused_until - now, 0.0)
+            if self.requests:
+                wait = max(wait, self.requests.wait_time(1, now))
+            if self.tokens:
+                wait = max(wait, self.tokens.wait_time(entry[2], now))
+            if wait > 0:
+                return wait
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(entry[2])
+            heapq.heappop(self._queue)
+            self.admitted += 1
+            self._condition.notify_all()
+            return None
+
+    def _abandon(self, entry: list) -> None:
+        with self._condition:
+            if entry in self._queue:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+            self._condition.notify_all()
+
+    def acquire(self, cost: float) -> None:
+        """
+        Block the current thread until a call of the given token cost is admitted.
+
+        Args:
+            cost: Estimated tokens of the call
+        """
+        entry = self._enqueue(cost)
+        started = time.monotonic()
+        try:
+            # Checked and waited under one hold of the (re-entrant) lock so no notification is missed
+            with self._condition:
+                while True:
+                    wait = self._try_admit(entry)
+                    if wait is None:
+                        break
+                    # Not at the head (wait < 0): woken when the queue changes
+                    self._condition.wait(None if wait < 0 else wait)
+        except BaseException:
+            self._abandon(entry)
+            raise
+        with self._condition:
+            self.wait_seconds += time.monotonic() - started
+
+    async def aacquire(self, cost: float) -> None:
+        """
+        Wait, without blocking the event loop, until a call is admitted.
+
+        Args:
+            cost: Estimated tokens of the call
+        """
+        entry = self._enqueue(cost)
+        started = time.monotonic()
+        try:
+            while True:
+                wait = self._try_admit(entry)
+                if wait is None:
+                    break
+                await asyncio.sleep(ASYNC_POLL_SECONDS if wait < 0 else wait)
+        except BaseException:
+            self._abandon(entry)
+            raise
+        with self._condition:
+            self.wait_seconds += time.monotonic() - started
+
+    def settle(self, estimated: float, actual: Optional[float]) -> None:
+        """
+        Correct the token bucket with the actual usage of an admitted call.
+
+        Args:
+            estimated: Tokens charged when the call was admitted
+            actual: Tokens the call actually used (None if unknown)
+        """
+        if self.tokens is None or actual is None:
+            return
+        with self._condition:
+            self.tokens.take(actual - estimated)
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        """
+        Pause admissions after a 429 and return how long the caller should wait.
+
+        Args:
+            attempt: Zero-based retry attempt
+            error: The rate-limit error
+
+        Returns:
+            Delay in seconds: the server's Retry-After if given, else a
+            jittered exponential backoff
+        """
+        delay = _retry_after(error)
+        if delay is None:
+            delay = random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+        with self._condition:
+            self.rate_limited += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self._condition.notify_all()
+        return delay
+
+    def stats(self) -> dict:
+        """
+        Get scheduler statistics.
+
+        Returns:
+            Dictionary with admitted, rate_limited, waiting and wait_seconds
+        """
+        with self._condition:
+            return {
+                "admitted": self.admitted,
+                "rate_limited": self.rate_limited,
+                "waiting": len(self._queue),
+                "wait_seconds": round(self.wait_seconds, 6),
+            }
+
+
+def estimate_tokens(messages, expected_output_tokens: int = DEFAULT_EXPECTED_OUTPUT_TOKENS) -> int:
+    """
+    Estimate the tokens a call will use from the size of its messages.
+
+    Args:
+        messages: ChatMessages or message dicts
+        expected_output_tokens: Tokens assumed for the response
+
+    Returns:
+        Estimated total tokens
+    """
+    chars = 0
+    for message in messages:
+        content = message["content"] if isinstance(message, dict) else message.content
+        if isinstance(content, list):
+            chars += sum(len(part.get("text", "")) for part in content if isinstance(part, dict))
+        elif content:
+            chars += len(content)
+    return chars // DEFAULT_CHARS_PER_TOKEN + expected_output_tokens
+
+
+class ScheduledModel(ModelWrapper):
+    """Model wrapper that admits every call through a RateLimitScheduler."""
+
+    def __init__(
+        self,
+        model: Any,
+        scheduler: RateLimitScheduler,
+        expected_output_tokens: int = DEFAULT_EXPECTED_OUTPUT_TOKENS,
+    ):
+        """
+        Initialize the wrapper.
+
+        Args:
+            model: The smolagents model to wrap
+            scheduler: Scheduler shared by all models of the process
+            expected_output_tokens: Tokens assumed for a response when estimating its cost
+        """
+        super().__init__(model)
+        self.scheduler = scheduler
+        self.expected_output_tokens = expected_output_tokens
+
+    def generate(self, messages, **kwargs):
+        estimated = estimate_tokens(messages, self.expected_output_tokens)
+        attempt = 0
+        while True:
+            self.scheduler.acquire(estimated)
+            try:
+                message = self._call_model(messages, **kwargs)
+            except Exception as e:
+                self.scheduler.settle(estimated, 0)
+                if not _is_rate_limited(e) or attempt >= self.scheduler.max_retries:
+                    raise
+                time.sleep(self.scheduler.backoff(attempt, e))
+                attempt += 1
+                continue
+            usage = getattr(message, "token_usage", None)
+            # The message's own usage; the last_* attributes may already belong to a concurrent call
+            used = None if usage is None else _total_tokens(usage.input_tokens, usage.output_tokens, estimated)
+            self.scheduler.settle(estimated, used)
+            return message
+
+    def generate_stream(self, messages, **kwargs):
+        estimated = estimate_tokens(messages, self.expected_output_tokens)
+        attempt = 0
+        while True:
+            self.scheduler.acquire(estimated)
+            stream = self.model.generate_stream(messages, **kwargs)
+            try:
+                first = next(stream, None)
+            except Exception as e:
+                self.scheduler.settle(estimated, 0)
+                if not _is_rate_limited(e) or attempt >= self.scheduler.max_retries:
+                    raise
+                time.sleep(self.scheduler.backoff(attempt, e))
+                attempt += 1
+                continue
+            break
+        used = None
+        try:
+            for delta in itertools.chain([first] if first is not None else [], stream):
+                if delta.token_usage is not None:
+                    used = _total_tokens(delta.token_usage.input_tokens, delta.token_usage.output_tokens, estimated)
+                yield delta
+        finally:
+            self.scheduler.settle(estimated, used)
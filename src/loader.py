@@ -44,8 +44,26 @@ class ServiceLoader:
             cls._instance._prompts: Optional[PromptLoaderType] = None
             cls._instance._memory: Optional[MemoryType] = None
             cls._instance._sandbox: Optional[SandboxType] = None
+            cls._instance._data_dir: Optional[str] = None
         return cls._instance
     
+    def configure(self, config: ConfigType) -> None:
+        """
+        Use the given configuration instead of loading config/config.yaml.
+
+        Components created from a previous configuration are discarded and
+        re-created from the new one on next access.
+
+        Args:
+            config: Configuration dictionary
+        """
+        self._config = config
+        self._llm = None
+        self._tools = None
+        self._memory = None
+        self._sandbox = None
+        self._data_dir = None
+    
     @property
     def config(self) -> ConfigType:
         """
@@ -70,18 +88,31 @@ class ServiceLoader:
         Get the LLM instance for smolagents from configuration.
 
         Returns:
-            Configured OpenAIServerModel instance for litellm or openrouter provider.
+            Configured model for litellm or openrouter provider (see LLMProvider.get_llm).
             
         Raises:
             RuntimeError: If LLM could not be initialized
         """
         if self._llm is None:
             config = self.config.get('llm', {})
-            self._llm = LLMProvider.get_llm(config)
+            self._llm = LLMProvider.get_llm(config, data_dir=self.data_dir)
             if self._llm is None:
                 raise RuntimeError("Failed to initialize LLM")
         return self._llm
     
+    @property
+    def data_dir(self) -> str:
+        """
+        Get the writable data directory shared by tools and caches.
+
+        Returns:
+            Path of the sandbox data directory
+        """
+        if self._data_dir is None:
+            docker_config = self.config.get('docker', {})
+            self._data_dir = SandboxProvider.get_data_dir(docker_config)
+        return self._data_dir
+    
     @property
     def tools(self) -> List[ToolType]:
         """
@@ -91,7 +122,8 @@ class ServiceLoader:
             List of tool instances.
         """
         if self._tools is None:
-            self._tools = ToolsProvider.get_tools()
+            tools_config = self.config.get('tools', {})
+            self._tools = ToolsProvider.get_tools(tools_config, data_dir=self.data_dir)
             if self._tools is None:
                 # For tools, an empty list might be valid, so we'll initialize it
                 self._tools = []
@@ -126,7 +158,8 @@ class ServiceLoader:
             RuntimeError: If memory could not be initialized
         """
         if self._memory is None:
-            self._memory = MemoryProvider.get_memory()
+            memory_config = self.config.get('memory', {})
+            self._memory = MemoryProvider.get_memory(memory_config, data_dir=self.data_dir)
             if self._memory is None:
                 raise RuntimeError("Failed to initialize memory")
         return self._memory
@@ -2,51 +2,319 @@
 Memory module for storing and retrieving conversation history.
 """
 
-from mem0 import Memory
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List
+
+# Default number of users whose items are processed in parallel by search_many/add_many
+DEFAULT_BATCH_WORKERS = 8
+
+
+def fan_out(function: Callable[[dict], Any], items: List[dict], max_workers: int = DEFAULT_BATCH_WORKERS) -> List[dict]:
+    """
+    Apply a function to batch items, users in parallel and each user's items in order.
+
+    Args:
+        function: Called with each item; its result is the item's result
+        items: Item dicts, each with an optional "user_id"
+        max_workers: Maximum number of users processed in parallel
+
+    Returns:
+        Per-item results in input order: the function's result, or
+        {"error": message} if it raised
+    """
+    by_user = OrderedDict()
+    for index, item in enumerate(items):
+        by_user.setdefault(item.get("user_id", "default_user"), []).append(index)
+    results: List[Any] = [None] * len(items)
+
+    def run_user(indices):
+        for index in indices:
+            try:
+                results[index] = function(items[index])
+            except Exception as e:
+                results[index] = {"error": str(e)}
+
+    if len(by_user) <= 1 or max_workers <= 1:
+        for indices in by_user.values():
+            run_user(indices)
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(by_user)), thread_name_prefix="memory-batch") as pool:
+            list(pool.map(run_user, by_user.values()))
+    return results
+
+
+class MemoryWrapper:
+    """
+    Base class for memories that add behaviour around another memory.
+
+    Wrappers expose the same search()/add() shape as mem0's Memory, and
+    attributes that are not overridden are delegated to the wrapped memory,
+    so a wrapper can be used anywhere the memory itself is.
+    """
+
+    # Key of the wrapper's stats() in MemoryProvider.get_stats (None if it has none)
+    stats_name = None
+
+    def __init__(self, memory: Any):
+        """
+        Initialize the wrapper.
+
+        Args:
+            memory: The memory instance (or another wrapper) to wrap
+        """
+        self.memory = memory
+
+    def __getattr__(self, name: str) -> Any:
+        # Only reached for attributes not found on the wrapper itself
+        if name == "memory":
+            raise AttributeError(name)
+        return getattr(self.memory, name)
+
+    def search(self, query, user_id="default_user", limit=3, **kwargs):
+        return self.memory.search(query=query, user_id=user_id, limit=limit, **kwargs)
+
+    def add(self, messages, user_id="default_user", **kwargs):
+        return self.memory.add(messages, user_id=user_id, **kwargs)
+
+    def search_many(self, requests, limit=3, max_workers=DEFAULT_BATCH_WORKERS):
+        return MemoryProvider.search_many(self.memory, requests, limit=limit, max_workers=max_workers)
+
+    def add_many(self, requests, max_workers=DEFAULT_BATCH_WORKERS):
+        return MemoryProvider.add_many(self.memory, requests, max_workers=max_workers)
+
 
 class MemoryProvider:
     """
     Provider class for memory functionality.
     Handles access to memory instances.
     """
-    
+
+    # Background compactor started by get_memory when compaction is enabled
+    _compactor = None
+
     @staticmethod
-    def get_memory():
+    def get_memory(config=None, data_dir=None):
         """
         Get a memory instance.
-        
+
+        Args:
+            config: Dictionary containing memory configuration parameters
+            data_dir: Directory for on-disk state
+
         Returns:
-            Memory instance
+            mem0 Memory instance, or a LocalMemory store under the data dir for
+            the "local" backend, wrapped in a CachedMemory if the search cache is
+            enabled and in a WriteBehindMemory if write-behind adds are enabled.
+            If the embedding cache is enabled, the backend's embedder is wrapped in it.
+            If compaction is enabled, a background MemoryCompactor is started for it.
         """
-        return Memory()
-    
+        config = config or {}
+        backend = config.get("backend", "mem0")
+        if backend == "local":
+            from src.memory_store import LocalMemory
+
+            memory = LocalMemory.from_config(config.get("local"), data_dir)
+        elif backend == "mem0":
+            # mem0 is heavy to import and only needed for this backend
+            from mem0 import Memory
+
+            memory = Memory()
+        else:
+            raise ValueError(f"Unknown memory backend {backend!r}, expected 'mem0' or 'local'")
+
+        embedding_cache_config = config.get("embedding_cache") or {}
+        if embedding_cache_config.get("enabled", False):
+            MemoryProvider._cache_embeddings(memory, embedding_cache_config, data_dir)
+
+        search_cache_config = config.get("search_cache") or {}
+        if search_cache_config.get("enabled", False):
+            from src.memory_cache import CachedMemory
+
+            memory = CachedMemory.from_config(memory, search_cache_config)
+
+        # Outermost, so that queued adds invalidate cached searches when they are written
+        write_behind_config = config.get("write_behind") or {}
+        if write_behind_config.get("enabled", False):
+            from src.memory_queue import WriteBehindMemory
+
+            memory = WriteBehindMemory.from_config(memory, write_behind_config)
+
+        compaction_config = config.get("compaction") or {}
+        if compaction_config.get("enabled", False):
+            from src.memory_compaction import MemoryCompactor
+
+            if MemoryProvider._compactor is not None:
+                MemoryProvider._compactor.stop()
+            MemoryProvider._compactor = MemoryCompactor.from_config(memory, compaction_config).start()
+        return memory
+
+    @staticmethod
+    def _cache_embeddings(memory, config, data_dir):
+        # Searches and adds embed through the same embedder, so they share its cache
+        from src.embedding_cache import CachedEmbedder, CachedMem0Embedder, EmbeddingCache
+
+        cache = EmbeddingCache.from_config(config, data_dir)
+        if hasattr(memory, "embedder"):
+            memory.embedder = CachedEmbedder(memory.embedder, cache)
+        elif hasattr(memory, "embedding_model"):
+            memory.embedding_model = CachedMem0Embedder(memory.embedding_model, cache)
+        else:
+            print(f"[MemoryProvider] {type(memory).__name__} has no embedder to cache; embedding cache disabled")
+
     @staticmethod
     def search(memory_instance, query, user_id="default_user", limit=3):
         """
         Retrieve relevant memories for a given query and user.
-        
+
         Args:
             memory_instance: Memory instance to search
             query: Search query string
             user_id: User identifier
             limit: Maximum number of results to return
-            
+
         Returns:
             List of memory dicts
         """
         return memory_instance.search(query=query, user_id=user_id, limit=limit)["results"]
-    
+
     @staticmethod
     def add(memory_instance, messages, user_id="default_user"):
         """
         Add a list of messages to memory for a user.
-        
+
         Args:
             memory_instance: Memory instance to add to
             messages: List of message dicts with 'role' and 'content'
             user_id: User identifier
-            
+
         Returns:
             Result of the add operation
         """
         return memory_instance.add(messages, user_id=user_id)
+
+    @staticmethod
+    def search_many(memory_instance, requests, limit=3, max_workers=DEFAULT_BATCH_WORKERS):
+        """
+        Search memories for many queries and users at once.
+
+        Backends with a native search_many batch their embedding and vector
+        store work; for others the searches are fanned out by user with at
+        most max_workers users in parallel.
+
+        Args:
+            memory_instance: Memory instance to search
+            requests: List of dicts with 'query' and optional 'user_id' and 'limit'
+            limit: Maximum number of results of requests without their own limit
+            max_workers: Maximum number of users searched in parallel
+
+        Returns:
+            Per-request results in input order: {"results": [memory dicts]}
+            or {"error": message}
+        """
+        native = getattr(memory_instance, "search_many", None)
+        if native is not None:
+            return native(requests, limit=limit, max_workers=max_workers)
+        return fan_out(
+            lambda request: memory_instance.search(
+                query=request["query"],
+                user_id=request.get("user_id", "default_user"),
+                limit=request.get("limit", limit),
+            ),
+            requests,
+            max_workers,
+        )
+
+    @staticmethod
+    def add_many(memory_instance, requests, max_workers=DEFAULT_BATCH_WORKERS):
+        """
+        Add messages to memory for many users at once.
+
+        Backends with a native add_many batch their embedding and vector
+        store work; for others the adds are fanned out by user with at most
+        max_workers users in parallel. The adds of one user are applied in
+        order.
+
+        Args:
+            memory_instance: Memory instance to add to
+            requests: List of dicts with 'messages' and optional 'user_id'
+            max_workers: Maximum number of users written in parallel
+
+        Returns:
+            Per-request results in input order: the result of the add or
+            {"error": message}
+        """
+        native = getattr(memory_instance, "add_many", None)
+        if native is not None:
+            return native(requests, max_workers=max_workers)
+        return fan_out(
+            lambda request: memory_instance.add(request["messages"], user_id=request.get("user_id", "default_user")),
+            requests,
+            max_workers,
+        )
+
+    @staticmethod
+    def flush(memory_instance, timeout=None):
+        """
+        Wait until writes queued by a write-behind memory have been applied.
+
+        Args:
+            memory_instance: Memory instance to flush
+            timeout: Maximum seconds to wait (None waits indefinitely)
+
+        Returns:
+            True if nothing is left pending, False if the timeout expired
+        """
+        flush = getattr(memory_instance, "flush", None)
+        if flush is None:
+            return True
+        return flush(timeout)
+
+    @staticmethod
+    def get_stats(memory_instance):
+        """
+        Get the statistics of the wrappers around a memory instance.
+
+        Args:
+            memory_instance: Memory instance from get_memory
+
+        Returns:
+            Dictionary of each wrapper's stats, e.g. "search_cache" and
+            "write_behind", of the backend's embedding cache ("embedding_cache")
+            and of the background compactor ("compaction")
+        """
+        stats = {}
+        while isinstance(memory_instance, MemoryWrapper):
+            if memory_instance.stats_name:
+                stats[memory_instance.stats_name] = memory_instance.stats()
+            memory_instance = memory_instance.memory
+        for attribute in ("embedder", "embedding_model"):
+            embedder = getattr(memory_instance, attribute, None)
+            if getattr(embedder, "stats_name", None):
+                stats[embedder.stats_name] = embedder.stats()
+        compactor = MemoryProvider._compactor
+        if compactor is not None and compactor.backend is memory_instance:
+            stats["compaction"] = compactor.stats()
+        return stats
+
+    @staticmethod
+    def compact(memory_instance, config=None):
+        """
+        Deduplicate, expire and cap the memories of all users now.
+
+        Args:
+            memory_instance: Memory instance from get_memory (local backend)
+            config: Dictionary with the memory.compaction settings to use
+
+        Returns:
+            Run report with before/after memory counts and search latency
+        """
+        from src.memory_compaction import MemoryCompactor
+
+        backend = memory_instance
+        while isinstance(backend, MemoryWrapper):
+            backend = backend.memory
+        compactor = MemoryProvider._compactor
+        if compactor is None or compactor.backend is not backend or config is not None:
+            compactor = MemoryCompactor.from_config(memory_instance, config or {})
+        return compactor.run_once(max_users=0)
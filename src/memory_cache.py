@@ -0,0 +1,271 @@
+"""
+Per-user cache of memory search results.
+
+Search results are cached per user, keyed by the normalized query and the
+search arguments, with LRU and TTL eviction. Writes for a user invalidate
+that user's cached searches.
+"""
+
+import collections
+import copy
+import json
+import re
+import threading
+import time
+from typing import Any, Optional
+
+from src.memory import DEFAULT_BATCH_WORKERS, MemoryProvider, MemoryWrapper
+
+DEFAULT_MAX_USERS = 1000
+DEFAULT_MAX_ENTRIES_PER_USER = 128
+DEFAULT_TTL_SECONDS = 300.0
+
+_WHITESPACE = re.compile(r"\s+")
+# Punctuation at either end of a query does not change its meaning
+_EDGE_PUNCTUATION = "?!.,;:'\"` "
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a search query so that trivially different phrasings share a cache entry.
+
+    Args:
+        query: Search query string
+
+    Returns:
+        Case-folded query with collapsed whitespace and no leading or trailing punctuation
+    """
+    return _WHITESPACE.sub(" ", query.casefold()).strip(_EDGE_PUNCTUATION)
+
+
+class CachedMemory(MemoryWrapper):
+    """
+    Memory wrapper caching search results per user.
+
+    Each user has an LRU of at most max_entries_per_user searches, and at
+    most max_users users are cached (least recently used users are dropped
+    first). Entries expire after ttl_seconds. add(), update() and delete
+    operations invalidate the affected user's entries (all entries when the
+    user is unknown); a search that overlaps a write is not cached.
+    """
+
+    stats_name = "search_cache"
+
+    def __init__(
+        self,
+        memory: Any,
+        max_users: int = DEFAULT_MAX_USERS,
+        max_entries_per_user: int = DEFAULT_MAX_ENTRIES_PER_USER,
+        ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS,
+    ):
+        """
+        Initialize the wrapper.
+
+        Args:
+            memory: The memory instance to wrap
+            max_users: Maximum number of users with cached searches
+            max_entries_per_user: Maximum number of cached searches per user
+            ttl_seconds: Seconds a cached search stays valid (None never expires)
+        """
+        super().__init__(memory)
+        self.max_users = max_users
+        self.max_entries_per_user = max_entries_per_user
+        self.ttl_seconds = ttl_seconds
+        # user_id -> OrderedDict of key -> (stored at, result), both in LRU order
+        self._users = collections.OrderedDict()
+        # user_id -> write clock of the user's last write, so searches overlapping a write are not cached.
+        # Bounded to max_users; a user without an entry reads the highest clock value dropped, which
+        # is at least that of any write whose entry was dropped.
+        self._generations = collections.OrderedDict()
+        self._generation_floor = 0
+        self._write_clock = 0
+        self._global_generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_config(cls, memory: Any, config: dict) -> "CachedMemory":
+        """
+        Create a wrapper from the memory.search_cache configuration section.
+
+        Args:
+            memory: The memory instance to wrap
+            config: Dictionary with optional max_users, max_entries_per_user and ttl_seconds
+
+        Returns:
+            CachedMemory instance
+        """
+        return cls(
+            memory,
+            max_users=config.get("max_users", DEFAULT_MAX_USERS),
+            max_entries_per_user=config.get("max_entries_per_user", DEFAULT_MAX_ENTRIES_PER_USER),
+            ttl_seconds=config.get("ttl_seconds", DEFAULT_TTL_SECONDS),
+        )
+
+    def _generation(self, user_id: str) -> tuple:
+        return (self._global_generation, self._generations.get(user_id, self._generation_floor))
+
+    def _lookup(self, user_id: str, key: tuple, now: float) -> tuple:
+        """Return (True, cached result) on a hit, else (False, generation to store the result under)."""
+        with self._lock:
+            entries = self._users.get(user_id)
+            if entries is not None and key in entries:
+                stored_at, result = entries[key]
+                if self.ttl_seconds is None or now - stored_at < self.ttl_seconds:
+                    entries.move_to_end(key)
+                    self._users.move_to_end(user_id)
+                    self.hits += 1
+                    return True, copy.deepcopy(result)
+                del entries[key]
+                self.evictions += 1
+            self.misses += 1
+            return False, self._generation(user_id)
+
+    def _store_unless_written(self, user_id: str, key: tuple, now: float, generation: tuple, result: Any) -> None:
+        with self._lock:
+            if self._generation(user_id) == generation:
+                self._store(user_id, key, now, copy.deepcopy(result))
+
+    def search(self, query, user_id="default_user", limit=3, **kwargs):
+        key = (normalize_query(query), limit, json.dumps(kwargs, sort_keys=True, default=str))
+        now = time.monotonic()
+        hit, value = self._lookup(user_id, key, now)
+        if hit:
+            return value
+        result = self.memory.search(query=query, user_id=user_id, limit=limit, **kwargs)
+        self._store_unless_written(user_id, key, now, value, result)
+        return result
+
+    def search_many(self, requests, limit=3, max_workers=DEFAULT_BATCH_WORKERS):
+        """
+        Answer cached searches and send the misses to the wrapped memory as one batch.
+
+        Args:
+            requests: List of dicts with 'query' and optional 'user_id' and 'limit'
+            limit: Maximum number of results of requests without their own limit
+            max_workers: Maximum number of users searched in parallel
+
+        Returns:
+            Per-request results in input order, as MemoryProvider.search_many
+        """
+        now = time.monotonic()
+        results = [None] * len(requests)
+        misses = []
+        for index, request in enumerate(requests):
+            user_id = request.get("user_id", "default_user")
+            request_limit = request.get("limit", limit)
+            key = (normalize_query(request["query"]), request_limit, json.dumps({}))
+            hit, value = self._lookup(user_id, key, now)
+            if hit:
+                results[index] = value
+            else:
+                misses.append((index, user_id, key, value, {**request, "user_id": user_id, "limit": request_limit}))
+        if misses:
+            fetched = MemoryProvider.search_many(
+                self.memory, [miss[4] for miss in misses], limit=limit, max_workers=max_workers
+            )
+            for (index, user_id, key, generation, _), result in zip(misses, fetched):
+                if "error" not in result:
+                    self._store_unless_written(user_id, key, now, generation, result)
+                results[index] = result
+        return results
+
+    def _store(self, user_id: str, key: tuple, now: float, result: Any) -> None:
+        # Called with the lock held
+        entries = self._users.get(user_id)
+        if entries is None:
+            entries = self._users[user_id] = collections.OrderedDict()
+            if len(self._users) > self.max_users:
+                _, dropped = self._users.popitem(last=False)
+                self.evictions += len(dropped)
+        self._users.move_to_end(user_id)
+        entries[key] = (now, result)
+        if len(entries) > self.max_entries_per_user:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        """
+        Drop cached searches.
+
+        Args:
+            user_id: User whose searches are dropped (None drops all users)
+        """
+        with self._lock:
+            if user_id is None:
+                self._global_generation += 1
+                self._users.clear()
+            else:
+                self._write_clock += 1
+                self._generations[user_id] = self._write_clock
+                self._generations.move_to_end(user_id)
+                while len(self._generations) > self.max_users:
+                    _, dropped = self._generations.popitem(last=False)
+                    self._generation_floor = max(self._generation_floor, dropped)
+                self._users.pop(user_id, None)
+            self.invalidations += 1
+
+    def add(self, messages, user_id="default_user", **kwargs):
+        # Invalidated before and after, so searches racing the write cannot repopulate stale results
+        self.invalidate(user_id)
+        try:
+            return self.memory.add(messages, user_id=user_id, **kwargs)
+        finally:
+            self.invalidate(user_id)
+
+    def add_many(self, requests, max_workers=DEFAULT_BATCH_WORKERS):
+        user_ids = {request.get("user_id", "default_user") for request in requests}
+        for user_id in user_ids:
+            self.invalidate(user_id)
+        try:
+            return MemoryProvider.add_many(self.memory, requests, max_workers=max_workers)
+        finally:
+            for user_id in user_ids:
+                self.invalidate(user_id)
+
+    def update(self, *args, **kwargs):
+        try:
+            return self.memory.update(*args, **kwargs)
+        finally:
+            self.invalidate()
+
+    def delete(self, *args, **kwargs):
+        try:
+            return self.memory.delete(*args, **kwargs)
+        finally:
+            self.invalidate()
+
+    def delete_all(self, *args, user_id=None, **kwargs):
+        try:
+            return self.memory.delete_all(*args, user_id=user_id, **kwargs)
+        finally:
+            self.invalidate(user_id)
+
+    def reset(self, *args, **kwargs):
+        try:
+            return self.memory.reset(*args, **kwargs)
+        finally:
+            self.invalidate()
+
+    def stats(self) -> dict:
+        """
+        Get cache statistics.
+
+        Returns:
+            Dictionary with hits, misses, hit_rate, invalidations, evictions,
+            users and entries
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "users": len(self._users),
+                "entries": sum(len(entries) for entries in self._users.values()),
+            }
@@ -0,0 +1,225 @@
+"""
+Background deduplication and compaction of per-user memories.
+
+A compactor periodically walks the users of a memory store a few at a
+time, merging near-duplicate memories, expiring stale ones and capping
+each user's size, and reports before/after counts and search latency.
+"""
+
+import collections
+import statistics
+import threading
+import time
+from typing import Any, List, Optional
+
+from src.memory import MemoryWrapper
+
+DEFAULT_INTERVAL_SECONDS = 3600.0
+DEFAULT_USERS_PER_RUN = 50
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+DEFAULT_MIN_USES = 1
+# Searches timed per user before and after compaction
+LATENCY_PROBES = 5
+# Reports of the most recent runs kept
+MAX_REPORTS = 100
+
+
+class MemoryCompactor:
+    """
+    Runs compact_user() of a memory backend incrementally in the background.
+
+    Every interval_seconds, the next users_per_run users (in a round-robin
+    over all users of the backend) are compacted. Wrappers with an
+    invalidate() method, such as the search cache, are told about every
+    user whose memories changed. A report with before/after memory counts
+    and search latency is printed and kept for each run.
+    """
+
+    def __init__(
+        self,
+        memory: Any,
+        interval_seconds: float = DEFAULT_INTERVAL_SECONDS,
+        users_per_run: int = DEFAULT_USERS_PER_RUN,
+        similarity_threshold: Optional[float] = DEFAULT_SIMILARITY_THRESHOLD,
+        max_age_days: Optional[float] = None,
+        min_uses: int = DEFAULT_MIN_USES,
+        max_memories_per_user: Optional[int] = None,
+    ):
+        """
+        Initialize the compactor.
+
+        Args:
+            memory: Memory instance from MemoryProvider.get_memory; its
+                innermost memory must provide users() and compact_user()
+            interval_seconds: Seconds between runs
+            users_per_run: Users compacted per run
+            similarity_threshold: Cosine similarity above which memories are merged (None skips merging)
+            max_age_days: Age after which rarely used memories expire (None never expires)
+            min_uses: Searches a memory must have been returned by to survive expiry
+            max_memories_per_user: Maximum number of memories kept per user (None is unbounded)
+
+        Raises:
+            ValueError: If the memory backend does not support compaction
+        """
+        self.wrappers: List[Any] = []
+        backend = memory
+        while isinstance(backend, MemoryWrapper):
+            self.wrappers.append(backend)
+            backend = backend.memory
+        if not hasattr(backend, "compact_user"):
+            raise ValueError(f"{type(backend).__name__} does not support compaction; use the local memory backend")
+        self.backend = backend
+        self.interval_seconds = interval_seconds
+        self.users_per_run = users_per_run
+        self.similarity_threshold = similarity_threshold
+        self.max_age_seconds = max_age_days * 86400 if max_age_days is not None else None
+        self.min_uses = min_uses
+        self.max_memories_per_user = max_memories_per_user
+        self.reports = collections.deque(maxlen=MAX_REPORTS)
+        self._cursor = 0
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, memory: Any, config: dict) -> "MemoryCompactor":
+        """
+        Create a compactor from the memory.compaction configuration section.
+
+        Args:
+            memory: Memory instance from MemoryProvider.get_memory
+            config: Dictionary with optional interval_seconds, users_per_run,
+                similarity_threshold, max_age_days, min_uses and max_memories_per_user
+
+        Returns:
+            MemoryCompactor instance
+        """
+        return cls(
+            memory,
+            interval_seconds=config.get("interval_seconds", DEFAULT_INTERVAL_SECONDS),
+            users_per_run=config.get("users_per_run", DEFAULT_USERS_PER_RUN),
+            similarity_threshold=config.get("similarity_threshold", DEFAULT_SIMILARITY_THRESHOLD),
+            max_age_days=config.get("max_age_days"),
+            min_uses=config.get("min_uses", DEFAULT_MIN_USES),
+            max_memories_per_user=config.get("max_memories_per_user"),
+        )
+
+    def _search_latency(self, user_id: str) -> Optional[float]:
+        # Median of a few searches for the user's first memory, bypassing any cache
+        memories = self.backend.get_all(user_id=user_id, limit=1)["results"]
+        if not memories:
+            return None
+        timings = []
+        for _ in range(LATENCY_PROBES):
+            started = time.perf_counter()
+            self.backend.search(query=memories[0]["memory"], user_id=user_id, limit=3, track_usage=False)
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings)
+
+    def compact_user(self, user_id: str) -> dict:
+        """
+        Compact one user's memories.
+
+        Args:
+            user_id: User identifier
+
+        Returns:
+            Report of the backend's compact_user() with search latency before and after in ms
+        """
+        before = self._search_latency(user_id)
+        report = self.backend.compact_user(
+            user_id,
+            similarity_threshold=self.similarity_threshold,
+            max_age_seconds=self.max_age_seconds,
+            min_uses=self.min_uses,
+            max_memories=self.max_memories_per_user,
+        )
+        if report["after"] != report["before"]:
+            for wrapper in self.wrappers:
+                if hasattr(type(wrapper), "invalidate"):
+                    wrapper.invalidate(user_id)
+        after = self._search_latency(user_id)
+        report["search_ms_before"] = round(before * 1000, 3) if before is not None else None
+        report["search_ms_after"] = round(after * 1000, 3) if after is not None else None
+        return report
+
+    def run_once(self, max_users: Optional[int] = None) -> dict:
+        """
+        Compact the next batch of users.
+
+        Args:
+            max_users: Users to compact (default users_per_run; 0 or less means all)
+
+        Returns:
+            Run report with users, before, after, merged, expired, capped,
+            median search latencies in ms and the per-user reports
+        """
+        with self._run_lock:
+            started = time.perf_counter()
+            users = self.backend.users()
+            count = self.users_per_run if max_users is None else max_users
+            if count <= 0 or count >= len(users):
+                batch = users
+            else:
+                start = self._cursor % len(users)
+                batch = (users[start:] + users[:start])[:count]
+                self._cursor = start + count
+            user_reports = [self.compact_user(user_id) for user_id in batch]
+
+            def median(key):
+                values = [r[key] for r in user_reports if r[key] is not None]
+                return round(statistics.median(values), 3) if values else None
+
+            report = {
+                "users": len(user_reports),
+                "before": sum(r["before"] for r in user_reports),
+                "after": sum(r["after"] for r in user_reports),
+                "merged": sum(r["merged"] for r in user_reports),
+                "expired": sum(r["expired"] for r in user_reports),
+                "capped": sum(r["capped"] for r in user_reports),
+                "search_ms_before": median("search_ms_before"),
+                "search_ms_after": median("search_ms_after"),
+                "seconds": round(time.perf_counter() - started, 3),
+                "user_reports": user_reports,
+            }
+            self.reports.append(report)
+            print(
+                f"[MemoryCompactor] Compacted {report['users']} user(s): {report['before']} -> {report['after']} "
+                f"memories ({report['merged']} merged, {report['expired']} expired, {report['capped']} capped), "
+                f"median search {report['search_ms_before']} -> {report['search_ms_after']} ms"
+            )
+            return report
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"[MemoryCompactor] Compaction run failed: {e}")
+
+    def start(self) -> "MemoryCompactor":
+        """Start compacting in a background thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="memory-compactor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop the background thread after its current run."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> dict:
+        """
+        Get compaction statistics.
+
+        Returns:
+            Dictionary with the number of runs and the last run's report (without per-user reports)
+        """
+        last = self.reports[-1] if self.reports else None
+        return {
+            "runs": len(self.reports),
+            "last_run": {key: value for key, value in last.items() if key != "user_reports"} if last else None,
+        }
@@ -0,0 +1,268 @@
+"""
+Write-behind queue for memory adds.
+
+Adds are put on a bounded queue and applied by a background worker, which
+batches the pending adds of each user into one call of the wrapped memory,
+so an agent turn does not wait for fact extraction and embedding.
+"""
+
+import atexit
+import collections
+import json
+import threading
+import time
+from typing import Any, Optional
+
+from src.memory import DEFAULT_BATCH_WORKERS, MemoryWrapper, fan_out
+
+DEFAULT_MAX_QUEUE = 1000
+DEFAULT_BATCH_SIZE = 32
+# Seconds the worker waits for more adds before applying a batch
+DEFAULT_BATCH_WAIT = 0.5
+DEFAULT_FLUSH_TIMEOUT = 30.0
+
+# What add() does when the queue is full
+WHEN_FULL_POLICIES = ("block", "drop_oldest", "sync")
+
+
+class WriteBehindMemory(MemoryWrapper):
+    """
+    Memory wrapper that applies add() asynchronously.
+
+    add() returns as soon as the messages are queued. A worker thread
+    collects up to batch_size queued adds (waiting at most batch_wait
+    seconds for more), merges the adds of the same user and arguments in
+    queue order, and applies each group with a single add() of the wrapped
+    memory. When the queue is full, add() either blocks until there is
+    room, drops the oldest queued add, or writes synchronously, depending
+    on when_full. Pending adds are flushed at interpreter exit.
+
+    Searches go straight to the wrapped memory, so they do not see adds
+    that are still queued.
+    """
+
+    stats_name = "write_behind"
+
+    def __init__(
+        self,
+        memory: Any,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        batch_wait: float = DEFAULT_BATCH_WAIT,
+        when_full: str = "block",
+        flush_timeout: float = DEFAULT_FLUSH_TIMEOUT,
+    ):
+        """
+        Initialize the wrapper and start its worker.
+
+        Args:
+            memory: The memory instance to wrap
+            max_queue: Maximum number of queued adds
+            batch_size: Maximum number of queued adds applied together
+            batch_wait: Seconds to wait for more adds before applying a batch
+            when_full: "block", "drop_oldest" or "sync"
+            flush_timeout: Seconds close() waits for pending adds at exit
+        """
+        if when_full not in WHEN_FULL_POLICIES:
+            raise ValueError(f"Unknown when_full policy {when_full!r}, expected one of {WHEN_FULL_POLICIES}")
+        super().__init__(memory)
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.when_full = when_full
+        self.flush_timeout = flush_timeout
+        self._queue = collections.deque()
+        # Adds taken by the worker and not yet applied
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._closed = False
+        self.queued = 0
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failed = 0
+        self._worker = threading.Thread(target=self._run, name="memory-write-behind", daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def from_config(cls, memory: Any, config: dict) -> "WriteBehindMemory":
+        """
+        Create a wrapper from the memory.write_behind configuration section.
+
+        Args:
+            memory: The memory instance to wrap
+            config: Dictionary with optional max_queue, batch_size,
+                batch_wait, when_full and flush_timeout
+
+        Returns:
+            WriteBehindMemory instance
+        """
+        return cls(
+            memory,
+            max_queue=config.get("max_queue", DEFAULT_MAX_QUEUE),
+            batch_size=config.get("batch_size", DEFAULT_BATCH_SIZE),
+            batch_wait=config.get("batch_wait", DEFAULT_BATCH_WAIT),
+            when_full=config.get("when_full", "block"),
+            flush_timeout=config.get("flush_timeout", DEFAULT_FLUSH_TIMEOUT),
+        )
+
+    def add(self, messages, user_id="default_user", **kwargs):
+        """
+        Queue messages to be added to memory for a user.
+
+        Args:
+            messages: List of message dicts with 'role' and 'content' (or a string)
+            user_id: User identifier
+            **kwargs: Further arguments of the wrapped memory's add()
+
+        Returns:
+            Dictionary with empty results and whether the add was queued
+        """
+        if isinstance(messages, str):
+            messages = [{"role": "user", "content": messages}]
+        with self._condition:
+            if self._closed:
+                queued = False
+            else:
+                queued = self._wait_for_room()
+            if queued:
+                self._queue.append((user_id, list(messages), kwargs))
+                self.queued += 1
+                self._condition.notify_all()
+        if not queued:
+            return self.memory.add(messages, user_id=user_id, **kwargs)
+        return {"results": [], "queued": True}
+
+    def add_many(self, requests, max_workers=DEFAULT_BATCH_WORKERS):
+        """
+        Queue the adds of many users; they are batched by the worker like single adds.
+
+        Args:
+            requests: List of dicts with 'messages' and optional 'user_id'
+            max_workers: Unused, adds are only queued
+
+        Returns:
+            Per-request results in input order, as MemoryProvider.add_many
+        """
+        return fan_out(
+            lambda request: self.add(request["messages"], user_id=request.get("user_id", "default_user")),
+            requests,
+            max_workers=1,
+        )
+
+    def _wait_for_room(self) -> bool:
+        # Called with the condition held; False means the caller writes synchronously
+        while len(self._queue) >= self.max_queue:
+            if self.when_full == "sync":
+                return False
+            if self.when_full == "drop_oldest":
+                user_id, _, _ = self._queue.popleft()
+                self.dropped += 1
+                print(f"[WriteBehindMemory] Queue full, dropped the oldest pending add for {user_id}")
+                continue
+            self._condition.wait()
+            if self._closed:
+                return False
+        return True
+
+    def _take_batch(self) -> Optional[list]:
+        with self._condition:
+            while not self._queue:
+                if self._closed:
+                    return None
+                self._condition.wait()
+            # Give concurrent turns a moment to add to the same batch
+            deadline = time.monotonic() + self.batch_wait
+            while len(self._queue) < self.batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            self._in_flight += len(batch)
+            # Blocked adds can proceed now
+            self._condition.notify_all()
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            # Adds of the same user and arguments become one add, in queue order
+            groups = {}
+            for user_id, messages, kwargs in batch:
+                key = (user_id, json.dumps(kwargs, sort_keys=True, default=str))
+                group = groups.setdefault(key, {"user_id": user_id, "kwargs": kwargs, "messages": [], "count": 0})
+                group["messages"].extend(messages)
+                group["count"] += 1
+            for group in groups.values():
+                self._apply(group["user_id"], group["messages"], group["kwargs"], group["count"])
+            with self._condition:
+                self.batches += 1
+                self._in_flight -= len(batch)
+                self._condition.notify_all()
+
+    def _apply(self, user_id: str, messages: list, kwargs: dict, count: int) -> None:
+        try:
+            self.memory.add(messages, user_id=user_id, **kwargs)
+        except Exception as e:
+            with self._condition:
+                self.failed += count
+            print(f"[WriteBehindMemory] Failed to add {count} pending add(s) for {user_id}: {e}")
+            return
+        with self._condition:
+            self.written += count
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until all queued adds have been applied.
+
+        Args:
+            timeout: Maximum seconds to wait (None waits indefinitely)
+
+        Returns:
+            True if nothing is left pending, False if the timeout expired
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._queue or self._in_flight:
+                if not self._worker.is_alive():
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def close(self) -> None:
+        """Flush pending adds (up to flush_timeout) and stop the worker."""
+        if self._closed:
+            return
+        if not self.flush(self.flush_timeout):
+            with self._condition:
+                pending = len(self._queue) + self._in_flight
+            print(f"[WriteBehindMemory] {pending} pending add(s) not written within {self.flush_timeout}s")
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._worker.join(timeout=1.0)
+        atexit.unregister(self.close)
+
+    def stats(self) -> dict:
+        """
+        Get write-behind statistics.
+
+        Returns:
+            Dictionary with queued, written, failed, dropped, batches and pending
+        """
+        with self._condition:
+            return {
+                "queued": self.queued,
+                "written": self.written,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "batches": self.batches,
+                "pending": len(self._queue) + self._in_flight,
+            }
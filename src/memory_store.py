@@ -0,0 +1,951 @@
+"""
+Embedded local vector store backend for memory.
+
+Memories are kept under the data dir, one partition per user. A partition
+holds the embeddings in a float32 file that is memory-mapped for search,
+and an append-only JSONL log of adds, updates, deletes and search usage.
+Search is a vectorized cosine top-k with NumPy. Partitions are compacted
+once enough of their rows are dead. Runs offline with the hash embedder, or with any
+OpenAI-compatible embeddings endpoint.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.memory import DEFAULT_BATCH_WORKERS
+
+# Sub-directory of the data dir holding the store
+STORE_DIR_NAME = "memory_store"
+DEFAULT_HASH_DIMENSIONS = 512
+DEFAULT_EMBEDDING_BATCH_SIZE = 256
+# A partition is compacted when more than this fraction of its rows is dead...
+DEFAULT_COMPACT_RATIO = 0.3
+# ...and it has at least this many dead rows
+DEFAULT_COMPACT_MIN_ROWS = 64
+# Message roles stored as memories by add()
+DEFAULT_ROLES = ("user",)
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S%z"
+# Rows compared at once when looking for near-duplicates
+DEDUP_BLOCK_ROWS = 256
+# Search usage is appended to a partition's log once this many memories or seconds are pending
+USAGE_FLUSH_RECORDS = 64
+USAGE_FLUSH_SECONDS = 60.0
+# A partition is rewritten once its log holds this many usage entries per memory
+USAGE_REWRITE_FACTOR = 4
+# Partitions kept loaded; the least recently used is dropped beyond this (it stays on disk)
+DEFAULT_MAX_LOADED_PARTITIONS = 256
+
+_TOKEN = re.compile(r"\w+")
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _content_hash(text: str) -> str:
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+def _timestamp(record: dict) -> float:
+    value = record.get("updated_at") or record.get("created_at")
+    try:
+        return datetime.strptime(value, TIME_FORMAT).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class HashEmbedder:
+    """
+    Offline embedder hashing word unigrams and bigrams into a fixed-size vector.
+
+    Texts sharing words get similar vectors; it needs no model or network,
+    at the cost of not capturing meaning beyond word overlap.
+    """
+
+    def __init__(self, dimensions: int = DEFAULT_HASH_DIMENSIONS):
+        """
+        Initialize the embedder.
+
+        Args:
+            dimensions: Size of the vectors
+        """
+        self.dimensions = dimensions
+        self.name = f"hash-{dimensions}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            L2-normalized float32 array of shape (len(texts), dimensions)
+        """
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = _TOKEN.findall(text.casefold())
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            for feature in features:
+                digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                # The lowest bit picks the sign so collisions tend to cancel out
+                vectors[row, (digest >> 1) % self.dimensions] += 1.0 if digest & 1 else -1.0
+        return _normalize(vectors)
+
+
+class OpenAIEmbedder:
+    """Embedder calling an OpenAI-compatible /embeddings endpoint in batches."""
+
+    def __init__(
+        self,
+        model: str,
+        api_base: Optional[str] = None,
+        api_key: Optional[str] = None,
+        dimensions: Optional[int] = None,
+        batch_size: int = DEFAULT_EMBEDDING_BATCH_SIZE,
+        http_config: Optional[dict] = None,
+    ):
+        """
+        Initialize the embedder.
+
+        Args:
+            model: Embedding model name
+            api_base: Base URL of the endpoint
+            api_key: API key
+            dimensions: Requested vector size (for models that support it)
+            batch_size: Maximum number of texts per request
+            http_config: Pool settings of the shared HTTP client (the llm.http section)
+        """
+        self.model = model
+        self.api_base = api_base
+        self.api_key = api_key
+        self.dimensions = dimensions
+        self.batch_size = batch_size
+        self.http_config = http_config
+        self.name = f"openai-{model}" + (f"-{dimensions}" if dimensions else "")
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import openai
+
+            from src.llm import LLMProvider
+
+            self._client = openai.OpenAI(
+                base_url=self.api_base,
+                api_key=self.api_key,
+                http_client=LLMProvider.get_http_client(self.http_config),
+            )
+        return self._client
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts, batch_size texts per request.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            L2-normalized float32 array with one row per text
+        """
+        extra = {"dimensions": self.dimensions} if self.dimensions else {}
+        rows = []
+        for start in range(0, len(texts), self.batch_size):
+            response = self.client.embeddings.create(
+                model=self.model, input=texts[start:start + self.batch_size], **extra
+            )
+            rows.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+        return _normalize(np.array(rows, dtype=np.float32))
+
+
+class _Partition:
+    """
+    Memories of one user.
+
+    meta.json names the current generation of the vectors and log files;
+    compaction writes a new generation and switches to it by replacing
+    meta.json, so a crash leaves either the old or the new generation.
+    """
+
+    def __init__(self, path: str, user_id: str):
+        self.path = path
+        self.user_id = user_id
+        self.lock = threading.RLock()
+        self.dimensions: Optional[int] = None
+        self.embedder: Optional[str] = None
+        self.generation = 0
+        # id -> record, in insertion order
+        self.records: "OrderedDict[str, dict]" = OrderedDict()
+        # row -> id of the record using it (None for dead rows)
+        self.row_ids: List[Optional[str]] = []
+        # Content hash -> number of records with it, for duplicate checks
+        self.hashes: Dict[str, int] = {}
+        # Ids of records whose uses/last_used changed since they were last logged
+        self.usage_dirty = set()
+        self.usage_flushed = time.monotonic()
+        # Usage entries in the current log, see flush_usage
+        self.usage_entries = 0
+        self._matrix = None
+        self._alive = None
+        self._load()
+
+    def _file(self, kind: str, generation: Optional[int] = None) -> str:
+        generation = self.generation if generation is None else generation
+        return os.path.join(self.path, f"{kind}-{generation}.{'f32' if kind == 'vectors' else 'jsonl'}")
+
+    def _load(self) -> None:
+        meta_path = os.path.join(self.path, "meta.json")
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.dimensions = meta["dimensions"]
+        self.embedder = meta.get("embedder")
+        self.generation = meta["generation"]
+
+        vectors_path = self._file("vectors")
+        row_bytes = 4 * self.dimensions
+        size = os.path.getsize(vectors_path) if os.path.exists(vectors_path) else 0
+        if size % row_bytes:
+            # A write was interrupted; drop the partial row
+            with open(vectors_path, "r+b") as f:
+                f.truncate(size - size % row_bytes)
+        self.row_ids = [None] * (size // row_bytes)
+
+        log_path = self._file("log")
+        if not os.path.exists(log_path):
+            return
+        with open(log_path, "r+b") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                # Drop the torn last line of an interrupted append so later appends start on a fresh line
+                data = data[: data.rfind(b"\n") + 1]
+                f.truncate(len(data))
+        for line in data.decode("utf-8").splitlines():
+            self._replay(json.loads(line))
+
+    def _replay(self, entry: dict) -> None:
+        op = entry.pop("op")
+        memory_id = entry["id"]
+        if op == "usage":
+            record = self.records.get(memory_id)
+            if record is not None:
+                record["uses"] = entry["uses"]
+                record["last_used"] = entry["last_used"]
+            self.usage_entries += 1
+            return
+        self._alive = None
+        if op == "delete":
+            record = self.records.pop(memory_id, None)
+            if record is not None:
+                self.row_ids[record["row"]] = None
+                self._forget_hash(record["hash"])
+            return
+        if entry["row"] >= len(self.row_ids):
+            # Its vector never made it to disk
+            return
+        if op == "update" and memory_id in self.records:
+            previous = self.records[memory_id]
+            self.row_ids[previous["row"]] = None
+            self._forget_hash(previous["hash"])
+            entry = {**previous, **entry}
+        self.records[memory_id] = entry
+        self.row_ids[entry["row"]] = memory_id
+        self.hashes[entry["hash"]] = self.hashes.get(entry["hash"], 0) + 1
+
+    def _forget_hash(self, content_hash: str) -> None:
+        if self.hashes.get(content_hash, 0) > 1:
+            self.hashes[content_hash] -= 1
+        else:
+            self.hashes.pop(content_hash, None)
+
+    def _write_meta(self) -> None:
+        meta_path = os.path.join(self.path, "meta.json")
+        meta = {
+            "user_id": self.user_id,
+            "dimensions": self.dimensions,
+            "embedder": self.embedder,
+            "generation": self.generation,
+        }
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def check_embedder(self, embedder_name: str, dimensions: int) -> None:
+        if self.dimensions is None:
+            os.makedirs(self.path, exist_ok=True)
+            self.dimensions = dimensions
+            self.embedder = embedder_name
+            self._write_meta()
+        elif self.dimensions != dimensions or self.embedder != embedder_name:
+            raise ValueError(
+                f"Memories of {self.user_id} were embedded with {self.embedder} ({self.dimensions} dimensions), "
+                f"not {embedder_name} ({dimensions} dimensions); reset them to switch embedders"
+            )
+
+    def matrix(self) -> np.ndarray:
+        """Memory-mapped vectors of all rows, dead ones included."""
+        rows = len(self.row_ids)
+        if rows == 0:
+            return np.zeros((0, self.dimensions or 0), dtype=np.float32)
+        if self._matrix is None or self._matrix.shape[0] != rows:
+            self._matrix = np.memmap(self._file("vectors"), dtype=np.float32, mode="r", shape=(rows, self.dimensions))
+        return self._matrix
+
+    def alive(self) -> np.ndarray:
+        """Boolean mask of the rows used by a record."""
+        if self._alive is None or len(self._alive) != len(self.row_ids):
+            self._alive = np.array([memory_id is not None for memory_id in self.row_ids], dtype=bool)
+        return self._alive
+
+    def append(self, vectors: np.ndarray, entries: List[dict]) -> None:
+        """Append rows and their log entries (vectors first, so the log never points past the file)."""
+        start = len(self.row_ids)
+        for offset, entry in enumerate(entries):
+            entry["row"] = start + offset
+        with open(self._file("vectors"), "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        self.row_ids.extend([None] * len(entries))
+        self._append_log(entries)
+
+    def _append_log(self, entries: List[dict]) -> None:
+        with open(self._file("log"), "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+        for entry in entries:
+            self._replay(dict(entry))
+
+    def delete(self, memory_ids: List[str]) -> None:
+        self._append_log([{"op": "delete", "id": memory_id} for memory_id in memory_ids if memory_id in self.records])
+
+    def record_usage(self, records: List[dict], now: float) -> None:
+        """Count records as returned by a search; the counts are logged in batches by flush_usage."""
+        for record in records:
+            record["uses"] = record.get("uses", 0) + 1
+            record["last_used"] = now
+            self.usage_dirty.add(record["id"])
+        if (
+            len(self.usage_dirty) >= USAGE_FLUSH_RECORDS
+            or time.monotonic() - self.usage_flushed >= USAGE_FLUSH_SECONDS
+        ):
+            self.flush_usage()
+
+    def flush_usage(self) -> None:
+        """Append pending usage counts to the log, rewriting the partition once usage entries dominate it."""
+        self.usage_flushed = time.monotonic()
+        entries = [
+            {"op": "usage", "id": memory_id, "uses": self.records[memory_id]["uses"],
+             "last_used": self.records[memory_id]["last_used"]}
+            for memory_id in self.usage_dirty
+            if memory_id in self.records
+        ]
+        self.usage_dirty.clear()
+        if not entries:
+            return
+        self._append_log(entries)
+        if self.usage_entries > USAGE_REWRITE_FACTOR * max(len(self.records), 1):
+            self.compact(force=True)
+
+    @property
+    def dead_rows(self) -> int:
+        return len(self.row_ids) - len(self.records)
+
+    def compact(self, force: bool = False) -> int:
+        """
+        Rewrite the partition without dead rows and return how many were dropped.
+
+        Records are rewritten with their usage counts. Without force, a
+        partition without dead rows is left as is.
+        """
+        dropped = self.dead_rows
+        if not dropped and not force:
+            return 0
+        live = list(self.records.values())
+        matrix = self.matrix()
+        generation = self.generation + 1
+        with open(self._file("vectors", generation), "wb") as f:
+            if live:
+                f.write(np.ascontiguousarray(matrix[[record["row"] for record in live]]).tobytes())
+        with open(self._file("log", generation), "w", encoding="utf-8") as f:
+            for row, record in enumerate(live):
+                f.write(json.dumps({"op": "add", **record, "row": row}) + "\n")
+        old = self.generation
+        self.generation = generation
+        self._write_meta()
+        self._matrix = None
+        for kind in ("vectors", "log"):
+            try:
+                os.remove(self._file(kind, old))
+            except FileNotFoundError:
+                pass
+        for row, record in enumerate(live):
+            record["row"] = row
+        self.row_ids = [record["id"] for record in live]
+        self._alive = None
+        self.usage_dirty.clear()
+        self.usage_entries = 0
+        return dropped
+
+
+def _flush_partitions(*partition_maps: Dict[str, _Partition]) -> None:
+    partitions = [partition for partition_map in partition_maps for partition in list(partition_map.values())]
+    for partition in partitions:
+        with partition.lock:
+            try:
+                partition.flush_usage()
+            except OSError as e:
+                print(f"[LocalMemory] Could not log search usage of {partition.user_id}: {str(e)}")
+
+
+class LocalMemory:
+    """
+    Embedded vector store with the search()/add() shape of mem0's Memory.
+
+    add() stores the content of each message with one of the configured
+    roles as a memory (exact duplicates of a user's existing memories are
+    skipped); it does no LLM fact extraction. search() embeds the query and
+    ranks the user's memories by cosine similarity. search_many() and
+    add_many() embed all texts of a batch with one embedder call.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        embedder: Any = None,
+        roles=DEFAULT_ROLES,
+        compact_ratio: float = DEFAULT_COMPACT_RATIO,
+        compact_min_rows: int = DEFAULT_COMPACT_MIN_ROWS,
+        max_loaded_partitions: int = DEFAULT_MAX_LOADED_PARTITIONS,
+    ):
+        """
+        Initialize the store.
+
+        Args:
+            path: Directory of the store
+            embedder: Object with embed(texts) -> normalized float32 array and
+                a name (default: HashEmbedder)
+            roles: Message roles whose content add() stores
+            compact_ratio: Fraction of dead rows above which a partition is compacted
+            compact_min_rows: Minimum number of dead rows before a partition is compacted
+            max_loaded_partitions: Users whose partitions stay loaded; the least
+                recently used one is dropped from memory beyond this
+        """
+        self.path = path
+        self.embedder = embedder or HashEmbedder()
+        self.roles = tuple(roles)
+        self.compact_ratio = compact_ratio
+        self.compact_min_rows = compact_min_rows
+        self.max_loaded_partitions = max_loaded_partitions
+        self._partitions: "OrderedDict[str, _Partition]" = OrderedDict()
+        # Dropped partitions still referenced by a call in progress, taken back rather than loaded twice
+        self._dropped: "weakref.WeakValueDictionary[str, _Partition]" = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        # Pending usage counts are logged when the store is collected or at exit
+        weakref.finalize(self, _flush_partitions, self._partitions, self._dropped)
+
+    @classmethod
+    def from_config(cls, config: Optional[dict], data_dir: Optional[str] = None) -> "LocalMemory":
+        """
+        Create a store from the memory.local configuration section.
+
+        Args:
+            config: Dictionary with optional path, embedder (provider "hash"
+                with dimensions, or provider "openai" with model, api_base,
+                api_key, dimensions and batch_size), roles, compact_ratio and
+                compact_min_rows and max_loaded_partitions
+            data_dir: Data directory the default path is placed in
+
+        Returns:
+            LocalMemory instance
+        """
+        config = config or {}
+        path = config.get("path") or os.path.join(data_dir or ".", STORE_DIR_NAME)
+        embedder_config = config.get("embedder") or {}
+        if embedder_config.get("provider", "hash") == "openai":
+            embedder = OpenAIEmbedder(
+                model=embedder_config["model"],
+                api_base=embedder_config.get("api_base"),
+                api_key=embedder_config.get("api_key"),
+                dimensions=embedder_config.get("dimensions"),
+                batch_size=embedder_config.get("batch_size", DEFAULT_EMBEDDING_BATCH_SIZE),
+                http_config=embedder_config.get("http"),
+            )
+        else:
+            embedder = HashEmbedder(embedder_config.get("dimensions", DEFAULT_HASH_DIMENSIONS))
+        return cls(
+            path,
+            embedder=embedder,
+            roles=config.get("roles", DEFAULT_ROLES),
+            compact_ratio=config.get("compact_ratio", DEFAULT_COMPACT_RATIO),
+            compact_min_rows=config.get("compact_min_rows", DEFAULT_COMPACT_MIN_ROWS),
+            max_loaded_partitions=config.get("max_loaded_partitions", DEFAULT_MAX_LOADED_PARTITIONS),
+        )
+
+    def _partition(self, user_id: str) -> _Partition:
+        dropped = {}
+        with self._lock:
+            partition = self._partitions.get(user_id)
+            if partition is not None:
+                self._partitions.move_to_end(user_id)
+                return partition
+            partition = self._dropped.pop(user_id, None)
+            if partition is None:
+                key = hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:32]
+                partition = _Partition(os.path.join(self.path, key), user_id)
+            self._partitions[user_id] = partition
+            while len(self._partitions) > self.max_loaded_partitions:
+                old_user_id, old = self._partitions.popitem(last=False)
+                self._dropped[old_user_id] = old
+                dropped[old_user_id] = old
+        # Outside the store lock, as flushing takes the partition's lock
+        _flush_partitions(dropped)
+        return partition
+
+    def _stored_users(self) -> List[str]:
+        # Users with rows on disk, read from the partition metadata without loading the partitions
+        users = []
+        for name in sorted(os.listdir(self.path)):
+            partition_path = os.path.join(self.path, name)
+            try:
+                with open(os.path.join(partition_path, "meta.json"), "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                if os.path.getsize(os.path.join(partition_path, f"vectors-{meta['generation']}.f32")):
+                    users.append(meta["user_id"])
+            except (OSError, ValueError, KeyError):
+                continue
+        return users
+
+    def _find(self, memory_id: str) -> Optional[_Partition]:
+        with self._lock:
+            loaded = list(self._partitions.values())
+        for partition in loaded:
+            if memory_id in partition.records:
+                return partition
+        # Then the other users' partitions, loaded one at a time
+        loaded_users = {partition.user_id for partition in loaded}
+        for user_id in self._stored_users():
+            if user_id not in loaded_users:
+                partition = self._partition(user_id)
+                if memory_id in partition.records:
+                    return partition
+        return None
+
+    def _result(self, partition: _Partition, record: dict, score: Optional[float] = None) -> dict:
+        result = {
+            "id": record["id"],
+            "memory": record["memory"],
+            "hash": record["hash"],
+            "metadata": record.get("metadata"),
+            "created_at": record["created_at"],
+            "updated_at": record.get("updated_at"),
+            "user_id": partition.user_id,
+        }
+        if score is not None:
+            result["score"] = score
+        return result
+
+    def _top_k(
+        self, partition: _Partition, queries: np.ndarray, limits: List[int], track_usage: bool = True
+    ) -> List[List[dict]]:
+        """Rank the partition's live rows for each query vector."""
+        now = time.time()
+        with partition.lock:
+            if not partition.records:
+                return [[] for _ in limits]
+            partition.check_embedder(self.embedder.name, queries.shape[1])
+            matrix = partition.matrix()
+            scores = queries @ matrix.T
+            scores[:, ~partition.alive()] = -np.inf
+            results = []
+            for row_scores, limit in zip(scores, limits):
+                k = min(limit, len(partition.records))
+                top = np.argpartition(-row_scores, k - 1)[:k] if k < len(row_scores) else np.arange(len(row_scores))
+                top = top[np.argsort(-row_scores[top])][:k]
+                found = [partition.records[partition.row_ids[row]] for row in top if partition.row_ids[row] is not None]
+                if track_usage:
+                    # Counted for expiry in compact_user and logged in batches
+                    partition.record_usage(found, now)
+                results.append(
+                    [self._result(partition, record, float(row_scores[record["row"]])) for record in found]
+                )
+            return results
+
+    def search(self, query, user_id="default_user", limit=3, track_usage=True, **kwargs):
+        """
+        Search a user's memories.
+
+        Args:
+            query: Search query string
+            user_id: User identifier
+            limit: Maximum number of results
+            track_usage: Count the results as used, for expiry in compact_user
+
+        Returns:
+            Dictionary with the results, most similar first
+        """
+        partition = self._partition(user_id)
+        if not partition.records:
+            return {"results": []}
+        # Stripped like the texts add() stores, so an added message reuses its search embedding
+        return {"results": self._top_k(partition, self.embedder.embed([query.strip()]), [limit], track_usage)[0]}
+
+    def search_many(self, requests, limit=3, max_workers=DEFAULT_BATCH_WORKERS):
+        """
+        Search for many queries and users with one embedder call and one matrix product per user.
+
+        Args:
+            requests: List of dicts with 'query' and optional 'user_id' and 'limit'
+            limit: Maximum number of results of requests without their own limit
+            max_workers: Unused, searches are vectorized instead
+
+        Returns:
+            Per-request results in input order: {"results": [...]} or {"error": message}
+        """
+        results: List[Any] = [None] * len(requests)
+        try:
+            queries = self.embedder.embed([request["query"].strip() for request in requests]) if requests else None
+        except Exception as e:
+            return [{"error": str(e)} for _ in requests]
+        by_user = OrderedDict()
+        for index, request in enumerate(requests):
+            by_user.setdefault(request.get("user_id", "default_user"), []).append(index)
+        for user_id, indices in by_user.items():
+            try:
+                ranked = self._top_k(
+                    self._partition(user_id),
+                    queries[indices],
+                    [requests[index].get("limit", limit) for index in indices],
+                )
+                for index, memories in zip(indices, ranked):
+                    results[index] = {"results": memories}
+            except Exception as e:
+                for index in indices:
+                    results[index] = {"error": str(e)}
+        return results
+
+    def _texts(self, messages) -> List[tuple]:
+        if isinstance(messages, str):
+            messages = [{"role": "user", "content": messages}]
+        texts = []
+        for message in messages:
+            content = message.get("content")
+            if isinstance(content, list):
+                content = "\n".join(part.get("text", "") for part in content if isinstance(part, dict))
+            if message.get("role") in self.roles and content and content.strip():
+                texts.append((content.strip(), message.get("role")))
+        return texts
+
+    def _add_embedded(self, user_id: str, texts: List[tuple], vectors: np.ndarray, metadata: Optional[dict]) -> list:
+        partition = self._partition(user_id)
+        with partition.lock:
+            partition.check_embedder(self.embedder.name, vectors.shape[1])
+            seen = set()
+            entries, rows = [], []
+            now = time.strftime(TIME_FORMAT)
+            for row, (text, role) in enumerate(texts):
+                text_hash = _content_hash(text)
+                if text_hash in partition.hashes or text_hash in seen:
+                    continue
+                seen.add(text_hash)
+                entries.append(
+                    {
+                        "op": "add",
+                        "id": str(uuid.uuid4()),
+                        "memory": text,
+                        "hash": text_hash,
+                        "metadata": {**(metadata or {}), "role": role},
+                        "created_at": now,
+                        "updated_at": None,
+                    }
+                )
+                rows.append(row)
+            if entries:
+                partition.append(vectors[rows], entries)
+        return [{"id": entry["id"], "memory": entry["memory"], "event": "ADD"} for entry in entries]
+
+    def add(self, messages, user_id="default_user", metadata=None, **kwargs):
+        """
+        Store the messages of a user as memories.
+
+        Args:
+            messages: List of message dicts with 'role' and 'content' (or a string)
+            user_id: User identifier
+            metadata: Optional metadata stored with each memory
+
+        Returns:
+            Dictionary with the added memories
+        """
+        texts = self._texts(messages)
+        if not texts:
+            return {"results": []}
+        vectors = self.embedder.embed([text for text, _ in texts])
+        return {"results": self._add_embedded(user_id, texts, vectors, metadata)}
+
+    def add_many(self, requests, max_workers=DEFAULT_BATCH_WORKERS):
+        """
+        Add the messages of many users with one embedder call.
+
+        Args:
+            requests: List of dicts with 'messages' and optional 'user_id' and 'metadata'
+            max_workers: Unused, embedding is batched instead
+
+        Returns:
+            Per-request results in input order: {"results": [...]} or {"error": message}
+        """
+        texts = [self._texts(request["messages"]) for request in requests]
+        flat = [text for request_texts in texts for text, _ in request_texts]
+        try:
+            vectors = self.embedder.embed(flat) if flat else None
+        except Exception as e:
+            return [{"error": str(e)} for _ in requests]
+        results = []
+        offset = 0
+        for request, request_texts in zip(requests, texts):
+            count = len(request_texts)
+            try:
+                added = []
+                if count:
+                    added = self._add_embedded(
+                        request.get("user_id", "default_user"),
+                        request_texts,
+                        vectors[offset:offset + count],
+                        request.get("metadata"),
+                    )
+                results.append({"results": added})
+            except Exception as e:
+                results.append({"error": str(e)})
+            offset += count
+        return results
+
+    def get_all(self, user_id="default_user", limit=100, **kwargs):
+        """
+        List a user's memories, oldest first.
+
+        Args:
+            user_id: User identifier
+            limit: Maximum number of memories
+
+        Returns:
+            Dictionary with the memories
+        """
+        partition = self._partition(user_id)
+        with partition.lock:
+            records = list(partition.records.values())[:limit]
+            return {"results": [self._result(partition, record) for record in records]}
+
+    def update(self, memory_id, data):
+        """
+        Replace the text of a memory.
+
+        Args:
+            memory_id: Identifier of the memory
+            data: New text
+
+        Returns:
+            Dictionary with a message
+        """
+        partition = self._find(memory_id)
+        if partition is None:
+            raise ValueError(f"Memory {memory_id} not found")
+        vector = self.embedder.embed([data])
+        with partition.lock:
+            partition.append(
+                vector,
+                [
+                    {
+                        "op": "update",
+                        "id": memory_id,
+                        "memory": data,
+                        "hash": _content_hash(data),
+                        "updated_at": time.strftime(TIME_FORMAT),
+                    }
+                ],
+            )
+            self._maybe_compact(partition)
+        return {"message": "Memory updated successfully!"}
+
+    def delete(self, memory_id):
+        """
+        Delete a memory.
+
+        Args:
+            memory_id: Identifier of the memory
+
+        Returns:
+            Dictionary with a message
+        """
+        partition = self._find(memory_id)
+        if partition is not None:
+            with partition.lock:
+                partition.delete([memory_id])
+                self._maybe_compact(partition)
+        return {"message": "Memory deleted successfully!"}
+
+    def delete_all(self, user_id=None, **kwargs):
+        """
+        Delete all memories of a user.
+
+        Args:
+            user_id: User identifier (required)
+
+        Returns:
+            Dictionary with a message
+        """
+        if user_id is None:
+            raise ValueError("delete_all needs a user_id; use reset() to delete every user's memories")
+        partition = self._partition(user_id)
+        with partition.lock:
+            partition.delete(list(partition.records))
+            partition.compact()
+        return {"message": "Memories deleted successfully!"}
+
+    def reset(self):
+        """Delete the memories of all users."""
+        with self._lock:
+            self._partitions.clear()
+            self._dropped.clear()
+            shutil.rmtree(self.path, ignore_errors=True)
+            os.makedirs(self.path, exist_ok=True)
+
+    def flush(self, timeout=None) -> bool:
+        """
+        Log the pending search usage counts of all partitions in memory.
+
+        Args:
+            timeout: Unused; the counts are written synchronously
+
+        Returns:
+            True
+        """
+        _flush_partitions(self._partitions, self._dropped)
+        return True
+
+    def _maybe_compact(self, partition: _Partition) -> None:
+        dead = partition.dead_rows
+        if dead >= self.compact_min_rows and dead > self.compact_ratio * len(partition.row_ids):
+            partition.compact()
+
+    def compact(self, user_id: Optional[str] = None) -> int:
+        """
+        Rewrite partitions without their dead rows.
+
+        Args:
+            user_id: User whose partition is compacted (None compacts all)
+
+        Returns:
+            Number of dead rows dropped
+        """
+        user_ids = [user_id] if user_id is not None else self._stored_users()
+        dropped = 0
+        for partition_user_id in user_ids:
+            partition = self._partition(partition_user_id)
+            with partition.lock:
+                dropped += partition.compact()
+        if dropped:
+            print(f"[LocalMemory] Compacted {len(user_ids)} partition(s), dropped {dropped} dead row(s)")
+        return dropped
+
+    def users(self) -> List[str]:
+        """
+        List the users with memories in the store.
+
+        Users are read from the partition metadata on disk, without loading
+        their partitions. A user whose memories were all deleted is listed
+        until the partition is next compacted.
+
+        Returns:
+            User identifiers
+        """
+        return self._stored_users()
+
+    def compact_user(
+        self,
+        user_id: str,
+        similarity_threshold: Optional[float] = None,
+        max_age_seconds: Optional[float] = None,
+        min_uses: int = 1,
+        max_memories: Optional[int] = None,
+    ) -> dict:
+        """
+        Deduplicate, expire and cap a user's memories, then compact the partition.
+
+        Near-duplicates (cosine similarity at or above similarity_threshold)
+        are merged into the most recent memory of their cluster, which
+        inherits their usage counts. Memories older than max_age_seconds that
+        were returned by fewer than min_uses searches are expired. If more
+        than max_memories remain, the least used (then oldest) are dropped.
+        Usage counts are those logged by searches, plus any still pending.
+
+        Args:
+            user_id: User identifier
+            similarity_threshold: Similarity above which memories are merged (None skips merging)
+            max_age_seconds: Age after which unused memories expire (None never expires)
+            min_uses: Searches a memory must have been returned by to survive expiry
+            max_memories: Maximum number of memories kept (None is unbounded)
+
+        Returns:
+            Dictionary with user_id, before, after, merged, expired and capped
+        """
+        partition = self._partition(user_id)
+        with partition.lock:
+            partition.flush_usage()
+            records = list(partition.records.values())
+            report = {"user_id": user_id, "before": len(records), "merged": 0, "expired": 0, "capped": 0}
+            removed = set()
+
+            if similarity_threshold is not None and len(records) > 1:
+                vectors = np.asarray(partition.matrix()[[record["row"] for record in records]])
+                # Most recent first, so each cluster keeps its most recent memory
+                order = sorted(range(len(records)), key=lambda i: (_timestamp(records[i]), i), reverse=True)
+                dropped = np.zeros(len(records), dtype=bool)
+                for start in range(0, len(order), DEDUP_BLOCK_ROWS):
+                    block = order[start:start + DEDUP_BLOCK_ROWS]
+                    similarities = vectors[block] @ vectors.T
+                    for offset, index in enumerate(block):
+                        if dropped[index]:
+                            continue
+                        duplicates = (similarities[offset] >= similarity_threshold) & ~dropped
+                        duplicates[index] = False
+                        for duplicate in np.flatnonzero(duplicates):
+                            records[index]["uses"] = records[index].get("uses", 0) + records[duplicate].get("uses", 0)
+                            removed.add(records[duplicate]["id"])
+                        dropped |= duplicates
+                report["merged"] = len(removed)
+
+            remaining = [record for record in records if record["id"] not in removed]
+            if max_age_seconds is not None:
+                cutoff = time.time() - max_age_seconds
+                expired = [r for r in remaining if _timestamp(r) < cutoff and r.get("uses", 0) < min_uses]
+                removed.update(record["id"] for record in expired)
+                report["expired"] = len(expired)
+                remaining = [record for record in remaining if record["id"] not in removed]
+
+            if max_memories is not None and len(remaining) > max_memories:
+                remaining.sort(key=lambda record: (record.get("uses", 0), _timestamp(record)))
+                capped = remaining[: len(remaining) - max_memories]
+                removed.update(record["id"] for record in capped)
+                report["capped"] = len(capped)
+
+            if removed:
+                partition.delete(list(removed))
+                partition.compact()
+            report["after"] = len(partition.records)
+            return report
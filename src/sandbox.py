@@ -23,6 +23,27 @@ class SandboxProvider:
         """
         return DockerSandbox(config)
 
+    @staticmethod
+    def get_data_dir(config: Dict) -> str:
+        """
+        Get the writable data directory for the current process.
+
+        Inside the sandbox container this is the mounted data_dir; on the host
+        it is the local directory that DockerSandbox mounts there.
+
+        Args:
+            config: Dictionary containing sandbox configuration parameters
+
+        Returns:
+            Absolute path of the data directory
+        """
+        data_dir = config.get("data_dir", "/data")
+        if os.path.isdir(data_dir) and os.access(data_dir, os.W_OK):
+            return data_dir
+        host_data_path = os.path.join(os.getcwd(), "data")
+        pathlib.Path(host_data_path).mkdir(exist_ok=True)
+        return host_data_path
+
 
 class DockerSandbox:
     """
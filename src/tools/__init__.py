@@ -25,10 +25,14 @@ class ToolsProvider:
     """
     
     @staticmethod
-    def get_tools():
+    def get_tools(config=None, data_dir=None):
         """
         Get all available tool instances.
         
+        Args:
+            config: Optional tools configuration, keyed by tool name
+            data_dir: Optional writable directory where tools persist their indexes
+            
         Returns:
             List of tool instances
         """
@@ -39,10 +43,19 @@ class ToolsProvider:
             DuckDuckGoSearchTool,
             VisitWebpageTool,
         )
-        from .code_tools import ListCodeDefinitionNamesTool
-        from .cli_tools import ExecuteCommandTool
+        from .code_tools import ListCodeDefinitionNamesTool, LookupCodeSymbolTool
+        from .cli_tools import (
+            DEFAULT_MAX_OUTPUT_BYTES,
+            DEFAULT_MAX_SAVED_OUTPUT_BYTES,
+            DEFAULT_MAX_SAVED_OUTPUTS,
+            ExecuteCommandTool,
+        )
         # from .agent_tools import MemorySearchTool, MemoryAddTool, RunCodeAgentTool
         
+        config = config or {}
+        write_config = config.get("write_to_file", {})
+        command_config = config.get("execute_command", {})
+        
         return [
             PythonInterpreterTool(),
             FinalAnswerTool(),
@@ -50,12 +63,20 @@ class ToolsProvider:
             DuckDuckGoSearchTool(),
             VisitWebpageTool(),
             ReadFileTool(),
-            SearchFilesTool(),
-            ListFilesTool(),
+            SearchFilesTool(data_dir=data_dir),
+            ListFilesTool(data_dir=data_dir),
             ReplaceInFileTool(),
-            WriteToFileTool(),
-            ExecuteCommandTool(),
-            ListCodeDefinitionNamesTool(),
+            WriteToFileTool(fsync_policy=write_config.get("fsync", "none")),
+            ExecuteCommandTool(
+                persistent=command_config.get("persistent", False),
+                max_output_bytes=command_config.get("max_output_bytes", DEFAULT_MAX_OUTPUT_BYTES),
+                save_full_output=command_config.get("save_full_output", True),
+                data_dir=data_dir,
+                max_saved_outputs=command_config.get("max_saved_outputs", DEFAULT_MAX_SAVED_OUTPUTS),
+                max_saved_output_bytes=command_config.get("max_saved_output_bytes", DEFAULT_MAX_SAVED_OUTPUT_BYTES),
+            ),
+            ListCodeDefinitionNamesTool(data_dir=data_dir),
+            LookupCodeSymbolTool(data_dir=data_dir),
             # MemorySearchTool(),
             # MemoryAddTool(),
             # RunCodeAgentTool(),
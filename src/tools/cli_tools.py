@@ -1,16 +1,259 @@
 from smolagents.default_tools import Tool
+import copy
+import os
+import select
+import selectors
+import shlex
+import signal
 import subprocess
+import threading
+import time
+import uuid
+import weakref
+from collections import deque
 from typing import Optional
 
+# Default cap on the bytes of command output returned to the agent
+DEFAULT_MAX_OUTPUT_BYTES = 32 * 1024
+# Sub-directory of the data dir where full outputs of truncated commands are kept
+OUTPUT_DIR_NAME = "command_output"
+# Default bounds of that directory; the oldest saved outputs are deleted beyond them
+DEFAULT_MAX_SAVED_OUTPUTS = 100
+DEFAULT_MAX_SAVED_OUTPUT_BYTES = 256 * 1024 * 1024
+# Size of each read from a command's output pipes
+READ_CHUNK_BYTES = 65536
+
+
+class BoundedOutput:
+    """
+    Bounded capture of a command's output stream.
+
+    Keeps the first and last max_bytes / 2 bytes, counts the total bytes and
+    lines, and optionally spills the full stream to a file so that nothing
+    beyond the cap is held in memory.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_OUTPUT_BYTES, spill_path: Optional[str] = None):
+        """
+        Initialize the capture.
+
+        Args:
+            max_bytes: Maximum number of bytes kept in memory (head + tail)
+            spill_path: Optional file the full output is written to
+        """
+        self.head_limit = max_bytes // 2
+        self.tail_limit = max_bytes - self.head_limit
+        self.head = bytearray()
+        self.tail = deque()
+        self.tail_size = 0
+        self.total_bytes = 0
+        self.newlines = 0
+        self.ends_with_newline = False
+        self.spill_path = spill_path
+        self._spill = open(spill_path, "wb") if spill_path else None
+
+    def write(self, data: bytes) -> None:
+        if not data:
+            return
+        self.total_bytes += len(data)
+        self.newlines += data.count(b"\n")
+        self.ends_with_newline = data.endswith(b"\n")
+        if self._spill:
+            self._spill.write(data)
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if not data or self.tail_limit <= 0:
+            return
+        self.tail.append(bytes(data))
+        self.tail_size += len(data)
+        while self.tail_size - len(self.tail[0]) >= self.tail_limit:
+            self.tail_size -= len(self.tail.popleft())
+        excess = self.tail_size - self.tail_limit
+        if excess > 0:
+            self.tail[0] = self.tail[0][excess:]
+            self.tail_size -= excess
+
+    @property
+    def truncated(self) -> bool:
+        return self.total_bytes > len(self.head) + self.tail_size
+
+    @property
+    def lines(self) -> int:
+        if self.total_bytes == 0:
+            return 0
+        return self.newlines + (0 if self.ends_with_newline else 1)
+
+    def close(self, keep_spill: Optional[bool] = None) -> None:
+        """
+        Close the spill file.
+
+        Args:
+            keep_spill: Whether to keep the spill file; defaults to keeping it
+                only if the output was truncated
+        """
+        if self._spill is None:
+            return
+        self._spill.close()
+        self._spill = None
+        if keep_spill is None:
+            keep_spill = self.truncated
+        if not keep_spill:
+            os.remove(self.spill_path)
+            self.spill_path = None
+
+    def render(self) -> str:
+        """Return the captured output, with a marker and totals if it was truncated."""
+        tail = b"".join(self.tail)
+        if not self.truncated:
+            return (bytes(self.head) + tail).decode("utf-8", errors="replace")
+        omitted = self.total_bytes - len(self.head) - len(tail)
+        text = (
+            self.head.decode("utf-8", errors="replace")
+            + f"\n... [{omitted} bytes truncated] ...\n"
+            + tail.decode("utf-8", errors="replace")
+        )
+        summary = f"[output: {self.total_bytes} bytes, {self.lines} lines"
+        if self.spill_path:
+            summary += f"; full output saved to {self.spill_path}"
+        return f"{text}\n{summary}]"
+
+
+class ShellSession:
+    """
+    A long-lived shell process that keeps cwd, environment and activated
+    virtualenvs between commands.
+
+    Commands are written to the shell's stdin and run through eval, so a
+    syntax error cannot kill the session. The end of each command's output is
+    marked by a unique sentinel line carrying its exit code. stderr is merged
+    into stdout.
+    """
+
+    def __init__(self, shell: str = "/bin/bash"):
+        """
+        Initialize the session. The shell process is started lazily.
+
+        Args:
+            shell: Path of the shell executable
+        """
+        self.shell = shell
+        self._proc: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def start(self) -> None:
+        """Start the shell process in its own process group."""
+        self._proc = subprocess.Popen(
+            [self.shell, "--noprofile", "--norc"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+            bufsize=0,
+        )
+
+    def close(self) -> None:
+        """Kill the shell and everything it started."""
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        proc.wait()
+        for stream in (proc.stdin, proc.stdout):
+            if stream:
+                stream.close()
+
+    def restart(self) -> None:
+        """Discard the current shell state and start a fresh shell."""
+        with self._lock:
+            self.close()
+            self.start()
+
+    def run(self, command: str, timeout: float, output: BoundedOutput) -> Optional[int]:
+        """
+        Run a command in the session.
+
+        Args:
+            command: Shell command to run
+            timeout: Seconds to wait for the command to finish
+            output: Capture the command's combined output is streamed into
+
+        Returns:
+            Exit code of the command, or None if the command ended the shell
+            (e.g. by calling exit)
+
+        Raises:
+            TimeoutError: If the command did not finish in time. The session
+                is killed and will be restarted on the next call.
+        """
+        with self._lock:
+            if not self.alive:
+                self.start()
+            marker = f"__SESSION_DONE_{uuid.uuid4().hex}__".encode()
+            script = (
+                f"eval {shlex.quote(command)} < /dev/null\n"
+                f"printf '\\n%s %s\\n' '{marker.decode()}' \"$?\"\n"
+            )
+            self._proc.stdin.write(script.encode())
+            self._proc.stdin.flush()
+
+            fd = self._proc.stdout.fileno()
+            deadline = time.monotonic() + timeout
+            sentinel = b"\n" + marker + b" "
+            # Bytes not yet passed to output because they may start the sentinel
+            pending = bytearray()
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    output.write(bytes(pending))
+                    self.close()
+                    raise TimeoutError(f"Command timed out after {timeout} seconds.")
+                ready, _, _ = select.select([fd], [], [], remaining)
+                if not ready:
+                    continue
+                chunk = os.read(fd, READ_CHUNK_BYTES)
+                if not chunk:
+                    # The command exited the shell
+                    output.write(bytes(pending))
+                    self.close()
+                    return None
+                pending.extend(chunk)
+                idx = pending.find(sentinel)
+                if idx != -1:
+                    end = pending.find(b"\n", idx + len(sentinel))
+                    if end != -1:
+                        output.write(bytes(pending[:idx]))
+                        return int(pending[idx + len(sentinel) : end])
+                    continue
+                keep = len(sentinel) - 1
+                if len(pending) > keep:
+                    output.write(bytes(pending[:-keep]))
+                    del pending[:-keep]
+
 
 class ExecuteCommandTool(Tool):
     name = "execute_command"
-    description = "Runs a shell command and returns its output."
+    description = (
+        "Runs a shell command and returns its output. "
+        "By default every call runs in a fresh shell. With persistent=True commands run in a long-lived shell session of the calling agent, "
+        "so 'cd', exported variables and activated virtualenvs carry over to later persistent calls; stderr is merged into stdout in that mode. "
+        "If a persistent command times out the session is killed and a fresh one is started on the next call; restart_session=True forces a fresh session. "
+        "Long output is truncated to its first and last max_output_bytes / 2 bytes with the total size reported; "
+        "when a data directory is configured the full output of a truncated command is saved to a file that can be read with read_file."
+    )
     inputs = {
         "command": {"type": "string", "description": "Shell command to execute."},
         "cwd": {
             "type": "string",
-            "description": "Working directory (optional).",
+            "description": "Working directory (optional). In persistent mode the session changes into it and stays there.",
             "nullable": True,
         },
         "timeout": {
@@ -19,30 +262,232 @@ class ExecuteCommandTool(Tool):
             "nullable": True,
             "default": 30,
         },
+        "persistent": {
+            "type": "boolean",
+            "description": "Run in the persistent shell session (default: the tool's configured mode).",
+            "nullable": True,
+        },
+        "restart_session": {
+            "type": "boolean",
+            "description": "Restart the persistent shell session before running the command (default: False).",
+            "nullable": True,
+            "default": False,
+        },
+        "max_output_bytes": {
+            "type": "integer",
+            "description": "Maximum bytes of output to return per stream (default: the tool's configured limit).",
+            "nullable": True,
+        },
     }
     output_type = "string"
 
+    def __init__(
+        self,
+        persistent: bool = False,
+        shell: str = "/bin/bash",
+        max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES,
+        save_full_output: bool = True,
+        data_dir: Optional[str] = None,
+        max_saved_outputs: int = DEFAULT_MAX_SAVED_OUTPUTS,
+        max_saved_output_bytes: int = DEFAULT_MAX_SAVED_OUTPUT_BYTES,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.persistent = persistent
+        self.max_output_bytes = max_output_bytes
+        self.output_dir = (
+            os.path.join(data_dir, OUTPUT_DIR_NAME) if data_dir and save_full_output else None
+        )
+        self.max_saved_outputs = max_saved_outputs
+        self.max_saved_output_bytes = max_saved_output_bytes
+        # One shell per tool instance; agents sharing a tools list get their own copy via for_session()
+        self.session = ShellSession(shell)
+        self._close_session = weakref.finalize(self, self.session.close)
+
+    def for_session(self) -> "ExecuteCommandTool":
+        """
+        Return a copy of the tool with its own persistent shell session.
+
+        The shell of the copy is killed when the copy is garbage collected
+        (or at interpreter exit), so it lives as long as the agent using it.
+
+        Returns:
+            ExecuteCommandTool instance
+        """
+        tool = copy.copy(self)
+        tool.session = ShellSession(self.session.shell)
+        tool._close_session = weakref.finalize(tool, tool.session.close)
+        return tool
+
+    def close(self) -> None:
+        """Kill the persistent shell session of this tool instance; the next persistent call starts a new one."""
+        self.session.close()
+
     def forward(
-        self, command: str, cwd: Optional[str] = None, timeout: int = 30
+        self,
+        command: str,
+        cwd: Optional[str] = None,
+        timeout: int = 30,
+        persistent: Optional[bool] = None,
+        restart_session: bool = False,
+        max_output_bytes: Optional[int] = None,
     ) -> str:
+        timeout = timeout or 30
+        max_output_bytes = max_output_bytes or self.max_output_bytes
+        if persistent is None:
+            persistent = self.persistent
+        if persistent:
+            return self._run_persistent(command, cwd, timeout, restart_session, max_output_bytes)
+
+        run_id = uuid.uuid4().hex[:12]
+        stdout = self._new_output(max_output_bytes, f"{run_id}.stdout")
+        stderr = self._new_output(max_output_bytes, f"{run_id}.stderr")
         try:
-            result = subprocess.run(
-                command,
-                shell=True,
-                cwd=cwd,
-                capture_output=True,
-                text=True,
-                timeout=timeout,
-            )
-            output = result.stdout.strip()
-            error = result.stderr.strip()
-            if result.returncode == 0:
+            returncode = self._run_streaming(command, cwd, timeout, stdout, stderr)
+            self._close_outputs(stdout, stderr)
+            output = stdout.render().strip()
+            error = stderr.render().strip()
+            if returncode == 0:
                 return output if output else "(No output)"
             else:
-                return (
-                    f"Command failed with code {result.returncode}:\n{error or output}"
-                )
+                return f"Command failed with code {returncode}:\n{error or output}"
         except subprocess.TimeoutExpired:
-            return f"Error: Command timed out after {timeout} seconds."
+            self._close_outputs(stdout, stderr)
+            partial = (stdout.render() + stderr.render()).strip()
+            message = f"Error: Command timed out after {timeout} seconds."
+            return f"{message}\nPartial output:\n{partial}" if partial else message
+        except Exception as e:
+            stdout.close(keep_spill=False)
+            stderr.close(keep_spill=False)
+            return f"Error running command: {str(e)}"
+
+    def _close_outputs(self, *outputs: BoundedOutput) -> None:
+        """Close captures, then delete the oldest saved outputs if one was kept."""
+        for output in outputs:
+            output.close()
+        kept = {output.spill_path for output in outputs if output.spill_path}
+        if kept:
+            self._prune_saved_outputs(kept)
+
+    def _prune_saved_outputs(self, keep: set) -> None:
+        """
+        Delete the oldest saved outputs beyond max_saved_outputs files or max_saved_output_bytes.
+
+        The paths in keep, just reported to the agent, are never deleted.
+        """
+        try:
+            entries = []
+            with os.scandir(self.output_dir) as it:
+                for entry in it:
+                    if entry.is_file():
+                        st = entry.stat()
+                        entries.append((st.st_mtime, st.st_size, entry.path))
+        except OSError:
+            return
+        entries.sort(reverse=True)
+        count = total = 0
+        for _, size, path in entries:
+            count += 1
+            total += size
+            if path not in keep and (count > self.max_saved_outputs or total > self.max_saved_output_bytes):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _new_output(self, max_output_bytes: int, name: str) -> BoundedOutput:
+        spill_path = None
+        if self.output_dir:
+            try:
+                os.makedirs(self.output_dir, exist_ok=True)
+                spill_path = os.path.join(self.output_dir, f"{name}.log")
+            except OSError as e:
+                print(f"[ExecuteCommandTool] Not saving full output: {str(e)}")
+        return BoundedOutput(max_output_bytes, spill_path)
+
+    @staticmethod
+    def _run_streaming(
+        command: str,
+        cwd: Optional[str],
+        timeout: int,
+        stdout: BoundedOutput,
+        stderr: BoundedOutput,
+    ) -> int:
+        """
+        Run a command in a fresh shell, streaming its output into bounded captures.
+
+        Raises:
+            subprocess.TimeoutExpired: If the command did not finish in time.
+                The command's whole process group is killed.
+        """
+        proc = subprocess.Popen(
+            command,
+            shell=True,
+            cwd=cwd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True,
+        )
+        deadline = time.monotonic() + timeout
+        try:
+            with selectors.DefaultSelector() as selector:
+                selector.register(proc.stdout, selectors.EVENT_READ, stdout)
+                selector.register(proc.stderr, selectors.EVENT_READ, stderr)
+                while selector.get_map():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise subprocess.TimeoutExpired(command, timeout)
+                    for key, _ in selector.select(remaining):
+                        chunk = os.read(key.fd, READ_CHUNK_BYTES)
+                        if chunk:
+                            key.data.write(chunk)
+                        else:
+                            selector.unregister(key.fileobj)
+            return proc.wait(timeout=max(deadline - time.monotonic(), 0))
+        except subprocess.TimeoutExpired:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+            raise
+        finally:
+            proc.stdout.close()
+            proc.stderr.close()
+            proc.wait()
+
+    def _run_persistent(
+        self,
+        command: str,
+        cwd: Optional[str],
+        timeout: int,
+        restart_session: bool,
+        max_output_bytes: int,
+    ) -> str:
+        output = self._new_output(max_output_bytes, f"{uuid.uuid4().hex[:12]}.session")
+        try:
+            if restart_session:
+                self.session.restart()
+            if cwd:
+                command = f"cd {shlex.quote(cwd)} && {{\n{command}\n}}"
+            code = self.session.run(command, timeout, output)
+            self._close_outputs(output)
+            text = output.render().strip()
+            if code is None:
+                return (
+                    f"Shell session exited; a new session will be started on the next call.\n{text}"
+                ).strip()
+            if code == 0:
+                return text if text else "(No output)"
+            return f"Command failed with code {code}:\n{text}"
+        except TimeoutError:
+            self._close_outputs(output)
+            partial = output.render().strip()
+            message = (
+                f"Error: Command timed out after {timeout} seconds. "
+                "The shell session was killed; the next persistent call starts a fresh session."
+            )
+            return f"{message}\nPartial output:\n{partial}" if partial else message
         except Exception as e:
+            output.close(keep_spill=False)
             return f"Error running command: {str(e)}"
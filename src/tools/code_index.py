@@ -0,0 +1,536 @@
+"""
+Cached, parallel parsing of Python source files.
+
+Parse results are cached on disk keyed by (path, mtime, size), so repeated
+queries only re-parse files that changed. Cache misses are parsed across a
+process pool when there are enough of them to amortise the dispatch cost.
+The on-disk cache is an append-only log of changed records, rewritten once
+it holds mostly superseded entries.
+"""
+
+import ast
+import atexit
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Bumped whenever the cached per-file record changes shape
+CACHE_FORMAT_VERSION = 3
+# Sub-directory of the data dir holding the parse caches
+CACHE_DIR_NAME = "code_index"
+# Maximum length of the docstring head stored per symbol
+DOC_HEAD_CHARS = 120
+# Below this many cache misses files are parsed inline instead of in the pool
+PARALLEL_PARSE_MIN_FILES = 32
+# Minimum seconds between the background refreshes of a root that prepare() starts
+REFRESH_INTERVAL_SECONDS = 2.0
+# The cache log is rewritten once it holds this many entries per cached file
+CACHE_REWRITE_FACTOR = 4
+# ... and at least this many entries
+CACHE_REWRITE_MIN_ENTRIES = 1024
+
+_pool: Optional[ProcessPoolExecutor] = None
+# Set once the pool failed to start workers; files are then parsed inline
+_pool_broken = False
+_pool_lock = threading.Lock()
+_indexes: Dict[str, "CodeIndex"] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_process_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Get the process pool shared by the code indexes and content search, creating it on first use.
+
+    Workers are started with forkserver (spawn where it is unavailable)
+    rather than fork, since the agent process already runs threads whose
+    locks a forked child could inherit in a held state. The pool is shut
+    down at interpreter exit. Returns None once it has broken.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None and not _pool_broken:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1, mp_context=context)
+            atexit.register(shutdown_process_pool)
+        return _pool
+
+
+def shutdown_process_pool(broken: bool = False) -> None:
+    """Shut down the shared process pool, if it was started, and optionally stop using one."""
+    global _pool, _pool_broken
+    with _pool_lock:
+        pool, _pool = _pool, None
+        _pool_broken = _pool_broken or broken
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _doc_head(node) -> Optional[str]:
+    """Return the first line of a node's docstring, if it has one."""
+    try:
+        doc = ast.get_docstring(node)
+    except TypeError:
+        return None
+    if not doc:
+        return None
+    return doc.strip().splitlines()[0][:DOC_HEAD_CHARS]
+
+
+def _collect_symbols(node, prefix: str, parent_kind: Optional[str], symbols: list) -> None:
+    """Recursively record definitions below node with qualified names and line spans."""
+    for child in ast.iter_child_nodes(node):
+        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            kind = "async_function" if isinstance(child, ast.AsyncFunctionDef) else "function"
+            if parent_kind == "class":
+                kind = "async_method" if kind == "async_function" else "method"
+            qualname = f"{prefix}{child.name}"
+            symbols.append(
+                {
+                    "name": qualname,
+                    "kind": kind,
+                    "line": child.lineno,
+                    "end_line": getattr(child, "end_lineno", child.lineno),
+                    "doc": _doc_head(child),
+                }
+            )
+            _collect_symbols(child, f"{qualname}.", "function", symbols)
+        elif isinstance(child, ast.ClassDef):
+            qualname = f"{prefix}{child.name}"
+            symbols.append(
+                {
+                    "name": qualname,
+                    "kind": "class",
+                    "line": child.lineno,
+                    "end_line": getattr(child, "end_lineno", child.lineno),
+                    "doc": _doc_head(child),
+                }
+            )
+            _collect_symbols(child, f"{qualname}.", "class", symbols)
+        elif parent_kind is None and isinstance(child, (ast.Import, ast.ImportFrom)):
+            if isinstance(child, ast.ImportFrom):
+                source = "." * child.level + (child.module or "")
+            for alias in child.names:
+                if alias.name == "*":
+                    continue
+                if isinstance(child, ast.Import):
+                    name = alias.asname or alias.name.split(".")[0]
+                    target = alias.name
+                else:
+                    name = alias.asname or alias.name
+                    target = f"{source}.{alias.name}" if child.module else f"{source}{alias.name}"
+                symbols.append(
+                    {
+                        "name": name,
+                        "kind": "import",
+                        "line": child.lineno,
+                        "end_line": getattr(child, "end_lineno", child.lineno),
+                        "doc": target,
+                    }
+                )
+        elif parent_kind is None and isinstance(child, (ast.If, ast.Try)):
+            # Definitions guarded by version checks or optional imports are still module-level
+            _collect_symbols(child, prefix, None, symbols)
+
+
+def _literal_all(tree) -> Optional[List[str]]:
+    """Return the module's __all__ if it is assigned a literal list or tuple of strings."""
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(
+            isinstance(t, ast.Name) and t.id == "__all__" for t in node.targets
+        ):
+            try:
+                value = ast.literal_eval(node.value)
+            except ValueError:
+                return None
+            if isinstance(value, (list, tuple)) and all(isinstance(v, str) for v in value):
+                return list(value)
+    return None
+
+
+def parse_file(file_path: str) -> dict:
+    """
+    Parse a Python file and extract its definitions.
+
+    Runs in pool workers, so it must stay a picklable module-level function.
+
+    Args:
+        file_path: Path of the file to parse
+
+    Returns:
+        Dict with 'defs' (list of top-level 'function: x' / 'class: Y' strings),
+        'symbols' (every definition and module-level import, with qualified
+        name, kind, line span and docstring head), 'exports' (the literal
+        __all__, or None) and 'error' (parse error message, or None)
+    """
+    defs = []
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=file_path)
+        for node in ast.iter_child_nodes(tree):
+            if isinstance(node, ast.FunctionDef):
+                defs.append(f"function: {node.name}")
+            elif isinstance(node, ast.ClassDef):
+                defs.append(f"class: {node.name}")
+        symbols = []
+        _collect_symbols(tree, "", None, symbols)
+    except Exception as e:
+        return {"defs": defs, "symbols": [], "exports": None, "error": str(e)}
+    return {"defs": defs, "symbols": symbols, "exports": _literal_all(tree), "error": None}
+
+
+def module_name(file_path: str, root: str) -> str:
+    """
+    Return the dotted module name of a file relative to a root directory.
+
+    Args:
+        file_path: Absolute path of a .py file
+        root: Absolute path of the directory the module name is relative to
+
+    Returns:
+        Dotted module name (e.g. 'pkg.sub' for root/pkg/sub/__init__.py)
+    """
+    rel = os.path.relpath(file_path, root)[: -len(".py")]
+    parts = rel.split(os.sep)
+    if parts[-1] == "__init__":
+        parts = parts[:-1] or [os.path.basename(root)]
+    return ".".join(parts)
+
+
+def invalidate_file(file_path: str) -> None:
+    """
+    Tell every code index that a file was written, so prepare() re-parses it.
+
+    Called by the file tools after they write a file.
+
+    Args:
+        file_path: Path of the written file
+    """
+    if not file_path.endswith(".py"):
+        return
+    abs_path = os.path.abspath(file_path)
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    for index in indexes:
+        index.invalidate(abs_path)
+
+
+def get_code_index(data_dir: Optional[str] = None) -> "CodeIndex":
+    """
+    Get the process-wide code index for a data dir.
+
+    Args:
+        data_dir: Directory where the parse cache is persisted (in-memory only if None)
+
+    Returns:
+        CodeIndex instance
+    """
+    key = data_dir or ""
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            cache_path = None
+            if data_dir:
+                cache_path = os.path.join(data_dir, CACHE_DIR_NAME, "parse_cache.jsonl")
+            index = CodeIndex(cache_path)
+            _indexes[key] = index
+        return index
+
+
+class CodeIndex:
+    """
+    Cache of per-file parse results keyed by absolute path, mtime and size.
+
+    get() stats every file it is given. Symbol queries instead go through
+    prepare(), which answers from memory: a root is indexed in full once,
+    after which only files reported by invalidate() are re-parsed before a
+    query, and the rest of the root is refreshed in the background.
+    """
+
+    def __init__(self, cache_path: Optional[str] = None):
+        """
+        Initialize the index.
+
+        Args:
+            cache_path: JSONL file the cache is persisted to (in-memory only if None)
+        """
+        self.cache_path = cache_path
+        self._lock = threading.Lock()
+        # Entries in the cache log, see _persist
+        self._log_entries = 0
+        # Absolute path -> {"mtime", "size", "defs", "symbols", "exports", "error"}
+        self._files: Dict[str, dict] = self._load()
+        # Files written since they were last parsed, see invalidate
+        self._dirty = set()
+        # Absolute root -> monotonic time its last full refresh started, see prepare
+        self._roots: Dict[str, float] = {}
+        self._refreshing = set()
+        # Symbol name (short and qualified) -> {absolute path: [symbol, ...]}
+        self._by_name: Dict[str, Dict[str, List[dict]]] = {}
+        for path, record in self._files.items():
+            self._index_symbols(path, record)
+
+    def _load(self) -> Dict[str, dict]:
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        files = {}
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                header = json.loads(f.readline() or "{}")
+                if header.get("version") != CACHE_FORMAT_VERSION:
+                    return {}
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A write was interrupted; the file is parsed again when next looked up
+                        continue
+                    if entry["record"] is None:
+                        files.pop(entry["path"], None)
+                    else:
+                        files[entry["path"]] = entry["record"]
+                    self._log_entries += 1
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[CodeIndex] Ignoring unreadable cache '{self.cache_path}': {str(e)}")
+            return {}
+        return files
+
+    def _persist(self, changed: Dict[str, Optional[dict]]) -> None:
+        """Append changed records (None for dropped files) to the cache log, rewriting it when mostly stale."""
+        if not self.cache_path:
+            return
+        try:
+            if self._log_entries > CACHE_REWRITE_FACTOR * max(len(self._files), CACHE_REWRITE_MIN_ENTRIES):
+                self._rewrite()
+                return
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            lines = [
+                json.dumps({"path": path, "record": record}, separators=(",", ":")) + "\n"
+                for path, record in changed.items()
+            ]
+            with open(self.cache_path, "a", encoding="utf-8") as f:
+                if f.tell() == 0:
+                    f.write(json.dumps({"version": CACHE_FORMAT_VERSION}) + "\n")
+                f.write("".join(lines))
+            self._log_entries += len(lines)
+        except OSError as e:
+            print(f"[CodeIndex] Could not persist cache '{self.cache_path}': {str(e)}")
+
+    def _rewrite(self) -> None:
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"version": CACHE_FORMAT_VERSION}) + "\n")
+                for path, record in self._files.items():
+                    f.write(json.dumps({"path": path, "record": record}, separators=(",", ":")) + "\n")
+            os.replace(tmp_path, self.cache_path)
+            self._log_entries = len(self._files)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _index_symbols(self, path: str, record: dict) -> None:
+        for symbol in record.get("symbols", []):
+            for key in {symbol["name"], symbol["name"].rsplit(".", 1)[-1]}:
+                self._by_name.setdefault(key, {}).setdefault(path, []).append(symbol)
+
+    def _unindex_symbols(self, path: str, record: dict) -> None:
+        for symbol in record.get("symbols", []):
+            for key in {symbol["name"], symbol["name"].rsplit(".", 1)[-1]}:
+                bucket = self._by_name.get(key)
+                if bucket is not None:
+                    bucket.pop(path, None)
+                    if not bucket:
+                        del self._by_name[key]
+
+    def get(self, file_paths: List[str], prune_under: Optional[str] = None) -> List[dict]:
+        """
+        Get parse results for a list of files, parsing only those that changed.
+
+        Every file is stat'ed to detect changes.
+
+        Args:
+            file_paths: Paths of the Python files to look up
+            prune_under: Optional directory whose cached files not in file_paths are dropped
+
+        Returns:
+            List of {'defs', 'error'} dicts in the same order as file_paths
+        """
+        keys: List[Tuple[str, int, int]] = []
+        misses = []
+        with self._lock:
+            for path in file_paths:
+                abs_path = os.path.abspath(path)
+                cached = self._files.get(abs_path)
+                try:
+                    st = os.stat(abs_path)
+                    mtime, size = st.st_mtime_ns, st.st_size
+                except OSError:
+                    mtime = size = -1
+                keys.append((abs_path, mtime, size))
+                self._dirty.discard(abs_path)
+                if cached is None or cached["mtime"] != mtime or cached["size"] != size:
+                    misses.append(abs_path)
+
+        parsed = {}
+        pool = get_process_pool() if len(misses) >= PARALLEL_PARSE_MIN_FILES else None
+        if pool is not None:
+            workers = os.cpu_count() or 1
+            chunksize = max(1, len(misses) // (workers * 4))
+            try:
+                parsed = dict(zip(misses, pool.map(parse_file, misses, chunksize=chunksize)))
+            except (BrokenProcessPool, OSError) as e:
+                print(f"[CodeIndex] Process pool unavailable, parsing inline: {str(e)}")
+                shutdown_process_pool(broken=True)
+        if len(parsed) < len(misses):
+            parsed = {path: parse_file(path) for path in misses}
+
+        with self._lock:
+            changed = {}
+            for abs_path, mtime, size in keys:
+                if abs_path in parsed:
+                    old = self._files.get(abs_path)
+                    if old is not None:
+                        self._unindex_symbols(abs_path, old)
+                    record = {"mtime": mtime, "size": size, **parsed[abs_path]}
+                    self._files[abs_path] = record
+                    self._index_symbols(abs_path, record)
+                    changed[abs_path] = record
+            if prune_under:
+                prefix = os.path.join(os.path.abspath(prune_under), "")
+                seen = {key[0] for key in keys}
+                for path in [p for p in self._files if p.startswith(prefix) and p not in seen]:
+                    self._unindex_symbols(path, self._files.pop(path))
+                    changed[path] = None
+            if changed:
+                self._persist(changed)
+            return [
+                {"defs": self._files[k[0]]["defs"], "error": self._files[k[0]]["error"]}
+                for k in keys
+            ]
+
+    def invalidate(self, abs_path: str) -> None:
+        """Mark a file as written, so the next prepare() re-parses it."""
+        with self._lock:
+            self._dirty.add(abs_path)
+
+    def prepare(self, root: str, list_files: Callable[[], List[str]]) -> None:
+        """
+        Bring the symbols under a root up to date enough to be queried.
+
+        The first call for a root parses every file list_files() returns.
+        Later calls only re-parse the files passed to invalidate() since, and
+        start a refresh of the whole root in a background thread at most
+        every REFRESH_INTERVAL_SECONDS, which picks up changes made by other
+        means (shell commands, editors) for later queries.
+
+        Args:
+            root: Directory whose symbols are queried
+            list_files: Returns the paths of the Python files under root
+        """
+        root = os.path.abspath(root)
+        prefix = os.path.join(root, "")
+        now = time.monotonic()
+        with self._lock:
+            started = self._roots.get(root)
+            dirty = [path for path in self._dirty if path.startswith(prefix)]
+            refresh = started is not None and now - started >= REFRESH_INTERVAL_SECONDS and root not in self._refreshing
+            if refresh:
+                self._roots[root] = now
+                self._refreshing.add(root)
+        if started is None:
+            self.get(list_files(), prune_under=root)
+            with self._lock:
+                self._roots.setdefault(root, now)
+            return
+        if dirty:
+            self.get(dirty)
+        if refresh:
+            threading.Thread(target=self._refresh, args=(root, list_files), name="code-index-refresh", daemon=True).start()
+
+    def _refresh(self, root: str, list_files: Callable[[], List[str]]) -> None:
+        try:
+            self.get(list_files(), prune_under=root)
+        except Exception as e:
+            print(f"[CodeIndex] Background refresh of '{root}' failed: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(root)
+
+    def find_symbol(self, name: str, root: str) -> List[Tuple[str, dict]]:
+        """
+        Find where a symbol is defined under a root directory.
+
+        Args:
+            name: Short name ('baz'), qualified name ('Bar.baz') or
+                module-qualified name ('pkg.mod.Bar.baz')
+            root: Directory the search is restricted to
+
+        Returns:
+            List of (absolute path, symbol) tuples
+        """
+        root = os.path.abspath(root)
+        prefix = os.path.join(root, "")
+        with self._lock:
+            matches = [
+                (path, symbol)
+                for path, symbols in self._by_name.get(name, {}).items()
+                if path.startswith(prefix)
+                for symbol in symbols
+            ]
+            if matches or "." not in name:
+                return matches
+            parts = name.split(".")
+            for i in range(len(parts) - 1, 0, -1):
+                path = self._module_path(".".join(parts[:i]), root)
+                if path is None:
+                    continue
+                qualname = ".".join(parts[i:])
+                return [
+                    (path, symbol)
+                    for symbol in self._files[path].get("symbols", [])
+                    if symbol["name"] == qualname
+                ]
+            return []
+
+    def _module_path(self, module: str, root: str) -> Optional[str]:
+        base = os.path.join(root, *module.split("."))
+        for candidate in (f"{base}.py", os.path.join(base, "__init__.py")):
+            if candidate in self._files:
+                return candidate
+        return None
+
+    def module_exports(self, module: str, root: str) -> Optional[Tuple[str, Optional[List[str]], List[dict]]]:
+        """
+        Get what a module exports.
+
+        Args:
+            module: Dotted module name relative to root, or a path to a .py file
+            root: Directory module names are relative to
+
+        Returns:
+            Tuple of (absolute path, literal __all__ or None, top-level public
+            symbols), or None if the module is not indexed
+        """
+        root = os.path.abspath(root)
+        with self._lock:
+            if module.endswith(".py"):
+                path = os.path.abspath(module)
+                path = path if path in self._files else None
+            else:
+                path = self._module_path(module, root)
+            if path is None:
+                return None
+            record = self._files[path]
+            top_level = [
+                symbol
+                for symbol in record.get("symbols", [])
+                if "." not in symbol["name"] and not symbol["name"].startswith("_")
+            ]
+            return path, record.get("exports"), top_level
@@ -1,7 +1,22 @@
 from smolagents.default_tools import Tool
 import os
-import ast
-from typing import List
+from typing import List, Optional
+
+from .code_index import get_code_index, module_name
+from .file_index import get_file_index
+
+
+def _python_files(path: str, data_dir: Optional[str]) -> List[str]:
+    """List the .py files under a directory, in top-down walk order, via the file index."""
+    index, start = get_file_index(path, data_dir)
+    index.refresh(start)
+    file_paths = []
+    for rel, _, files in index.walk(start):
+        root = os.path.join(path, rel) if rel else path
+        for file in files:
+            if file.endswith(".py"):
+                file_paths.append(os.path.join(root, file))
+    return file_paths
 
 
 class ListCodeDefinitionNamesTool(Tool):
@@ -28,6 +43,10 @@ class ListCodeDefinitionNamesTool(Tool):
     }
     output_type = "any"
 
+    def __init__(self, data_dir: Optional[str] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.data_dir = data_dir
+
     def forward(self, path: str, language: str = "python") -> List[str]:
         print(
             f"[ListCodeDefinitionNamesTool] Called with path={path}, language={language}"
@@ -36,38 +55,33 @@ class ListCodeDefinitionNamesTool(Tool):
             error_msg = "Error: Only Python is supported currently."
             print(f"[ListCodeDefinitionNamesTool] {error_msg}")
             return [error_msg]
-        def_names = []
-
-        def extract_defs(file_path):
-            try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    tree = ast.parse(f.read(), filename=file_path)
-                for node in ast.iter_child_nodes(tree):
-                    if isinstance(node, ast.FunctionDef):
-                        def_names.append(f"function: {node.name}")
-                    elif isinstance(node, ast.ClassDef):
-                        def_names.append(f"class: {node.name}")
-            except Exception as e:
-                error_msg = f"{file_path}: Error parsing file: {str(e)}"
-                print(f"[ListCodeDefinitionNamesTool] {error_msg}")
-                def_names.append(error_msg)
 
+        prune_under = None
         if os.path.isfile(path):
             if path.endswith(".py"):
-                extract_defs(path)
+                file_paths = [path]
             else:
                 error_msg = f"Error: '{path}' is not a Python (.py) file."
                 print(f"[ListCodeDefinitionNamesTool] {error_msg}")
                 return [error_msg]
         elif os.path.isdir(path):
-            for root, _, files in os.walk(path):
-                for file in files:
-                    if file.endswith(".py"):
-                        extract_defs(os.path.join(root, file))
+            file_paths = _python_files(path, self.data_dir)
+            prune_under = path
         else:
             error_msg = f"Error: '{path}' is not a valid file or directory."
             print(f"[ListCodeDefinitionNamesTool] {error_msg}")
             return [error_msg]
+
+        def_names = []
+        results = get_code_index(self.data_dir).get(file_paths, prune_under=prune_under)
+        for file_path, result in zip(file_paths, results):
+            def_names.extend(result["defs"])
+            if result["error"] is not None:
+                # Cached messages name the file by absolute path; report it as given
+                error = result["error"].replace(os.path.abspath(file_path), file_path)
+                error_msg = f"{file_path}: Error parsing file: {error}"
+                print(f"[ListCodeDefinitionNamesTool] {error_msg}")
+                def_names.append(error_msg)
         if def_names:
             print(
                 f"[ListCodeDefinitionNamesTool] Found {len(def_names)} code definitions."
@@ -77,3 +91,91 @@ class ListCodeDefinitionNamesTool(Tool):
             msg = "No code definitions found."
             print(f"[ListCodeDefinitionNamesTool] {msg}")
             return [msg]
+
+
+class LookupCodeSymbolTool(Tool):
+    name = "lookup_code_symbol"
+    description = (
+        "Looks up Python symbols in a persistent index instead of reading files: where a function, class, method or import is defined, or what a module exports. "
+        "Input: path (string, required) - directory (or single .py file) whose Python files are indexed. "
+        "Input: name (string, optional) - symbol to locate: a short name ('baz'), qualified name ('Bar.baz') or module-qualified name ('pkg.mod.Bar.baz'). "
+        "Input: module (string, optional) - dotted module name relative to path ('pkg.mod') or path to a .py file, whose exports are listed. "
+        "Output: list of strings 'file:start-end kind qualified_name - docstring head' for each match, or a message if nothing was found. "
+        "Edge cases: One of name or module is required. Only Python files (.py) are indexed; files with syntax errors contribute no symbols. "
+        "Files written with the file tools are re-indexed before the next lookup; other changes (e.g. by shell commands) show up a few seconds later. "
+        "Example: lookup_code_symbol(path='src', name='ReadFileTool') -> ['src/tools/file_tools.py:212-340 class ReadFileTool']"
+    )
+    inputs = {
+        "path": {
+            "type": "string",
+            "description": "Absolute or relative path to the directory (or .py file) to index. Must exist.",
+        },
+        "name": {
+            "type": "string",
+            "description": "Symbol to locate: short, qualified or module-qualified name.",
+            "nullable": True,
+        },
+        "module": {
+            "type": "string",
+            "description": "Dotted module name relative to path, or path to a .py file, whose exports to list.",
+            "nullable": True,
+        },
+    }
+    output_type = "any"
+
+    def __init__(self, data_dir: Optional[str] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.data_dir = data_dir
+
+    def forward(
+        self, path: str, name: Optional[str] = None, module: Optional[str] = None
+    ) -> List[str]:
+        print(
+            f"[LookupCodeSymbolTool] Called with path={path}, name={name}, module={module}"
+        )
+        if not name and not module:
+            error_msg = "Error: Provide a symbol name or a module."
+            print(f"[LookupCodeSymbolTool] {error_msg}")
+            return [error_msg]
+        index = get_code_index(self.data_dir)
+        if os.path.isfile(path) and path.endswith(".py"):
+            root = os.path.dirname(path) or "."
+            index.get([path])
+        elif os.path.isdir(path):
+            root = path
+            # Answered from memory; see CodeIndex.prepare for how changes are picked up
+            index.prepare(path, lambda: _python_files(path, self.data_dir))
+        else:
+            error_msg = f"Error: '{path}' is not a valid directory or Python (.py) file."
+            print(f"[LookupCodeSymbolTool] {error_msg}")
+            return [error_msg]
+        abs_root = os.path.abspath(root)
+
+        def display(abs_path):
+            return os.path.join(root, os.path.relpath(abs_path, abs_root))
+
+        def describe(abs_path, symbol):
+            line = f"{display(abs_path)}:{symbol['line']}-{symbol['end_line']} {symbol['kind']} {symbol['name']}"
+            if symbol["doc"]:
+                line += f" - {symbol['doc']}"
+            return line
+
+        results = []
+        if name:
+            matches = index.find_symbol(name, root)
+            results.extend(describe(abs_path, symbol) for abs_path, symbol in matches)
+        if module:
+            exports = index.module_exports(module, root)
+            if exports is not None:
+                abs_path, all_names, symbols = exports
+                header = f"module {module_name(abs_path, abs_root)} ({display(abs_path)})"
+                if all_names is not None:
+                    header += f" __all__: {', '.join(all_names)}"
+                results.append(header)
+                results.extend(describe(abs_path, symbol) for symbol in symbols)
+        if results:
+            print(f"[LookupCodeSymbolTool] Found {len(results)} result(s).")
+            return results
+        msg = "No matching symbols found."
+        print(f"[LookupCodeSymbolTool] {msg}")
+        return [msg]
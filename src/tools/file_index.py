@@ -0,0 +1,226 @@
+"""
+Persistent, incrementally refreshed index of a directory tree.
+
+Used by the file tools to answer listing and name-search queries without
+re-walking the whole tree on every call.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional, Tuple
+
+# Bumped whenever the on-disk layout changes so stale indexes are rebuilt
+INDEX_FORMAT_VERSION = 1
+# Sub-directory of the data dir holding the index files
+INDEX_DIR_NAME = "file_index"
+# Indexes kept loaded; the least recently used one is dropped beyond this (it stays persisted)
+MAX_LOADED_INDEXES = 32
+
+_indexes: "OrderedDict[str, FileIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_file_index(directory: str, data_dir: Optional[str] = None) -> Tuple["FileIndex", str]:
+    """
+    Get the index covering a directory.
+
+    An already loaded index rooted at the directory or one of its ancestors
+    is reused; otherwise a new index rooted at the directory is created and
+    loaded from the data dir if one was persisted there. At most
+    MAX_LOADED_INDEXES indexes stay loaded, least recently used first out.
+
+    Args:
+        directory: Directory to index
+        data_dir: Directory where indexes are persisted (in-memory only if None)
+
+    Returns:
+        Tuple of (FileIndex, path of directory relative to the index root)
+    """
+    root = os.path.abspath(directory)
+    with _indexes_lock:
+        candidate = root
+        while True:
+            index = _indexes.get(candidate)
+            if index is not None:
+                _indexes.move_to_end(candidate)
+                return index, "" if candidate == root else os.path.relpath(root, candidate)
+            parent = os.path.dirname(candidate)
+            if parent == candidate:
+                break
+            candidate = parent
+        index_path = None
+        if data_dir:
+            digest = hashlib.sha1(root.encode("utf-8")).hexdigest()[:16]
+            index_path = os.path.join(data_dir, INDEX_DIR_NAME, f"{digest}.json")
+        index = FileIndex(root, index_path)
+        _indexes[root] = index
+        while len(_indexes) > MAX_LOADED_INDEXES:
+            _indexes.popitem(last=False)
+        return index, ""
+
+
+class FileIndex:
+    """
+    Index of the paths, sizes and mtimes under a root directory.
+
+    Each directory entry records the directory's own mtime together with the
+    files and sub-directories it contains. A refresh stats every directory but
+    only re-scans those whose mtime changed, so unchanged subtrees cost one
+    stat per directory instead of one per file. File sizes and mtimes are
+    captured when their directory is scanned; in-place edits that do not
+    touch the directory are therefore not reflected until the next re-scan.
+    """
+
+    def __init__(self, root: str, index_path: Optional[str] = None):
+        """
+        Initialize the index.
+
+        Args:
+            root: Absolute path of the indexed directory
+            index_path: JSON file the index is persisted to (in-memory only if None)
+        """
+        self.root = root
+        self.index_path = index_path
+        self._lock = threading.RLock()
+        # Relative dir path ("" for the root) -> {"mtime", "dirs", "links", "files"}
+        self._dirs: Dict[str, dict] = self._load()
+
+    def _load(self) -> Dict[str, dict]:
+        if not self.index_path or not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_FORMAT_VERSION and data.get("root") == self.root:
+                return data["dirs"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[FileIndex] Ignoring unreadable index '{self.index_path}': {str(e)}")
+        return {}
+
+    def _save(self) -> None:
+        if not self.index_path:
+            return
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"version": INDEX_FORMAT_VERSION, "root": self.root, "dirs": self._dirs},
+                    f,
+                    separators=(",", ":"),
+                )
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"[FileIndex] Could not persist index '{self.index_path}': {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def _scan_dir(path: str, mtime: int) -> dict:
+        dirs, links, files = [], [], {}
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir():
+                        if entry.is_symlink():
+                            links.append(entry.name)
+                        else:
+                            dirs.append(entry.name)
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    # Broken symlinks and entries that vanished mid-scan
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                files[entry.name] = [st.st_size, st.st_mtime_ns]
+        return {"mtime": mtime, "dirs": dirs, "links": links, "files": files}
+
+    def refresh(self, start: str = "") -> None:
+        """
+        Bring the subtree rooted at start up to date with the filesystem.
+
+        Args:
+            start: Directory relative to the index root ("" for the whole tree)
+        """
+        with self._lock:
+            changed = False
+            seen = set()
+            stack = [start]
+            while stack:
+                rel = stack.pop()
+                full = os.path.join(self.root, rel) if rel else self.root
+                try:
+                    mtime = os.stat(full).st_mtime_ns
+                    entry = self._dirs.get(rel)
+                    if entry is None or entry["mtime"] != mtime:
+                        entry = self._scan_dir(full, mtime)
+                        self._dirs[rel] = entry
+                        changed = True
+                except OSError:
+                    continue
+                seen.add(rel)
+                stack.extend(os.path.join(rel, d) if rel else d for d in entry["dirs"])
+
+            prefix = start + os.sep if start else ""
+            stale = [
+                rel
+                for rel in self._dirs
+                if rel not in seen and (not start or rel == start or rel.startswith(prefix))
+            ]
+            for rel in stale:
+                del self._dirs[rel]
+            if changed or stale:
+                self._save()
+
+    def walk(
+        self,
+        start: str = "",
+        ignore_dirs=None,
+        max_depth: Optional[int] = None,
+    ) -> Iterator[Tuple[str, list, dict]]:
+        """
+        Walk the index top-down, like os.walk.
+
+        As with os.walk, callers may remove names from the yielded
+        sub-directory list to stop the walk from descending into them.
+
+        Args:
+            start: Directory relative to the index root to walk from
+            ignore_dirs: Optional collection of directory names to prune
+            max_depth: Optional maximum depth below start to descend into
+
+        Yields:
+            Tuples of (dir path relative to start, sub-directory names, {file name: [size, mtime_ns]})
+        """
+        stack = [(start, "", 0)]
+        while stack:
+            rel, out, depth = stack.pop()
+            # Entries are replaced, never mutated, by refresh(), so a looked-up
+            # entry stays consistent even if a refresh runs while we yield.
+            with self._lock:
+                entry = self._dirs.get(rel)
+            if entry is None:
+                continue
+            dirs = entry["dirs"]
+            if ignore_dirs:
+                dirs = [d for d in dirs if d not in ignore_dirs]
+            subdirs = dirs + entry["links"]
+            yield out, subdirs, entry["files"]
+            if max_depth is not None and depth >= max_depth:
+                continue
+            # Symlinked directories are listed but, like os.walk, not followed
+            real_dirs = set(entry["dirs"])
+            stack.extend(
+                (
+                    os.path.join(rel, d) if rel else d,
+                    os.path.join(out, d) if out else d,
+                    depth + 1,
+                )
+                for d in reversed(subdirs)
+                if d in real_dirs
+            )
@@ -1,19 +1,276 @@
 from smolagents.default_tools import Tool
 import os
 import fnmatch
+import mmap
 import re
-from typing import List
+import shutil
+import tempfile
+import threading
+from array import array
+from collections import OrderedDict
+from itertools import islice
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple, Union
+
+from .code_index import get_process_pool, invalidate_file, shutdown_process_pool
+from .file_index import get_file_index
+
+# Number of leading bytes inspected when deciding whether a file is binary
+BINARY_SNIFF_BYTES = 8192
+# Default number of lines returned by a ranged read when line_count is omitted
+DEFAULT_LINE_COUNT = 200
+# Upper bound on the bytes returned by a single ranged read
+DEFAULT_MAX_BYTES = 64 * 1024
+# Number of per-file line offset tables kept in memory
+LINE_INDEX_CACHE_SIZE = 32
+
+# Directories never descended into by content search
+DEFAULT_IGNORE_DIRS = frozenset(
+    {
+        ".git",
+        ".hg",
+        ".svn",
+        "node_modules",
+        "__pycache__",
+        ".venv",
+        "venv",
+        "env",
+        ".tox",
+        ".nox",
+        ".mypy_cache",
+        ".pytest_cache",
+        ".ruff_cache",
+    }
+)
+# Default cap on the number of records returned by content search
+DEFAULT_MAX_RESULTS = 100
+# Files larger than this are skipped by content search
+MAX_SEARCH_FILE_BYTES = 32 * 1024 * 1024
+# Maximum length of the line snippet attached to a content match
+SEARCH_SNIPPET_CHARS = 200
+# Files larger than this are edited by streaming rather than in memory
+STREAM_EDIT_THRESHOLD_BYTES = 8 * 1024 * 1024
+# Number of characters read per chunk when streaming edits
+STREAM_CHUNK_CHARS = 1024 * 1024
+# Sort keys accepted by ListFilesTool
+LIST_SORT_KEYS = ("name", "size", "mtime")
+# Durability policies accepted by WriteToFileTool: no fsync, fsync the file,
+# or fsync the file and its parent directory
+FSYNC_POLICIES = ("none", "file", "full")
+# Below this many candidate files content search runs inline instead of in the process pool
+PARALLEL_SEARCH_MIN_FILES = 256
+# Candidate files are split into this many shards per pool worker, so a search
+# that reaches max_results can cancel the shards that have not started
+SEARCH_SHARDS_PER_WORKER = 4
+
+# Process umask, read once at import since os.umask can only be queried by setting it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+_line_index_cache = OrderedDict()
+_line_index_lock = threading.Lock()
+
+
+def _is_binary(data) -> bool:
+    """Return True if the leading bytes of data look like a binary file."""
+    return b"\x00" in data[:BINARY_SNIFF_BYTES]
+
+
+def _get_line_offsets(file_path: str, mm, stat_result) -> array:
+    """
+    Return the byte offset of the start of every line in a memory-mapped file.
+
+    Offsets are computed once per (path, mtime, size) and kept in a small LRU
+    cache so that paging through a large file does not rescan it.
+    """
+    key = os.path.abspath(file_path)
+    version = (stat_result.st_mtime_ns, stat_result.st_size)
+    with _line_index_lock:
+        cached = _line_index_cache.get(key)
+        if cached is not None and cached[0] == version:
+            _line_index_cache.move_to_end(key)
+            return cached[1]
+
+    offsets = array("q", [0])
+    size = len(mm)
+    pos = mm.find(b"\n")
+    while pos != -1:
+        if pos + 1 < size:
+            offsets.append(pos + 1)
+        pos = mm.find(b"\n", pos + 1)
+
+    with _line_index_lock:
+        _line_index_cache[key] = (version, offsets)
+        _line_index_cache.move_to_end(key)
+        while len(_line_index_cache) > LINE_INDEX_CACHE_SIZE:
+            _line_index_cache.popitem(last=False)
+    return offsets
+
+
+def _search_file_contents(
+    file_path: str,
+    display_path: str,
+    pattern,
+    limit: Optional[int] = None,
+) -> List[Tuple[str, int, str]]:
+    """
+    Return (path, line, snippet) records for the lines of a file matching pattern.
+
+    The file is searched as bytes; binary and oversized files are skipped.
+    Scanning ends after limit records.
+    """
+    try:
+        if os.path.getsize(file_path) > MAX_SEARCH_FILE_BYTES:
+            return []
+        with open(file_path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return []
+    if _is_binary(data):
+        return []
+    records = []
+    line_no = 1
+    last_pos = 0
+    last_line = 0
+    for match in pattern.finditer(data):
+        start = match.start()
+        line_no += data.count(b"\n", last_pos, start)
+        last_pos = start
+        if line_no == last_line:
+            continue
+        last_line = line_no
+        line_start = data.rfind(b"\n", 0, start) + 1
+        line_end = data.find(b"\n", start)
+        if line_end == -1:
+            line_end = len(data)
+        snippet = data[line_start:line_end].decode("utf-8", errors="replace").strip()
+        records.append((display_path, line_no, snippet[:SEARCH_SNIPPET_CHARS]))
+        if limit is not None and len(records) >= limit:
+            break
+    return records
+
+
+def _search_shard(shard: List[Tuple[str, str]], pattern, limit: int) -> List[Tuple[str, int, str]]:
+    """Search the (path, display_path) pairs of a shard in order, stopping after limit records."""
+    records = []
+    for path, display_path in shard:
+        records.extend(_search_file_contents(path, display_path, pattern, limit=limit - len(records)))
+        if len(records) >= limit:
+            break
+    return records
+
+
+def _fsync_directory(directory: str) -> None:
+    """Flush a directory entry to disk so a rename or create survives a crash."""
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class _AtomicFileWriter:
+    """
+    Temporary file next to a target path that replaces the target on commit.
+
+    The target is swapped in with os.replace, so readers see either the old or
+    the new content, never a partial write. Without a commit the temporary
+    file is removed on exit.
+    """
+
+    def __init__(self, file_path: str, encoding: str = "utf-8", newline: Optional[str] = None):
+        self.file_path = file_path
+        directory = os.path.dirname(os.path.abspath(file_path))
+        fd, self.tmp_path = tempfile.mkstemp(
+            prefix=f".{os.path.basename(file_path)}.", suffix=".tmp", dir=directory
+        )
+        self.file = os.fdopen(fd, "w", encoding=encoding, newline=newline)
+
+    def commit(self, fsync: str = "none") -> None:
+        if fsync in ("file", "full"):
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        self.file.close()
+        if os.path.exists(self.file_path):
+            shutil.copymode(self.file_path, self.tmp_path)
+        else:
+            # mkstemp creates files as 0600; give new files the usual permissions
+            os.chmod(self.tmp_path, 0o666 & ~_UMASK)
+        os.replace(self.tmp_path, self.file_path)
+        self.tmp_path = None
+        invalidate_file(self.file_path)
+        if fsync == "full":
+            _fsync_directory(os.path.dirname(os.path.abspath(self.file_path)))
+
+    def abort(self) -> None:
+        self.file.close()
+        if self.tmp_path and os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+        self.tmp_path = None
+
+    def __enter__(self) -> "_AtomicFileWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self.tmp_path:
+            self.abort()
+
+
+class _StreamingReplacer:
+    """
+    Literal search/replace applied to a stream of text chunks.
+
+    The last len(search) - 1 characters of each chunk are held back so that
+    matches spanning a chunk boundary are still found.
+    """
+
+    def __init__(self, search: str, replace: str, count: int):
+        self.search = search
+        self.replace = replace
+        self.remaining = count
+        self.replaced = 0
+        self._carry = ""
+
+    def feed(self, chunk: str) -> str:
+        buf = self._carry + chunk
+        out = []
+        pos = 0
+        while self.remaining != 0:
+            idx = buf.find(self.search, pos)
+            if idx == -1:
+                break
+            out.append(buf[pos:idx])
+            out.append(self.replace)
+            pos = idx + len(self.search)
+            self.remaining -= 1
+            self.replaced += 1
+        if self.remaining == 0:
+            safe_end = len(buf)
+        else:
+            safe_end = max(pos, len(buf) - (len(self.search) - 1))
+        out.append(buf[pos:safe_end])
+        self._carry = buf[safe_end:]
+        return "".join(out)
+
+    def finish(self) -> str:
+        tail, self._carry = self._carry, ""
+        return tail
 
 
 class ReadFileTool(Tool):
     name = "read_file"
     description = (
-        "Reads the entire contents of a text file and returns it as a string. "
+        "Reads the contents of a text file and returns it as a string, either whole or one page at a time. "
         "Input: file_path (string, required) - absolute or relative path to the file. "
         "Input: encoding (string, optional, default 'utf-8') - text encoding to use. "
-        "Output: string containing the file's contents, or an error message if the file does not exist, is not readable, or cannot be decoded. "
-        "Edge cases: If the file does not exist, returns an error message. If the file is binary or too large, may return unreadable output or fail. "
-        "Example: read_file(file_path='notes.txt') -> 'Meeting notes: ...'"
+        "Input: start_line (integer, optional) - 1-based line to start reading from; enables ranged mode. "
+        "Input: line_count (integer, optional, default 200) - number of lines to return in ranged mode. "
+        "Input: start_byte (integer, optional) - byte offset to start reading from; enables ranged mode (ignored if start_line is set). "
+        "Input: max_bytes (integer, optional, default 65536) - maximum number of bytes returned in ranged mode. "
+        "Output: string containing the file's contents. In ranged mode the content is preceded by a header line with the file size, total line count and the range returned, so the next page can be requested. "
+        "Edge cases: If the file does not exist, is binary, or cannot be decoded, returns an error message. Use ranged mode for large files such as logs. "
+        "Example: read_file(file_path='app.log', start_line=1001, line_count=100) -> '[app.log: 52428800 bytes, 812345 lines, showing lines 1001-1100]\\n...'"
     )
     inputs = {
         "file_path": {
@@ -26,16 +283,60 @@ class ReadFileTool(Tool):
             "nullable": True,
             "default": "utf-8",
         },
+        "start_line": {
+            "type": "integer",
+            "description": "1-based line number to start reading from (enables ranged mode).",
+            "nullable": True,
+        },
+        "line_count": {
+            "type": "integer",
+            "description": f"Number of lines to return in ranged mode (default: {DEFAULT_LINE_COUNT}).",
+            "nullable": True,
+        },
+        "start_byte": {
+            "type": "integer",
+            "description": "Byte offset to start reading from (enables ranged mode, ignored if start_line is set).",
+            "nullable": True,
+        },
+        "max_bytes": {
+            "type": "integer",
+            "description": f"Maximum number of bytes to return in ranged mode (default: {DEFAULT_MAX_BYTES}).",
+            "nullable": True,
+        },
     }
     output_type = "string"
 
-    def forward(self, file_path: str, encoding: str = "utf-8") -> str:
-        print(f"[ReadFileTool] Called with file_path={file_path}, encoding={encoding}")
+    def forward(
+        self,
+        file_path: str,
+        encoding: str = "utf-8",
+        start_line: Optional[int] = None,
+        line_count: Optional[int] = None,
+        start_byte: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ) -> str:
+        print(
+            f"[ReadFileTool] Called with file_path={file_path}, encoding={encoding}, start_line={start_line}, line_count={line_count}, start_byte={start_byte}, max_bytes={max_bytes}"
+        )
+        encoding = encoding or "utf-8"
         try:
             if not os.path.exists(file_path):
                 error_msg = f"Error: File '{file_path}' does not exist."
                 print(f"[ReadFileTool] {error_msg}")
                 return error_msg
+            ranged = any(
+                value is not None
+                for value in (start_line, line_count, start_byte, max_bytes)
+            )
+            if ranged:
+                return self._read_range(
+                    file_path, encoding, start_line, line_count, start_byte, max_bytes
+                )
+            with open(file_path, "rb") as f:
+                if _is_binary(f.read(BINARY_SNIFF_BYTES)):
+                    error_msg = f"Error: '{file_path}' appears to be a binary file."
+                    print(f"[ReadFileTool] {error_msg}")
+                    return error_msg
             with open(file_path, "r", encoding=encoding) as f:
                 content = f.read()
             print(f"[ReadFileTool] Successfully read file '{file_path}'")
@@ -55,42 +356,147 @@ class ReadFileTool(Tool):
             print(f"[ReadFileTool] {error_msg}")
             return error_msg
 
+    def _read_range(
+        self,
+        file_path: str,
+        encoding: str,
+        start_line: Optional[int],
+        line_count: Optional[int],
+        start_byte: Optional[int],
+        max_bytes: Optional[int],
+    ) -> str:
+        """Read one page of a file through mmap and prefix it with a paging header."""
+        max_bytes = max_bytes if max_bytes and max_bytes > 0 else DEFAULT_MAX_BYTES
+        with open(file_path, "rb") as f:
+            stat_result = os.fstat(f.fileno())
+            size = stat_result.st_size
+            if size == 0:
+                return f"[{file_path}: 0 bytes, 0 lines, file is empty]"
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if _is_binary(mm[:BINARY_SNIFF_BYTES]):
+                    error_msg = f"Error: '{file_path}' appears to be a binary file ({size} bytes)."
+                    print(f"[ReadFileTool] {error_msg}")
+                    return error_msg
+                offsets = _get_line_offsets(file_path, mm, stat_result)
+                total_lines = len(offsets)
+
+                if start_line is not None or start_byte is None:
+                    first = max(start_line or 1, 1)
+                    if first > total_lines:
+                        return f"[{file_path}: {size} bytes, {total_lines} lines, start_line {first} is past the end of the file]"
+                    count = line_count if line_count and line_count > 0 else DEFAULT_LINE_COUNT
+                    last = min(first + count - 1, total_lines)
+                    begin = offsets[first - 1]
+                    end = offsets[last] if last < total_lines else size
+                    truncated = end - begin > max_bytes
+                    if truncated:
+                        end = begin + max_bytes
+                    data = mm[begin:end]
+                    if truncated:
+                        # The last line shown may be partial
+                        last = first + data.count(b"\n") - data.endswith(b"\n")
+                    shown = f"showing lines {first}-{last}"
+                    if truncated:
+                        shown += f", truncated at {max_bytes} bytes"
+                else:
+                    begin = min(max(start_byte, 0), size)
+                    end = min(begin + max_bytes, size)
+                    data = mm[begin:end]
+                    shown = f"showing bytes {begin}-{end}"
+
+        content = data.decode(encoding, errors="replace")
+        print(f"[ReadFileTool] Successfully read {len(data)} bytes from '{file_path}'")
+        return f"[{file_path}: {size} bytes, {total_lines} lines, {shown}]\n{content}"
+
 
 class WriteToFileTool(Tool):
     name = "write_to_file"
     description = (
-        "Creates or overwrites a text file with the provided content. "
-        "Input: file_path (string, required) - absolute or relative path to the file to write. "
-        "Input: content (string, required) - content to write to the file. "
+        "Creates, overwrites or appends to text files, one file or many per call. "
+        "Input: file_path (string, required unless files is given) - absolute or relative path to the file to write. "
+        "Input: content (string, required unless files is given) - content to write to the file. "
         "Input: encoding (string, optional, default 'utf-8') - text encoding to use. "
-        "Output: string message indicating success or error. "
+        "Input: mode (string, optional, default 'overwrite') - 'overwrite' to replace the file or 'append' to add to its end. "
+        "Input: files (list, optional) - batch of files to write in one call, each a dict with 'file_path', 'content' and optional 'mode' and 'encoding'. "
+        "Input: fsync (string, optional) - durability policy: 'none', 'file' (flush the file to disk) or 'full' (also flush its directory); defaults to the tool's configured policy. "
+        "Output: string message indicating success or error; for a batch, a dict with 'written', 'failed' and per-file 'results'. "
         "Edge cases: If the directory does not exist, it will be created. If the file cannot be written, returns an error message. "
-        "Example: write_to_file(file_path='output.txt', content='Hello!') -> 'File output.txt written successfully.'"
+        "Overwrites go through a temporary file that is renamed into place, so a crash never leaves a half-written file. "
+        "Example: write_to_file(file_path='output.txt', content='Hello!') -> 'File output.txt written successfully.'; "
+        "write_to_file(files=[{'file_path': 'pkg/__init__.py', 'content': ''}, {'file_path': 'pkg/app.py', 'content': 'print(1)'}]) -> {'written': 2, 'failed': 0, 'results': [...]}"
     )
     inputs = {
         "file_path": {
             "type": "string",
             "description": "Absolute or relative path to the file to write. Parent directories will be created if needed.",
+            "nullable": True,
+        },
+        "content": {
+            "type": "string",
+            "description": "Content to write to the file.",
+            "nullable": True,
         },
-        "content": {"type": "string", "description": "Content to write to the file."},
         "encoding": {
             "type": "string",
             "description": "Text encoding to use (e.g., 'utf-8', 'latin-1'). Default is 'utf-8'.",
             "nullable": True,
             "default": "utf-8",
         },
+        "mode": {
+            "type": "string",
+            "description": "'overwrite' (default) or 'append'.",
+            "nullable": True,
+            "default": "overwrite",
+        },
+        "files": {
+            "type": "array",
+            "description": "Batch of files to write, each a dict with 'file_path', 'content' and optional 'mode' and 'encoding'.",
+            "nullable": True,
+        },
+        "fsync": {
+            "type": "string",
+            "description": "Durability policy: 'none', 'file' or 'full' (default: the tool's configured policy).",
+            "nullable": True,
+        },
     }
-    output_type = "string"
+    output_type = "any"
+
+    def __init__(self, fsync_policy: str = "none", **kwargs):
+        super().__init__(**kwargs)
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(
+                f"Unsupported fsync policy '{fsync_policy}'. Use one of: {', '.join(FSYNC_POLICIES)}."
+            )
+        self.fsync_policy = fsync_policy
 
-    def forward(self, file_path: str, content: str, encoding: str = "utf-8") -> str:
+    def forward(
+        self,
+        file_path: Optional[str] = None,
+        content: Optional[str] = None,
+        encoding: str = "utf-8",
+        mode: str = "overwrite",
+        files: Optional[list] = None,
+        fsync: Optional[str] = None,
+    ) -> Union[str, Dict]:
         print(
-            f"[WriteToFileTool] Called with file_path={file_path}, encoding={encoding}"
+            f"[WriteToFileTool] Called with file_path={file_path}, encoding={encoding}, mode={mode}, files={len(files) if files else 0}, fsync={fsync}"
         )
+        fsync = fsync or self.fsync_policy
+        if fsync not in FSYNC_POLICIES:
+            error_msg = f"Error: fsync must be one of {', '.join(FSYNC_POLICIES)}."
+            print(f"[WriteToFileTool] {error_msg}")
+            return error_msg
+        if files:
+            return self._write_batch(files, encoding or "utf-8", mode or "overwrite", fsync)
+        if file_path is None or content is None:
+            error_msg = "Error: Provide file_path and content, or a list of files."
+            print(f"[WriteToFileTool] {error_msg}")
+            return error_msg
         try:
-            os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
-            with open(file_path, "w", encoding=encoding) as f:
-                f.write(content)
+            self._write_one(file_path, content, encoding or "utf-8", mode or "overwrite", fsync)
             msg = f"File '{file_path}' written successfully."
+            if mode == "append":
+                msg = f"Content appended to '{file_path}' successfully."
             print(f"[WriteToFileTool] {msg}")
             return msg
         except Exception as e:
@@ -98,19 +504,82 @@ class WriteToFileTool(Tool):
             print(f"[WriteToFileTool] {error_msg}")
             return error_msg
 
+    @staticmethod
+    def _write_one(file_path: str, content: str, encoding: str, mode: str, fsync: str) -> int:
+        """Write a single file according to mode and fsync policy, returning the number of bytes written."""
+        if mode not in ("overwrite", "append"):
+            raise ValueError(f"Unsupported mode '{mode}'. Use 'overwrite' or 'append'.")
+        data = content.encode(encoding)
+        directory = os.path.dirname(file_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        if mode == "append":
+            created = not os.path.exists(file_path)
+            with open(file_path, "ab") as f:
+                f.write(data)
+                if fsync in ("file", "full"):
+                    f.flush()
+                    os.fsync(f.fileno())
+            if created and fsync == "full":
+                _fsync_directory(os.path.abspath(directory))
+            invalidate_file(file_path)
+        else:
+            with _AtomicFileWriter(file_path, encoding=encoding, newline="") as writer:
+                writer.file.write(content)
+                writer.commit(fsync)
+        return len(data)
+
+    def _write_batch(self, files: list, encoding: str, mode: str, fsync: str) -> Dict:
+        results = []
+        for i, spec in enumerate(files, start=1):
+            if not (
+                isinstance(spec, dict)
+                and isinstance(spec.get("file_path"), str)
+                and isinstance(spec.get("content"), str)
+            ):
+                results.append(
+                    {
+                        "file_path": spec.get("file_path") if isinstance(spec, dict) else None,
+                        "status": "error",
+                        "error": f"Entry {i} must be a dict with 'file_path' and 'content' strings.",
+                    }
+                )
+                continue
+            file_mode = spec.get("mode") or mode
+            try:
+                written = self._write_one(
+                    spec["file_path"],
+                    spec["content"],
+                    spec.get("encoding") or encoding,
+                    file_mode,
+                    fsync,
+                )
+                results.append(
+                    {"file_path": spec["file_path"], "status": "ok", "mode": file_mode, "bytes": written}
+                )
+            except Exception as e:
+                results.append(
+                    {"file_path": spec["file_path"], "status": "error", "error": str(e)}
+                )
+        written = sum(1 for r in results if r["status"] == "ok")
+        print(f"[WriteToFileTool] Wrote {written} of {len(results)} files.")
+        return {"written": written, "failed": len(results) - written, "results": results}
+
 
 class ReplaceInFileTool(Tool):
     name = "replace_in_file"
     description = (
-        "Replaces occurrences of a search string or regex pattern within a text file. "
+        "Replaces occurrences of a search string or regex pattern within a text file, optionally applying several edits in one call. "
         "Input: file_path (string, required) - path to the file to edit. "
-        "Input: search (string, required) - text or regex pattern to search for. "
-        "Input: replace (string, required) - replacement text. "
+        "Input: search (string, required unless edits is given) - text or regex pattern to search for. "
+        "Input: replace (string, required unless edits is given) - replacement text. "
         "Input: count (integer, optional, default 1; -1 for all) - number of occurrences to replace. "
         "Input: use_regex (boolean, optional, default False) - interpret search as regex. "
+        "Input: edits (list, optional) - list of edits applied in order, each a dict with 'search', 'replace' and optional 'count' (default 1) and 'use_regex' (default False); replaces search/replace/count/use_regex. "
         "Output: string message indicating how many replacements were made, or an error message. "
-        "Edge cases: If no matches are found, returns a message. If the file does not exist or cannot be edited, returns an error. "
-        "Example: replace_in_file(file_path='script.py', search='foo', replace='bar', count=-1) -> 'Replaced 3 occurrence(s) in script.py.'"
+        "Edge cases: If no matches are found, returns a message and leaves the file untouched. If the file does not exist or cannot be edited, returns an error. "
+        "The file is rewritten through a temporary file and renamed into place, so it is never left half-written. Large files are edited in streaming chunks when all edits are literal. "
+        "Example: replace_in_file(file_path='script.py', search='foo', replace='bar', count=-1) -> 'Replaced 3 occurrence(s) in script.py.'; "
+        "replace_in_file(file_path='script.py', edits=[{'search': 'foo', 'replace': 'bar', 'count': -1}, {'search': 'v[0-9]+', 'replace': 'v2', 'use_regex': True}])"
     )
     inputs = {
         "file_path": {
@@ -119,9 +588,14 @@ class ReplaceInFileTool(Tool):
         },
         "search": {
             "type": "string",
-            "description": "Text or regex pattern to search for in the file.",
+            "description": "Text or regex pattern to search for in the file (required unless edits is given).",
+            "nullable": True,
+        },
+        "replace": {
+            "type": "string",
+            "description": "Replacement text (required unless edits is given).",
+            "nullable": True,
         },
-        "replace": {"type": "string", "description": "Replacement text."},
         "count": {
             "type": "integer",
             "description": "Number of occurrences to replace (default: 1, -1 for all).",
@@ -134,47 +608,65 @@ class ReplaceInFileTool(Tool):
             "nullable": True,
             "default": False,
         },
+        "edits": {
+            "type": "array",
+            "description": "List of edits applied in order, each a dict with 'search', 'replace', optional 'count' and optional 'use_regex'.",
+            "nullable": True,
+        },
     }
     output_type = "string"
 
     def forward(
         self,
         file_path: str,
-        search: str,
-        replace: str,
+        search: Optional[str] = None,
+        replace: Optional[str] = None,
         count: int = 1,
         use_regex: bool = False,
+        edits: Optional[list] = None,
     ) -> str:
         print(
-            f"[ReplaceInFileTool] Called with file_path={file_path}, search={search}, replace={replace}, count={count}, use_regex={use_regex}"
+            f"[ReplaceInFileTool] Called with file_path={file_path}, search={search}, replace={replace}, count={count}, use_regex={use_regex}, edits={edits}"
         )
         if not os.path.exists(file_path):
             error_msg = f"Error: File '{file_path}' does not exist."
             print(f"[ReplaceInFileTool] {error_msg}")
             return error_msg
+        if edits:
+            parsed = self._parse_edits(edits)
+            if isinstance(parsed, str):
+                print(f"[ReplaceInFileTool] {parsed}")
+                return parsed
+        elif search is None or replace is None:
+            error_msg = "Error: Provide either search and replace, or a list of edits."
+            print(f"[ReplaceInFileTool] {error_msg}")
+            return error_msg
+        elif not search:
+            error_msg = "Error: search must be a non-empty string."
+            print(f"[ReplaceInFileTool] {error_msg}")
+            return error_msg
+        else:
+            count = 1 if count is None else count
+            parsed = [(search, replace, count, bool(use_regex))]
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                content = f.read()
-            if use_regex:
-                new_content, n = re.subn(
-                    search, replace, content, count=0 if count == -1 else count
-                )
+            streaming = os.path.getsize(
+                file_path
+            ) > STREAM_EDIT_THRESHOLD_BYTES and not any(edit[3] for edit in parsed)
+            if streaming:
+                counts = self._apply_streaming(file_path, parsed)
             else:
-                n = (
-                    content.count(search)
-                    if count == -1
-                    else min(content.count(search), count)
-                )
-                new_content = content.replace(
-                    search, replace, count if count != -1 else content.count(search)
-                )
+                counts = self._apply_in_memory(file_path, parsed)
+            n = sum(counts)
             if n == 0:
                 msg = "No matches found to replace."
                 print(f"[ReplaceInFileTool] {msg}")
                 return msg
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write(new_content)
             msg = f"Replaced {n} occurrence(s) in '{file_path}'."
+            if len(parsed) > 1:
+                per_edit = ", ".join(
+                    f"edit {i}: {c}" for i, c in enumerate(counts, start=1)
+                )
+                msg = f"Replaced {n} occurrence(s) in '{file_path}' ({per_edit})."
             print(f"[ReplaceInFileTool] {msg}")
             return msg
         except Exception as e:
@@ -182,18 +674,88 @@ class ReplaceInFileTool(Tool):
             print(f"[ReplaceInFileTool] {error_msg}")
             return error_msg
 
+    @staticmethod
+    def _parse_edits(edits: list):
+        """Validate a list of edit dicts, returning (search, replace, count, use_regex) tuples or an error message."""
+        parsed = []
+        for i, edit in enumerate(edits, start=1):
+            if not isinstance(edit, dict):
+                return f"Error: Edit {i} must be a dict with 'search' and 'replace'."
+            search = edit.get("search")
+            replace = edit.get("replace")
+            if not isinstance(search, str) or not search or not isinstance(replace, str):
+                return f"Error: Edit {i} must have a non-empty 'search' string and a 'replace' string."
+            count = edit.get("count", 1)
+            use_regex = edit.get("use_regex", edit.get("regex", False))
+            parsed.append((search, replace, 1 if count is None else int(count), bool(use_regex)))
+        return parsed
+
+    @staticmethod
+    def _apply_in_memory(file_path: str, edits: list) -> List[int]:
+        with open(file_path, "r", encoding="utf-8", newline="") as f:
+            content = f.read()
+        counts = []
+        for search, replace, count, use_regex in edits:
+            if use_regex:
+                content, n = re.subn(
+                    search, replace, content, count=0 if count == -1 else count
+                )
+            else:
+                n = content.count(search)
+                if count != -1:
+                    n = min(n, count)
+                if n:
+                    content = content.replace(search, replace, n)
+            counts.append(n)
+        if sum(counts):
+            with _AtomicFileWriter(file_path, encoding="utf-8", newline="") as writer:
+                writer.file.write(content)
+                writer.commit()
+        return counts
+
+    @staticmethod
+    def _apply_streaming(file_path: str, edits: list) -> List[int]:
+        replacers = [
+            _StreamingReplacer(search, replace, count)
+            for search, replace, count, _ in edits
+        ]
+        with open(file_path, "r", encoding="utf-8", newline="") as src, _AtomicFileWriter(
+            file_path, encoding="utf-8", newline=""
+        ) as writer:
+            while True:
+                chunk = src.read(STREAM_CHUNK_CHARS)
+                if not chunk:
+                    break
+                for replacer in replacers:
+                    chunk = replacer.feed(chunk)
+                writer.file.write(chunk)
+            # Flush held-back tails through the remaining edits in order
+            tail = ""
+            for replacer in replacers:
+                tail = replacer.feed(tail) + replacer.finish()
+            writer.file.write(tail)
+            counts = [replacer.replaced for replacer in replacers]
+            if sum(counts):
+                writer.commit()
+        return counts
+
 
 class SearchFilesTool(Tool):
     name = "search_files"
     description = (
-        "Searches for files in a directory whose names match a regex pattern. "
+        "Searches for files in a directory whose names match a regex pattern, and optionally searches their contents. "
         "Input: directory (string, required) - directory to search in. "
-        "Input: regex_pattern (string, required) - regex pattern to match filenames. "
-        "Input: case_sensitive (boolean, optional, default False) - case-sensitive matching. "
+        "Input: regex_pattern (string, required) - regex pattern to match filenames (use '.*' to consider every file). "
+        "Input: case_sensitive (boolean, optional, default False) - case-sensitive matching of names and contents. "
         "Input: absolute_path (boolean, optional, default True) - return absolute paths. "
-        "Output: list of matching file paths, or a message if no files matched or directory is invalid. "
+        "Input: content_pattern (string, optional) - regex (or literal text) to search for inside the matching files; enables content search. "
+        "Input: literal (boolean, optional, default False) - treat content_pattern as plain text rather than a regex. "
+        f"Input: max_results (integer, optional, default {DEFAULT_MAX_RESULTS}) - stop after this many content matches. "
+        "Output: list of matching file paths or, in content search mode, 'path:line:snippet' records; or a message if nothing matched or the directory is invalid. "
         "Edge cases: If the directory does not exist, returns an error. If no files match, returns a message. "
-        "Example: search_files(directory='src', regex_pattern='.*\\.py$') -> ['/project/src/a.py', ...]"
+        "Content search skips binary files and directories such as .git, node_modules and virtual environments. "
+        "Example: search_files(directory='src', regex_pattern='.*\\.py$') -> ['/project/src/a.py', ...]; "
+        "search_files(directory='src', regex_pattern='.*\\.py$', content_pattern='def main') -> ['/project/src/a.py:12:def main():', ...]"
     )
     inputs = {
         "directory": {
@@ -216,18 +778,42 @@ class SearchFilesTool(Tool):
             "nullable": True,
             "default": True,
         },
+        "content_pattern": {
+            "type": "string",
+            "description": "Regex or literal text to search for inside matching files (enables content search).",
+            "nullable": True,
+        },
+        "literal": {
+            "type": "boolean",
+            "description": "Treat content_pattern as literal text instead of a regex (default: False).",
+            "nullable": True,
+            "default": False,
+        },
+        "max_results": {
+            "type": "integer",
+            "description": f"Maximum number of content matches to return (default: {DEFAULT_MAX_RESULTS}).",
+            "nullable": True,
+            "default": DEFAULT_MAX_RESULTS,
+        },
     }
     output_type = "any"
 
+    def __init__(self, data_dir: Optional[str] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.data_dir = data_dir
+
     def forward(
         self,
         directory: str,
         regex_pattern: str,
         case_sensitive: bool = False,
         absolute_path: bool = True,
+        content_pattern: Optional[str] = None,
+        literal: bool = False,
+        max_results: int = DEFAULT_MAX_RESULTS,
     ) -> List[str]:
         print(
-            f"[SearchFilesTool] Called with directory={directory}, regex_pattern={regex_pattern}, case_sensitive={case_sensitive}, absolute_path={absolute_path}"
+            f"[SearchFilesTool] Called with directory={directory}, regex_pattern={regex_pattern}, case_sensitive={case_sensitive}, absolute_path={absolute_path}, content_pattern={content_pattern}, literal={literal}, max_results={max_results}"
         )
         if not os.path.isdir(directory):
             error_msg = f"Error: '{directory}' is not a valid directory."
@@ -235,8 +821,18 @@ class SearchFilesTool(Tool):
             return [error_msg]
         flags = re.IGNORECASE if not case_sensitive else 0
         pattern = re.compile(regex_pattern, flags)
+        if content_pattern:
+            return self._search_contents(
+                directory,
+                pattern,
+                content_pattern,
+                flags,
+                absolute_path,
+                literal,
+                max_results if max_results and max_results > 0 else DEFAULT_MAX_RESULTS,
+            )
         matches = []
-        for root, _, files in os.walk(directory):
+        for root, _, files in self._walk(directory):
             for file in files:
                 if pattern.match(file):
                     path = os.path.join(root, file)
@@ -249,17 +845,112 @@ class SearchFilesTool(Tool):
             print(f"[SearchFilesTool] {msg}")
             return [msg]
 
+    def _walk(self, directory: str, ignore_dirs=None):
+        """Walk the file index for directory, yielding (root, dirs, files) like os.walk."""
+        index, start = get_file_index(directory, self.data_dir)
+        index.refresh(start)
+        for rel, dirs, files in index.walk(start, ignore_dirs=ignore_dirs):
+            yield (os.path.join(directory, rel) if rel else directory), dirs, files
+
+    def _search_contents(
+        self,
+        directory: str,
+        name_pattern,
+        content_pattern: str,
+        flags: int,
+        absolute_path: bool,
+        literal: bool,
+        max_results: int,
+    ) -> List[str]:
+        """
+        Search file contents, stopping once max_results is reached.
+
+        Regex matching holds the GIL, so large searches are sharded across
+        the process pool shared with the code index; small ones run inline,
+        where a pool's dispatch cost would outweigh the work.
+        """
+        raw = content_pattern.encode("utf-8")
+        try:
+            pattern = re.compile(re.escape(raw) if literal else raw, flags)
+        except re.error as e:
+            error_msg = f"Error: Invalid content pattern: {str(e)}"
+            print(f"[SearchFilesTool] {error_msg}")
+            return [error_msg]
+
+        candidates = []
+        for root, _, files in self._walk(directory, DEFAULT_IGNORE_DIRS):
+            for file in files:
+                if name_pattern.match(file):
+                    path = os.path.join(root, file)
+                    candidates.append(
+                        (path, os.path.abspath(path) if absolute_path else path)
+                    )
+
+        results = None
+        pool = get_process_pool() if len(candidates) >= PARALLEL_SEARCH_MIN_FILES else None
+        if pool is not None:
+            try:
+                results = self._search_in_pool(pool, candidates, pattern, max_results)
+            except (BrokenProcessPool, OSError) as e:
+                print(f"[SearchFilesTool] Process pool unavailable, searching inline: {str(e)}")
+                shutdown_process_pool(broken=True)
+        if results is None:
+            results = _search_shard(candidates, pattern, max_results)
+        limit_reached = len(results) >= max_results
+        results = results[:max_results]
+
+        if results:
+            # Sort by path and numeric line so line 9 comes before line 10
+            results.sort(key=lambda record: (record[0], record[1]))
+            results = [f"{path}:{line_no}:{snippet}" for path, line_no, snippet in results]
+            suffix = " (result limit reached)" if limit_reached else ""
+            print(
+                f"[SearchFilesTool] Found {len(results)} content matches in {len(candidates)} candidate files{suffix}."
+            )
+            return results
+        msg = "No content matched the pattern."
+        print(f"[SearchFilesTool] {msg}")
+        return [msg]
+
+    @staticmethod
+    def _search_in_pool(pool, candidates, pattern, max_results: int) -> List[Tuple[str, int, str]]:
+        """Search shards of candidates in the process pool, cancelling unstarted shards once max_results is reached."""
+        workers = os.cpu_count() or 1
+        shard_count = min(len(candidates), workers * SEARCH_SHARDS_PER_WORKER)
+        pending = {
+            pool.submit(_search_shard, candidates[i::shard_count], pattern, max_results)
+            for i in range(shard_count)
+        }
+        results = []
+        try:
+            while pending and len(results) < max_results:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results.extend(future.result())
+        finally:
+            # Shards already running finish in the background; their results are dropped
+            for future in pending:
+                future.cancel()
+        return results
+
 
 class ListFilesTool(Tool):
     name = "list_files"
     description = (
-        "Lists all files and/or directories in the specified path. "
+        "Lists files and/or directories in the specified path, optionally recursively and one page at a time. "
         "Input: directory (string, required) - path to list. "
         "Input: recursive (boolean, optional, default False) - list recursively. "
         "Input: exclude_dirs (boolean, optional, default False) - exclude directories from output. "
-        "Output: list of file and/or directory names or paths, or an error message if the path does not exist. "
+        "Input: max_depth (integer, optional) - in recursive mode, how many directory levels below directory to descend (0 lists only its direct entries). "
+        "Input: ignore (list of strings, optional) - glob patterns (e.g. '*.pyc', 'node_modules') matched against entry names and relative paths; matching directories are not descended into. "
+        "Input: sort_by (string, optional) - 'name' (ascending), 'size' or 'mtime' (largest/newest first); unsorted listings are produced lazily. "
+        "Input: page_size (integer, optional) - return at most this many entries, together with a cursor for the next page. "
+        "Input: cursor (string, optional) - next_cursor value returned by a previous paged call. "
+        "Output: list of file and/or directory names (non-recursive) or paths (recursive), or an error message if the path does not exist. "
+        "When page_size is given, a dict {'entries': [...], 'next_cursor': str or None} is returned instead. "
         "Edge cases: If the directory does not exist, returns an error. "
-        "Example: list_files(directory='src', recursive=True) -> ['src/a.py', 'src/b.py', ...]"
+        "Example: list_files(directory='src', recursive=True) -> ['src/a.py', 'src/b.py', ...]; "
+        "list_files(directory='.', recursive=True, max_depth=1, ignore=['.git'], page_size=100) -> {'entries': [...], 'next_cursor': '100'}"
     )
     inputs = {
         "directory": {
@@ -278,41 +969,174 @@ class ListFilesTool(Tool):
             "nullable": True,
             "default": False,
         },
+        "max_depth": {
+            "type": "integer",
+            "description": "Maximum number of directory levels to descend in recursive mode (0 = direct entries only).",
+            "nullable": True,
+        },
+        "ignore": {
+            "type": "array",
+            "description": "Glob patterns matched against entry names and relative paths; matching entries are skipped.",
+            "nullable": True,
+        },
+        "sort_by": {
+            "type": "string",
+            "description": "Sort order: 'name', 'size' or 'mtime' (default: unsorted, produced lazily).",
+            "nullable": True,
+        },
+        "page_size": {
+            "type": "integer",
+            "description": "Maximum number of entries to return; enables paged output with a next_cursor.",
+            "nullable": True,
+        },
+        "cursor": {
+            "type": "string",
+            "description": "Cursor returned as next_cursor by the previous page.",
+            "nullable": True,
+        },
     }
     output_type = "any"
 
+    def __init__(self, data_dir: Optional[str] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.data_dir = data_dir
+
     def forward(
-        self, directory: str, recursive: bool = False, exclude_dirs: bool = False
-    ) -> List[str]:
+        self,
+        directory: str,
+        recursive: bool = False,
+        exclude_dirs: bool = False,
+        max_depth: Optional[int] = None,
+        ignore: Optional[list] = None,
+        sort_by: Optional[str] = None,
+        page_size: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> Union[List[str], Dict]:
         print(
-            f"[ListFilesTool] Called with directory={directory}, recursive={recursive}, exclude_dirs={exclude_dirs}"
+            f"[ListFilesTool] Called with directory={directory}, recursive={recursive}, exclude_dirs={exclude_dirs}, max_depth={max_depth}, ignore={ignore}, sort_by={sort_by}, page_size={page_size}, cursor={cursor}"
         )
         if not os.path.exists(directory):
             error_msg = f"Error: '{directory}' does not exist."
             print(f"[ListFilesTool] {error_msg}")
             return [error_msg]
-        if not recursive:
-            entries = os.listdir(directory)
-            if exclude_dirs:
-                result = [
-                    entry
-                    for entry in entries
-                    if os.path.isfile(os.path.join(directory, entry))
-                ]
-                print(
-                    f"[ListFilesTool] Found {len(result)} files (excluding directories)."
-                )
-                return result
-            print(f"[ListFilesTool] Found {len(entries)} entries.")
-            return entries
+        if sort_by and sort_by not in LIST_SORT_KEYS:
+            error_msg = f"Error: sort_by must be one of {', '.join(LIST_SORT_KEYS)}."
+            print(f"[ListFilesTool] {error_msg}")
+            return [error_msg]
+        try:
+            offset = int(cursor) if cursor else 0
+        except ValueError:
+            error_msg = f"Error: Invalid cursor '{cursor}'."
+            print(f"[ListFilesTool] {error_msg}")
+            return [error_msg]
+
+        if recursive:
+            entries = self._iter_recursive(
+                directory, exclude_dirs, max_depth, ignore or [], sort_by in ("size", "mtime")
+            )
         else:
-            file_list = []
-            for root, dirs, files in os.walk(directory):
-                if exclude_dirs:
-                    file_list.extend([os.path.join(root, file) for file in files])
-                else:
-                    file_list.extend(
-                        [os.path.join(root, entry) for entry in (dirs + files)]
+            entries = self._iter_directory(
+                directory, exclude_dirs, ignore or [], sort_by is not None
+            )
+        if sort_by == "name":
+            entries = iter(sorted(entries, key=lambda e: e[0]))
+        elif sort_by == "size":
+            entries = iter(sorted(entries, key=lambda e: (-e[1], e[0])))
+        elif sort_by == "mtime":
+            entries = iter(sorted(entries, key=lambda e: (-e[2], e[0])))
+        kind = "entries (recursive)" if recursive else "entries"
+        if exclude_dirs:
+            kind = "files (recursive)" if recursive else "files (excluding directories)"
+
+        if page_size is None or page_size <= 0:
+            result = [entry[0] for entry in islice(entries, offset, None)]
+            print(f"[ListFilesTool] Found {len(result)} {kind}.")
+            return result
+        page = [entry[0] for entry in islice(entries, offset, offset + page_size + 1)]
+        has_more = len(page) > page_size
+        page = page[:page_size]
+        next_cursor = str(offset + page_size) if has_more else None
+        print(
+            f"[ListFilesTool] Returning {len(page)} {kind} from offset {offset} (more: {has_more})."
+        )
+        return {"entries": page, "next_cursor": next_cursor}
+
+    @staticmethod
+    def _is_ignored(name: str, rel_path: str, ignore: list) -> bool:
+        return any(
+            fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(rel_path, pattern)
+            for pattern in ignore
+        )
+
+    def _iter_directory(self, directory: str, exclude_dirs: bool, ignore: list, need_stat: bool):
+        """Yield (name, size, mtime_ns) for the direct entries of directory using os.scandir."""
+        with os.scandir(directory) as it:
+            for entry in it:
+                if ignore and self._is_ignored(entry.name, entry.name, ignore):
+                    continue
+                if exclude_dirs and not entry.is_file():
+                    continue
+                size = mtime = 0
+                if need_stat:
+                    try:
+                        # DirEntry caches its stat result, so each entry is stat'ed at most once
+                        st = entry.stat()
+                        size = 0 if entry.is_dir() else st.st_size
+                        mtime = st.st_mtime_ns
+                    except OSError:
+                        pass
+                yield entry.name, size, mtime
+
+    def _iter_recursive(
+        self,
+        directory: str,
+        exclude_dirs: bool,
+        max_depth: Optional[int],
+        ignore: list,
+        need_stat: bool,
+    ):
+        """
+        Yield (path, size, mtime_ns) for every entry below directory.
+
+        Entries come from the file index. Its sizes and mtimes were captured
+        when each directory was last scanned and miss in-place edits, so with
+        need_stat every listed entry is stat'ed again instead.
+        """
+        index, start = get_file_index(directory, self.data_dir)
+        index.refresh(start)
+        for rel, dirs, files in index.walk(start, max_depth=max_depth):
+            root = os.path.join(directory, rel) if rel else directory
+            if ignore:
+                # Removing a directory from dirs stops the walk descending into it
+                dirs[:] = [
+                    name
+                    for name in dirs
+                    if not self._is_ignored(
+                        name, os.path.join(rel, name) if rel else name, ignore
                     )
-            print(f"[ListFilesTool] Found {len(file_list)} entries (recursive).")
-            return file_list
+                ]
+            if not exclude_dirs:
+                for name in dirs:
+                    mtime = 0
+                    if need_stat:
+                        try:
+                            mtime = os.stat(os.path.join(root, name)).st_mtime_ns
+                        except OSError:
+                            pass
+                    yield os.path.join(root, name), 0, mtime
+            for name, (size, mtime) in files.items():
+                rel_path = os.path.join(rel, name) if rel else name
+                if ignore and self._is_ignored(name, rel_path, ignore):
+                    continue
+                path = os.path.join(root, name)
+                if need_stat:
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        # Broken symlinks are listed with their own stat, vanished files not at all
+                        try:
+                            st = os.lstat(path)
+                        except OSError:
+                            continue
+                    size, mtime = st.st_size, st.st_mtime_ns
+                yield path, size, mtime
@@ -0,0 +1,94 @@
+import os
+import time
+
+import pytest
+
+from src.tools import code_index
+from src.tools.code_index import CodeIndex
+from src.tools.code_tools import ListCodeDefinitionNamesTool, LookupCodeSymbolTool
+from src.tools.file_tools import ReplaceInFileTool, WriteToFileTool
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "tree"
+    (root / "pkg").mkdir(parents=True)
+    (root / "pkg" / "__init__.py").write_text("")
+    (root / "pkg" / "mod.py").write_text(
+        "class Bar:\n"
+        "    '''A bar.'''\n"
+        "\n"
+        "    def baz(self):\n"
+        "        pass\n"
+    )
+    return root
+
+
+def _lookup(tree, data_dir, name):
+    return LookupCodeSymbolTool(data_dir=str(data_dir)).forward(str(tree), name=name)
+
+
+def test_lookup_reports_location_and_docstring(tree, tmp_path):
+    mod = os.path.join(str(tree), "pkg", "mod.py")
+    assert _lookup(tree, tmp_path / "data", "Bar") == [f"{mod}:1-5 class Bar - A bar."]
+    assert _lookup(tree, tmp_path / "data", "pkg.mod.Bar.baz") == [f"{mod}:4-5 method Bar.baz"]
+
+
+def test_lookup_sees_edits_made_with_the_file_tools(tree, tmp_path):
+    data = tmp_path / "data"
+    mod = str(tree / "pkg" / "mod.py")
+    assert _lookup(tree, data, "qux") == ["No matching symbols found."]
+
+    ReplaceInFileTool().forward(mod, search="def baz", replace="def qux")
+    WriteToFileTool().forward(str(tree / "pkg" / "extra.py"), "def extra():\n    pass\n")
+
+    assert _lookup(tree, data, "Bar.qux") == [f"{mod}:4-5 method Bar.qux"]
+    assert len(_lookup(tree, data, "extra")) == 1
+
+
+def test_lookup_picks_up_other_edits_in_the_background(tree, tmp_path, monkeypatch):
+    monkeypatch.setattr(code_index, "REFRESH_INTERVAL_SECONDS", 0.0)
+    data = tmp_path / "data"
+    _lookup(tree, data, "Bar")
+
+    (tree / "pkg" / "shell.py").write_text("def from_shell():\n    pass\n")
+
+    deadline = time.monotonic() + 10
+    while _lookup(tree, data, "from_shell") == ["No matching symbols found."]:
+        assert time.monotonic() < deadline, "background refresh never indexed the new file"
+        time.sleep(0.05)
+
+
+def test_definition_names_see_an_immediate_edit(tree, tmp_path):
+    tool = ListCodeDefinitionNamesTool(data_dir=str(tmp_path / "data"))
+    path = str(tree / "pkg" / "mod.py")
+    assert "class: Bar" in tool.forward(path)
+
+    with open(path, "w") as f:
+        f.write("def renamed():\n    pass\n")
+
+    assert tool.forward(path) == ["function: renamed"]
+
+
+def test_parse_cache_log_is_replayed(tree, tmp_path):
+    cache_path = str(tmp_path / "cache" / "parse_cache.jsonl")
+    mod = str(tree / "pkg" / "mod.py")
+    index = CodeIndex(cache_path)
+    index.get([mod, str(tree / "pkg" / "__init__.py")], prune_under=str(tree))
+    os.remove(tree / "pkg" / "__init__.py")
+    index.get([mod], prune_under=str(tree))
+
+    reloaded = CodeIndex(cache_path)
+
+    assert list(reloaded._files) == [os.path.abspath(mod)]
+    assert [path for path, _ in reloaded.find_symbol("Bar.baz", str(tree))] == [os.path.abspath(mod)]
+
+
+def test_corrupt_cache_lines_are_skipped(tree, tmp_path):
+    cache_path = str(tmp_path / "parse_cache.jsonl")
+    mod = str(tree / "pkg" / "mod.py")
+    CodeIndex(cache_path).get([mod])
+    with open(cache_path, "a") as f:
+        f.write('{"path": "/torn')
+
+    assert list(CodeIndex(cache_path)._files) == [os.path.abspath(mod)]
@@ -0,0 +1,81 @@
+import os
+
+from src.tools.file_index import FileIndex
+from src.tools.file_tools import ListFilesTool, SearchFilesTool
+
+
+def _make_tree(root):
+    (root / "pkg" / "sub").mkdir(parents=True)
+    (root / "a.txt").write_text("a")
+    (root / "pkg" / "b.py").write_text("needle\n")
+    (root / "pkg" / "sub" / "c.py").write_text("hay\n")
+
+
+def _listing(directory, data_dir, **kwargs):
+    return ListFilesTool(data_dir=str(data_dir)).forward(str(directory), recursive=True, exclude_dirs=True, **kwargs)
+
+
+def test_listing_reflects_added_and_removed_files(tmp_path):
+    tree, data = tmp_path / "tree", tmp_path / "data"
+    tree.mkdir()
+    _make_tree(tree)
+    assert sorted(_listing(tree, data)) == sorted(
+        os.path.join(str(tree), p) for p in ("a.txt", "pkg/b.py", "pkg/sub/c.py")
+    )
+
+    (tree / "pkg" / "sub" / "d.py").write_text("")
+    os.remove(tree / "a.txt")
+
+    assert sorted(_listing(tree, data)) == sorted(
+        os.path.join(str(tree), p) for p in ("pkg/b.py", "pkg/sub/c.py", "pkg/sub/d.py")
+    )
+
+
+def test_size_sort_sees_in_place_appends(tmp_path):
+    tree, data = tmp_path / "tree", tmp_path / "data"
+    tree.mkdir()
+    _make_tree(tree)
+    _listing(tree, data, sort_by="size")
+
+    # Appending does not change the directory's mtime, so the index alone would not notice
+    with open(tree / "pkg" / "sub" / "c.py", "a") as f:
+        f.write("x" * 100)
+
+    assert _listing(tree, data, sort_by="size")[0] == os.path.join(str(tree), "pkg", "sub", "c.py")
+
+
+def test_name_search_sees_new_files(tmp_path):
+    tree, data = tmp_path / "tree", tmp_path / "data"
+    tree.mkdir()
+    _make_tree(tree)
+    search = SearchFilesTool(data_dir=str(data))
+    assert search.forward(str(tree), r"new_.*") == ["No files matched the pattern."]
+
+    (tree / "pkg" / "new_module.py").write_text("")
+
+    assert search.forward(str(tree), r"new_.*") == [os.path.join(str(tree), "pkg", "new_module.py")]
+
+
+def test_content_search_stops_at_max_results(tmp_path):
+    tree = tmp_path / "tree"
+    tree.mkdir()
+    for i in range(5):
+        (tree / f"f{i}.py").write_text("needle\n" * 3)
+
+    results = SearchFilesTool().forward(str(tree), r".*\.py", content_pattern="needle", max_results=4)
+
+    assert len(results) == 4
+    assert all(result.endswith(":needle") for result in results)
+
+
+def test_index_is_persisted_and_reloaded(tmp_path):
+    tree = tmp_path / "tree"
+    tree.mkdir()
+    _make_tree(tree)
+    index_path = str(tmp_path / "index.json")
+    FileIndex(str(tree), index_path).refresh()
+
+    reloaded = FileIndex(str(tree), index_path)
+    walked = {rel: sorted(files) for rel, _, files in reloaded.walk()}
+
+    assert walked == {"": ["a.txt"], "pkg": ["b.py"], os.path.join("pkg", "sub"): ["c.py"]}
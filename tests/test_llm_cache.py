@@ -0,0 +1,125 @@
+import time
+
+import pytest
+from smolagents.models import ChatMessage, MessageRole
+from smolagents.monitoring import TokenUsage
+
+from src.llm_cache import CachedModel, ResponseCache, request_key
+
+
+class CountingModel:
+    model_id = "counting"
+
+    def __init__(self):
+        self.kwargs = {"temperature": 0.0}
+        self.calls = 0
+
+    def generate(self, messages, **kwargs):
+        self.calls += 1
+        return ChatMessage(
+            role=MessageRole.ASSISTANT,
+            content=f"answer {self.calls}",
+            token_usage=TokenUsage(input_tokens=12, output_tokens=3),
+        )
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite3"))
+    yield cache
+    cache.close()
+
+
+def test_request_key_ignores_formatting_differences():
+    model = CountingModel()
+    plain = [{"role": "user", "content": "What is 2 + 2?"}]
+    parts = [{"role": "user", "content": [{"type": "text", "text": "  What is 2 + 2?\n"}]}]
+
+    assert request_key(model, plain) == request_key(model, parts)
+    assert request_key(model, plain) != request_key(model, plain, stop_sequences=["\n"])
+
+
+def test_cache_counts_hits_and_misses(cache):
+    assert cache.get("key") is None
+    cache.put("key", "value")
+
+    assert cache.get("key") == "value"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_entries_expire_after_the_ttl(tmp_path):
+    cache = ResponseCache(str(tmp_path / "ttl.sqlite3"), ttl_seconds=0.05)
+    cache.put("key", "value")
+    time.sleep(0.1)
+
+    assert cache.get("key") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path / "lru.sqlite3"), max_bytes=100)
+    cache.put("first", "a" * 40)
+    time.sleep(0.01)
+    cache.put("second", "b" * 40)
+    time.sleep(0.01)
+    cache.get("first")
+    time.sleep(0.01)
+    cache.put("third", "c" * 40)
+
+    assert cache.get("second") is None
+    assert cache.get("first") == "a" * 40
+    assert cache.stats()["bytes"] <= 100
+
+
+def test_entries_survive_a_reopen(tmp_path):
+    path = str(tmp_path / "persist.sqlite3")
+    cache = ResponseCache(path)
+    cache.put("key", "value")
+    cache.close()
+
+    reopened = ResponseCache(path)
+    assert reopened.get("key") == "value"
+    assert reopened.stats()["bytes"] == len("value")
+
+
+def test_invalid_mode_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ResponseCache(str(tmp_path / "bad.sqlite3"), mode="sometimes")
+
+
+def test_cached_model_serves_repeated_requests(cache):
+    model = CountingModel()
+    cached = CachedModel(model, cache)
+    messages = [{"role": "user", "content": "hi"}]
+
+    first = cached.generate(messages)
+    second = cached.generate(messages)
+
+    assert model.calls == 1
+    assert second.content == first.content == "answer 1"
+    assert (cached.last_input_token_count, cached.last_output_token_count) == (12, 3)
+
+
+def test_record_mode_always_calls_the_model(tmp_path):
+    model = CountingModel()
+    cached = CachedModel(model, ResponseCache(str(tmp_path / "record.sqlite3"), mode="record"))
+    messages = [{"role": "user", "content": "hi"}]
+    cached.generate(messages)
+
+    assert cached.generate(messages).content == "answer 2"
+    assert model.calls == 2
+
+
+def test_replay_mode_never_calls_the_model(tmp_path):
+    path = str(tmp_path / "replay.sqlite3")
+    messages = [{"role": "user", "content": "hi"}]
+    CachedModel(CountingModel(), ResponseCache(path)).generate(messages)
+
+    model = CountingModel()
+    replay = CachedModel(model, ResponseCache(path, mode="replay"))
+
+    assert replay.generate(messages).content == "answer 1"
+    with pytest.raises(RuntimeError):
+        replay.generate([{"role": "user", "content": "something new"}])
+    assert model.calls == 0
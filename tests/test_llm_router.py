@@ -0,0 +1,110 @@
+import time
+
+import pytest
+from smolagents.models import ChatMessage, MessageRole
+
+from src.llm_router import Endpoint, NoEndpointAvailable, RouterModel
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+class FakeModel:
+    def __init__(self, name, delay=0.0, fail=False):
+        self.model_id = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def generate(self, messages, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.model_id} is down")
+        return ChatMessage(role=MessageRole.ASSISTANT, content=self.model_id)
+
+
+def _endpoint(name, latency=None, **kwargs):
+    model_kwargs = {key: kwargs.pop(key) for key in ("delay", "fail") if key in kwargs}
+    endpoint = Endpoint(name, FakeModel(name, **model_kwargs), **kwargs)
+    if latency is not None:
+        endpoint.latencies.extend([latency] * 5)
+        endpoint.outcomes.extend([True] * 5)
+    return endpoint
+
+
+def test_routes_to_the_fastest_endpoint():
+    router = RouterModel([_endpoint("slow", latency=0.5), _endpoint("fast", latency=0.1)])
+
+    assert router.generate(MESSAGES).content == "fast"
+
+
+def test_errors_are_penalised_in_the_ranking():
+    flaky = _endpoint("flaky", latency=0.1)
+    flaky.outcomes.extend([False] * 5)
+    router = RouterModel([flaky, _endpoint("steady", latency=0.15)])
+
+    assert [endpoint.name for endpoint in router.ranked()] == ["steady", "flaky"]
+
+
+def test_fails_over_to_the_next_endpoint():
+    down = _endpoint("down", fail=True)
+    router = RouterModel([down, _endpoint("up")])
+
+    assert router.generate(MESSAGES).content == "up"
+    assert down.stats()["failures"] == 1
+
+
+def test_failing_endpoint_is_ejected_then_retried_after_cooldown():
+    down = _endpoint("down", fail=True, failure_threshold=2, cooldown_seconds=0.1)
+    router = RouterModel([down, _endpoint("up", latency=1.0)])
+    router.generate(MESSAGES)
+    router.generate(MESSAGES)
+    assert down.state == "open"
+
+    router.generate(MESSAGES)
+    assert down.model.calls == 2
+
+    time.sleep(0.15)
+    assert down.state == "half_open"
+    down.model.fail = False
+    assert router.generate(MESSAGES).content == "down"
+    assert down.state == "closed"
+
+
+def test_raises_when_every_endpoint_is_ejected():
+    router = RouterModel([_endpoint("down", fail=True, failure_threshold=1)])
+    with pytest.raises(RuntimeError):
+        router.generate(MESSAGES)
+
+    with pytest.raises(NoEndpointAvailable):
+        router.generate(MESSAGES)
+
+
+def test_fast_calls_are_not_hedged():
+    backup = _endpoint("backup", latency=1.0)
+    router = RouterModel([_endpoint("primary"), backup], hedge_after=0.2)
+
+    assert router.generate(MESSAGES).content == "primary"
+    time.sleep(0.3)
+    assert router.hedges == 0
+    assert backup.model.calls == 0
+
+
+def test_hedge_stands_in_for_a_slow_failing_call():
+    router = RouterModel(
+        [_endpoint("primary", delay=0.3, fail=True), _endpoint("backup", latency=1.0)],
+        hedge_after=0.05,
+    )
+
+    assert router.generate(MESSAGES).content == "backup"
+    assert router.hedges == 1
+    assert router.hedge_wins == 1
+
+
+def test_slow_successful_call_keeps_its_own_response():
+    backup = _endpoint("backup", latency=1.0)
+    router = RouterModel([_endpoint("primary", delay=0.2), backup], hedge_after=0.05)
+
+    assert router.generate(MESSAGES).content == "primary"
+    assert router.hedges == 1
+    assert router.hedge_wins == 0
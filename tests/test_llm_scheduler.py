@@ -0,0 +1,122 @@
+import threading
+import time
+
+import pytest
+from smolagents.models import ChatMessage, MessageRole
+from smolagents.monitoring import TokenUsage
+
+from src.llm_scheduler import (
+    PRIORITY_BATCH,
+    PRIORITY_INTERACTIVE,
+    RateLimitScheduler,
+    ScheduledModel,
+    TokenBucket,
+    scheduling_priority,
+)
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after=None):
+        super().__init__("rate limited")
+        headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+        self.response = type("Response", (), {"headers": headers})()
+
+
+class FlakyModel:
+    """Fails with a 429 for the first `failures` calls."""
+
+    model_id = "flaky"
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = 0
+
+    def generate(self, messages, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RateLimitError()
+        return ChatMessage(role=MessageRole.ASSISTANT, content="ok", token_usage=TokenUsage(input_tokens=10, output_tokens=5))
+
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = TokenBucket(60)
+    now = bucket.updated
+    bucket.take(60)
+
+    assert bucket.wait_time(1, now) == pytest.approx(1.0)
+    assert bucket.wait_time(1, now + 1.0) == 0.0
+
+
+def test_token_bucket_caps_amounts_at_capacity():
+    bucket = TokenBucket(60)
+    now = bucket.updated
+    bucket.take(60)
+
+    # A call larger than the bucket needs a full bucket rather than waiting forever
+    assert bucket.wait_time(600, now) == pytest.approx(60.0)
+
+
+def test_higher_priority_calls_are_admitted_first():
+    scheduler = RateLimitScheduler(requests_per_minute=600)
+    scheduler.requests.tokens = 0
+    order = []
+
+    def call(priority, name):
+        with scheduling_priority(priority):
+            scheduler.acquire(1)
+        order.append(name)
+
+    batch = threading.Thread(target=call, args=(PRIORITY_BATCH, "batch"))
+    interactive = threading.Thread(target=call, args=(PRIORITY_INTERACTIVE, "interactive"))
+    batch.start()
+    time.sleep(0.02)
+    interactive.start()
+    batch.join(5)
+    interactive.join(5)
+
+    assert order == ["interactive", "batch"]
+    assert scheduler.stats()["admitted"] == 2
+
+
+def test_settle_corrects_the_token_estimate():
+    scheduler = RateLimitScheduler(tokens_per_minute=6000)
+    scheduler.acquire(100)
+    before = scheduler.tokens.tokens
+
+    scheduler.settle(100, 40)
+
+    assert scheduler.tokens.tokens == pytest.approx(before + 60)
+
+
+def test_backoff_honours_retry_after_and_pauses_admissions():
+    scheduler = RateLimitScheduler()
+
+    assert scheduler.backoff(0, RateLimitError(retry_after=0.2)) == 0.2
+    started = time.monotonic()
+    scheduler.acquire(1)
+
+    assert time.monotonic() - started >= 0.15
+    assert scheduler.stats()["rate_limited"] == 1
+
+
+def test_scheduled_model_retries_rate_limited_calls():
+    scheduler = RateLimitScheduler(tokens_per_minute=100000, base_backoff=0.01)
+    model = FlakyModel(failures=2)
+
+    message = ScheduledModel(model, scheduler).generate([{"role": "user", "content": "hi"}])
+
+    assert message.content == "ok"
+    assert model.calls == 3
+    assert scheduler.stats()["admitted"] == 3
+    assert scheduler.stats()["rate_limited"] == 2
+
+
+def test_scheduled_model_gives_up_after_max_retries():
+    scheduler = RateLimitScheduler(max_retries=1, base_backoff=0.01)
+    model = FlakyModel(failures=5)
+
+    with pytest.raises(RateLimitError):
+        ScheduledModel(model, scheduler).generate([{"role": "user", "content": "hi"}])
+    assert model.calls == 2
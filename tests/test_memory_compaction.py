@@ -0,0 +1,98 @@
+import os
+
+import pytest
+
+from src.memory_compaction import MemoryCompactor
+from src.memory_store import LocalMemory
+
+OLD = "2000-01-01T00:00:00+0000"
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "memory_store")
+
+
+def _ids(store, user_id):
+    return [memory["id"] for memory in store.get_all(user_id=user_id)["results"]]
+
+
+def _uses(store, user_id):
+    return {record["memory"]: record.get("uses", 0) for record in store._partition(user_id).records.values()}
+
+
+def test_compact_drops_dead_rows(store_path):
+    store = LocalMemory(store_path, compact_min_rows=1000)
+    for i in range(10):
+        store.add(f"memory number {i}", user_id="alice")
+    for memory_id in _ids(store, "alice")[:6]:
+        store.delete(memory_id)
+    partition = store._partition("alice")
+    assert partition.dead_rows == 6
+
+    assert store.compact() == 6
+
+    assert partition.dead_rows == 0
+    assert os.path.getsize(partition._file("vectors")) == 4 * 4 * partition.dimensions
+    reloaded = LocalMemory(store_path)
+    assert [m["memory"] for m in reloaded.get_all(user_id="alice")["results"]] == [
+        f"memory number {i}" for i in range(6, 10)
+    ]
+    assert reloaded.search("memory number 7", user_id="alice")["results"][0]["memory"] == "memory number 7"
+
+
+def test_usage_counts_survive_a_reload(store_path):
+    store = LocalMemory(store_path)
+    store.add("I like green tea", user_id="alice")
+    store.add("My dog is called Rex", user_id="alice")
+    store.search("green tea", user_id="alice", limit=1)
+    store.search("green tea", user_id="alice", limit=1)
+    store.search("green tea", user_id="alice", limit=1, track_usage=False)
+    store.flush()
+
+    assert _uses(LocalMemory(store_path), "alice") == {"I like green tea": 2, "My dog is called Rex": 0}
+
+
+def test_usage_counts_survive_partition_eviction(store_path):
+    store = LocalMemory(store_path, max_loaded_partitions=1)
+    store.add("I like green tea", user_id="alice")
+    store.search("green tea", user_id="alice", limit=1)
+    store.add("I have a cat", user_id="bob")
+
+    assert "alice" not in store._partitions
+    assert _uses(LocalMemory(store_path), "alice") == {"I like green tea": 1}
+
+
+def test_compact_user_merges_expires_and_caps(store_path):
+    store = LocalMemory(store_path)
+    # Same words, so the hash embedder gives identical vectors, but different texts
+    store.add("I like green tea", user_id="alice")
+    store.add("I like green tea!", user_id="alice")
+    for text in ("My dog is called Rex", "I live in Paris", "I work at night"):
+        store.add(text, user_id="alice")
+    store.search("Paris", user_id="alice", limit=1)
+    for record in store._partition("alice").records.values():
+        if record["memory"] in ("I live in Paris", "I work at night"):
+            record["created_at"] = OLD
+
+    report = store.compact_user(
+        "alice", similarity_threshold=0.99, max_age_seconds=86400, min_uses=1, max_memories=2
+    )
+
+    assert report == {"user_id": "alice", "before": 5, "merged": 1, "expired": 1, "capped": 1, "after": 2}
+    assert store._partition("alice").dead_rows == 0
+    remaining = sorted(m["memory"] for m in LocalMemory(store_path).get_all(user_id="alice")["results"])
+    assert len(remaining) == 2
+    assert "I live in Paris" in remaining
+
+
+def test_compactor_reports_every_user(store_path):
+    store = LocalMemory(store_path, max_loaded_partitions=1)
+    for user_id in ("alice", "bob", "carol"):
+        store.add("I like green tea", user_id=user_id)
+        store.add("I like green tea!", user_id=user_id)
+
+    report = MemoryCompactor(store, users_per_run=0).run_once()
+
+    assert report["users"] == 3
+    assert (report["before"], report["merged"], report["after"]) == (6, 3, 3)
@@ -0,0 +1,96 @@
+import pytest
+
+from src.memory_store import HashEmbedder, LocalMemory
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "memory_store")
+
+
+def _memories(store, user_id):
+    return sorted(memory["memory"] for memory in store.get_all(user_id=user_id)["results"])
+
+
+def test_search_ranks_a_users_own_memories(store_path):
+    store = LocalMemory(store_path)
+    store.add("I like green tea", user_id="alice")
+    store.add("My dog is called Rex", user_id="alice")
+    store.add("I like green tea", user_id="bob")
+
+    results = store.search("green tea", user_id="alice", limit=2)["results"]
+
+    assert results[0]["memory"] == "I like green tea"
+    assert {result["user_id"] for result in results} == {"alice"}
+    assert results[0]["score"] >= results[1]["score"]
+
+
+def test_only_configured_roles_and_new_texts_are_stored(store_path):
+    store = LocalMemory(store_path)
+    added = store.add(
+        [
+            {"role": "user", "content": "I live in Paris"},
+            {"role": "assistant", "content": "Noted!"},
+            {"role": "user", "content": "  I live in Paris  "},
+        ],
+        user_id="alice",
+    )["results"]
+
+    assert [memory["memory"] for memory in added] == ["I live in Paris"]
+    assert store.add("I live in Paris", user_id="alice")["results"] == []
+
+
+def test_memories_are_reloaded_from_disk(store_path):
+    store = LocalMemory(store_path)
+    store.add("I live in Paris", user_id="alice")
+    memory_id = store.add("I work at night", user_id="alice")["results"][0]["id"]
+    store.update(memory_id, "I work in the morning")
+    store.add("I have a cat", user_id="bob")
+
+    reloaded = LocalMemory(store_path)
+
+    assert _memories(reloaded, "alice") == ["I live in Paris", "I work in the morning"]
+    assert sorted(reloaded.users()) == ["alice", "bob"]
+
+
+def test_loaded_partitions_are_bounded(store_path):
+    store = LocalMemory(store_path, max_loaded_partitions=2)
+    ids = {}
+    for user_id in ("u1", "u2", "u3", "u4"):
+        ids[user_id] = store.add(f"memory of {user_id}", user_id=user_id)["results"][0]["id"]
+
+    assert len(store._partitions) == 2
+    assert sorted(store.users()) == ["u1", "u2", "u3", "u4"]
+    assert store.search("memory", user_id="u1")["results"][0]["memory"] == "memory of u1"
+
+    # Memories of partitions that are not loaded can still be updated and deleted
+    store.update(ids["u2"], "updated u2")
+    store.delete(ids["u3"])
+    assert len(store._partitions) == 2
+    assert _memories(store, "u2") == ["updated u2"]
+    assert _memories(store, "u3") == []
+
+
+def test_batched_search_and_add(store_path):
+    store = LocalMemory(store_path)
+    added = store.add_many(
+        [
+            {"messages": "I like green tea", "user_id": "alice"},
+            {"messages": "I like black coffee", "user_id": "bob"},
+        ]
+    )
+    assert [len(result["results"]) for result in added] == [1, 1]
+
+    results = store.search_many(
+        [{"query": "tea", "user_id": "alice"}, {"query": "coffee", "user_id": "bob", "limit": 1}]
+    )
+
+    assert results[0]["results"][0]["memory"] == "I like green tea"
+    assert results[1]["results"][0]["memory"] == "I like black coffee"
+
+
+def test_switching_embedders_is_refused(store_path):
+    LocalMemory(store_path).add("I live in Paris", user_id="alice")
+
+    with pytest.raises(ValueError):
+        LocalMemory(store_path, embedder=HashEmbedder(64)).add("I have a cat", user_id="alice")
@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+from src.tools import file_tools
+from src.tools.file_tools import ReplaceInFileTool, _StreamingReplacer
+
+
+def _stream(replacer, text, chunk_chars):
+    out = [replacer.feed(text[i:i + chunk_chars]) for i in range(0, len(text), chunk_chars)]
+    out.append(replacer.finish())
+    return "".join(out)
+
+
+@pytest.fixture
+def streaming(monkeypatch):
+    # Stream every edit in small chunks so matches straddle chunk boundaries
+    monkeypatch.setattr(file_tools, "STREAM_EDIT_THRESHOLD_BYTES", 0)
+    monkeypatch.setattr(file_tools, "STREAM_CHUNK_CHARS", 4)
+
+
+@pytest.mark.parametrize("chunk_chars", [1, 2, 3, 5, 100])
+def test_streaming_replacer_finds_matches_across_chunks(chunk_chars):
+    text = "abcXYZdefXYZghiXY"
+    replacer = _StreamingReplacer("XYZ", "-", -1)
+    assert _stream(replacer, text, chunk_chars) == text.replace("XYZ", "-")
+    assert replacer.replaced == 2
+
+
+def test_streaming_replacer_stops_after_count():
+    replacer = _StreamingReplacer("a", "b", 2)
+    assert _stream(replacer, "aaaa", 1) == "bbaa"
+    assert replacer.replaced == 2
+
+
+def test_streaming_edits_match_in_memory_edits(tmp_path, streaming):
+    content = "foo baz\nfoo bar baz\n" * 3
+    edits = [
+        {"search": "foo", "replace": "bar", "count": -1},
+        {"search": "bar baz", "replace": "qux"},
+    ]
+    path = tmp_path / "big.txt"
+    path.write_text(content)
+
+    message = ReplaceInFileTool().forward(str(path), edits=edits)
+
+    assert message.startswith("Replaced 7 occurrence(s)")
+    assert path.read_text() == content.replace("foo", "bar").replace("bar baz", "qux", 1)
+
+
+def test_streaming_edit_without_match_leaves_file_untouched(tmp_path, streaming):
+    path = tmp_path / "big.txt"
+    path.write_text("nothing to see here\n")
+
+    assert ReplaceInFileTool().forward(str(path), search="absent", replace="x") == "No matches found to replace."
+    assert path.read_text() == "nothing to see here\n"
+    assert os.listdir(tmp_path) == ["big.txt"]
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"search": "", "replace": "x"},
+        {"edits": [{"search": "", "replace": "x"}]},
+    ],
+)
+def test_empty_search_is_rejected(tmp_path, streaming, kwargs):
+    path = tmp_path / "file.txt"
+    path.write_text("abc")
+
+    assert ReplaceInFileTool().forward(str(path), **kwargs).startswith("Error:")
+    assert path.read_text() == "abc"
+
+
+def test_regex_edit_is_applied_in_memory(tmp_path, streaming):
+    path = tmp_path / "file.txt"
+    path.write_text("a1 b22 c333\n")
+
+    ReplaceInFileTool().forward(str(path), search=r"\d+", replace="#", count=-1, use_regex=True)
+
+    assert path.read_text() == "a# b# c#\n"